@@ -4,36 +4,13 @@
 # This code is designed to work with the ADS1115_I2CADC I2C Mini Module available from ControlEverything.com.
 # https://www.controleverything.com/content/Analog-Digital-Converters?sku=ADS1115_I2CADC#tabs-0-product_tabset-2
 
-import smbus
-import time
+from ads1115 import ADS1115, Channel, MUX_AIN0_AIN1, PGA_2_048, DR_128
 
-# Get I2C bus
-bus = smbus.SMBus(0)
-
-# ADS1115 address, 0x48(72)
-# Select configuration register, 0x01(01)
-#		0x8483(33923)	AINP = AIN0 and AINN = AIN1, +/- 2.048V
-#				Continuous conversion mode, 128SPS
-data = [0x84,0x83]
-bus.write_i2c_block_data(0x49, 0x01, data)
-
-time.sleep(0.5)
-
-# ADS1115 address, 0x48(72)
-# Read data back from 0x00(00), 2 bytes
-# raw_adc MSB, raw_adc LSB
-data = bus.read_i2c_block_data(0x49, 0x02, 2)
-
-# Convert the data
-raw_adc = data[0] * 256 + data[1]
-
-if raw_adc > 32767:
-	raw_adc -= 65535
+# ADS1115 address, 0x49(73)
+# AINP = AIN0 and AINN = AIN1, +/- 2.048V, 128SPS
+# one single-shot conversion, read from the conversion register 0x00
+adc = ADS1115(0x49, channels=[Channel(MUX_AIN0_AIN1, PGA_2_048, DR_128)])
+raw_adc = adc.read(0)
 
 # Output data to screen
 print "Digital Value of Analog Input : %d" %raw_adc
-
-
-
-
-
@@ -0,0 +1,233 @@
+#----------------------------------------------------------------------
+#  adcstream.py
+#  Continuous ADS1115 acquisition into ring buffers.
+#
+#     s = AdcStream(adc, channel=0, size=8192, position=lambda: motor.numstep)
+#     s.start()
+#     r = s.ring.reader()
+#     for t, v, pos in r.read(): ...     # NumPy views, no copies
+#
+#  The chip runs in continuous mode and the thread reads the conversion
+#  register once per conversion period, storing time, raw value and
+#  (optionally) the stepper position in preallocated NumPy columns.
+#  Nothing is allocated per sample. Each Reader has its own cursor and
+#  counts the samples it lost because the writer lapped it.
+#
+#  In continuous mode neither the OS bit (always busy) nor ALERT/RDY (a
+#  pulse of a few us) can be polled for each conversion, so the reads
+#  keep to the nominal rate. The chip oscillator is only good to +-10%:
+#  when it runs slow a read can get the previous conversion again, and
+#  `repeats` counts reads equal to the one before. A flat input repeats
+#  too, so it is a hint to check rate() against the chip, not a count
+#  of duplicates.
+#----------------------------------------------------------------------
+import time
+import threading
+import numpy as np
+import motion
+import ads1115
+
+SIZE = 8192
+
+class Ring(object):
+
+	def __init__(self, size=SIZE, dtype=np.int16, pos_dtype=np.int64):
+		self.size = size
+		self.t = np.zeros(size)
+		self.v = np.zeros(size, dtype)
+		self.pos = np.zeros(size, pos_dtype)
+		self.n = 0		# samples written since the start
+
+	def put(self, t, v, pos=0):
+		i = self.n % self.size
+		self.t[i] = t
+		self.v[i] = v
+		self.pos[i] = pos
+		self.n += 1
+
+	def extend(self, t, v, pos):
+		# append arrays of equal length (at most size)
+		k = len(t)
+		i = self.n % self.size
+		j = min(k, self.size - i)
+		self.t[i:i + j] = t[:j]
+		self.v[i:i + j] = v[:j]
+		self.pos[i:i + j] = pos[:j]
+		if j < k:
+			self.t[:k - j] = t[j:]
+			self.v[:k - j] = v[j:]
+			self.pos[:k - j] = pos[j:]
+		self.n += k
+
+	def views(self, start, stop):
+		"""
+		Samples start..stop (counted from the first one ever written) as
+		a list of one or two (t, v, pos) views, two where the range wraps.
+		They stay valid until the writer comes round again.
+		"""
+		start = max(start, self.n - self.size, 0)
+		if stop <= start:
+			return []
+		i = start % self.size
+		j = i + (stop - start)
+		if j <= self.size:
+			return [(self.t[i:j], self.v[i:j], self.pos[i:j])]
+		j -= self.size
+		return [(self.t[i:], self.v[i:], self.pos[i:]),
+			(self.t[:j], self.v[:j], self.pos[:j])]
+
+	def last(self, k):
+		return self.views(self.n - k, self.n)
+
+	def reader(self):
+		return Reader(self)
+
+class Reader(object):
+
+	def __init__(self, ring):
+		self.ring = ring
+		self.next = ring.n
+		self.first = ring.n	# first sample of the last read
+		self.overruns = 0	# samples overwritten before they were read
+
+	def read(self):
+		# views of everything new since the last read
+		stop = self.ring.n
+		start = self.next
+		if stop - start > self.ring.size:
+			self.overruns += stop - start - self.ring.size
+			start = stop - self.ring.size
+		self.first = start
+		self.next = stop
+		return self.ring.views(start, stop)
+
+	def valid(self):
+		# True while the views of the last read are not overwritten
+		return self.ring.n - self.ring.size <= self.first
+
+#----------------------------------------------------------------------
+class Decimator(object):
+	"""
+	Averages groups of `factor` samples of a ring into a ring of float
+	means (time, value and position averaged alike). update() takes
+	whatever is new; a group split between two updates is carried over.
+	"""
+
+	def __init__(self, ring, factor, size=None):
+		self.factor = factor
+		self.src = ring.reader()
+		self.ring = Ring(size or max(ring.size // factor, 1), np.float64, np.float64)
+		self.acc = np.zeros(3)		# partial sums of t, v, pos
+		self.count = 0
+
+	def update(self):
+		f = self.factor
+		for t, v, pos in self.src.read():
+			k = 0
+			if self.count:
+				# finish the group left over from the last block
+				k = min(f - self.count, len(t))
+				self.acc += (t[:k].sum(), v[:k].sum(), pos[:k].sum())
+				self.count += k
+				if self.count == f:
+					m = self.acc / f
+					self.ring.put(m[0], m[1], m[2])
+					self.acc[:] = 0
+					self.count = 0
+			g = (len(t) - k) // f
+			if g:
+				e = k + g * f
+				self.ring.extend(t[k:e].reshape(g, f).mean(1),
+					v[k:e].reshape(g, f).mean(1),
+					pos[k:e].reshape(g, f).mean(1))
+				k = e
+			if k < len(t):
+				self.acc += (t[k:].sum(), v[k:].sum(), pos[k:].sum())
+				self.count += len(t) - k
+		return self.ring.n
+
+#----------------------------------------------------------------------
+class AdcStream(threading.Thread):
+	"""
+	Reads one ADS1115 channel in continuous mode at its data rate into
+	`ring`. position: optional callable sampled with every conversion.
+	missed counts conversions that went by unread (the thread woke up
+	more than half a period late), repeats the reads equal to the one
+	before. Like motion.run, it sleeps to just before each deadline and
+	spins the rest.
+	"""
+
+	def __init__(self, adc, channel=0, size=SIZE, position=None,
+			clock=motion.now, sleep=time.sleep):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.adc = adc
+		self.channel = channel
+		if not isinstance(channel, ads1115.Channel):
+			self.channel = adc.channels[channel]
+		self.ring = Ring(size)
+		self.position = position
+		self.clock = clock
+		self.sleep = sleep
+		self.period = 1.0 / ads1115.RATE[self.channel.dr]
+		self.missed = 0
+		self.repeats = 0
+		self.errors = 0
+		self.running = threading.Event()
+
+	def start(self):
+		self.running.set()
+		threading.Thread.start(self)
+
+	def stop(self):
+		self.running.clear()
+		self.join()
+
+	def run(self):
+		adc = self.adc
+		ring = self.ring
+		period = self.period
+		position = self.position
+		clock = self.clock
+		spin = motion.SPIN
+		adc.continuous(self.channel)
+		last = None
+		# first result one period after the config write; read half a
+		# period later, away from the conversion edges
+		due = clock() + period * 1.5
+		try:
+			while self.running.is_set():
+				left = due - clock()
+				if left > spin:
+					self.sleep(left - spin)
+				while clock() < due:
+					pass
+				now = clock()
+				late = int((now - due) / period + 0.5)
+				if late > 0:
+					self.missed += late
+					due += late * period
+				try:
+					v = adc.result()
+				except IOError:
+					self.errors += 1
+				else:
+					if v == last:
+						self.repeats += 1
+					last = v
+					ring.put(now, v, position() if position else 0)
+				due += period
+		finally:
+			adc.powerDown()
+
+	def rate(self, k=256):
+		# measured samples per second over the last k samples
+		vs = self.ring.last(k)
+		if not vs:
+			return 0.0
+		t0 = vs[0][0][0]
+		t1 = vs[-1][0][-1]
+		n = sum(len(x[0]) for x in vs)
+		if n < 2 or t1 <= t0:
+			return 0.0
+		return (n - 1) / (t1 - t0)
@@ -0,0 +1,179 @@
+#----------------------------------------------------------------------
+#  ads1115.py
+#  ADS1115 16 bit ADC driver, single-shot conversions.
+#
+#     adc = ADS1115(0x49, channels=[Channel(MUX_AIN0), Channel(MUX_AIN1, PGA_4_096, DR_860)])
+#     v = adc.scan()        # one raw value per channel, a tuple
+#
+#  Every conversion is started by a write of the config register (OS=1)
+#  and is ready one conversion period later. The driver waits for it
+#  by sleeping that period (data rate +10%, the oscillator tolerance),
+#  by polling the OS bit (poll=True), or with ready=<callable> reading
+#  the ALERT/RDY pin, which is then set up as conversion ready output.
+#
+#  Datasheet: http://www.ti.com/lit/ds/symlink/ads1115.pdf
+#----------------------------------------------------------------------
+import time
+from collections import namedtuple
+import i2cbus
+
+DEVICE = 0x48 # ADDR to GND; 0x49 ADDR to VDD
+
+bus = i2cbus.get_bus(0)
+
+REG_CONVERSION = 0x00
+REG_CONFIG = 0x01
+REG_LO_THRESH = 0x02
+REG_HI_THRESH = 0x03
+
+OS = 0x8000		# write: start a conversion, read: 1 = idle
+MODE_SINGLE = 0x0100
+COMP_QUE_OFF = 0x0003	# comparator (and ALERT/RDY) disabled
+
+# input multiplexer, config bits 14:12
+MUX_AIN0_AIN1 = 0
+MUX_AIN0_AIN3 = 1
+MUX_AIN1_AIN3 = 2
+MUX_AIN2_AIN3 = 3
+MUX_AIN0 = 4
+MUX_AIN1 = 5
+MUX_AIN2 = 6
+MUX_AIN3 = 7
+
+# gain, config bits 11:9 -> full scale, V
+PGA_6_144 = 0
+PGA_4_096 = 1
+PGA_2_048 = 2
+PGA_1_024 = 3
+PGA_0_512 = 4
+PGA_0_256 = 5
+FULL_SCALE = [6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256]
+
+# data rate, config bits 7:5 -> samples per second
+DR_8 = 0
+DR_16 = 1
+DR_32 = 2
+DR_64 = 3
+DR_128 = 4
+DR_250 = 5
+DR_475 = 6
+DR_860 = 7
+RATE = [8, 16, 32, 64, 128, 250, 475, 860]
+
+POLL = 0.0002 # OS bit / ready pin poll interval, s
+
+Channel = namedtuple("Channel", "mux pga dr")
+Channel.__new__.__defaults__ = (PGA_2_048, DR_128)
+
+def config(ch, start=True, single=True, comp_que=COMP_QUE_OFF):
+	# config register value for a channel
+	c = (ch.mux << 12) | (ch.pga << 9) | (ch.dr << 5) | comp_que
+	if single:
+		c |= MODE_SINGLE
+	if start:
+		c |= OS
+	return c
+
+def period(dr):
+	# longest time of one conversion, s
+	return 1.1 / RATE[dr] + 0.0001
+
+def signed(msb, lsb):
+	v = (msb << 8) | lsb
+	if v > 32767:
+		v -= 65536
+	return v
+
+def volts(raw, pga):
+	return raw * FULL_SCALE[pga] / 32768.0
+
+class ADS1115(object):
+
+	def __init__(self, addr=DEVICE, bus=bus, channels=None, poll=False, ready=None):
+		self.addr = addr
+		self.bus = bus
+		self.channels = list(channels or [Channel(m) for m in (MUX_AIN0, MUX_AIN1, MUX_AIN2, MUX_AIN3)])
+		self.poll = poll
+		self.ready = ready
+		self.comp_que = COMP_QUE_OFF
+		self.timeouts = 0
+		if ready is not None:
+			# ALERT/RDY as conversion ready: hi_thresh MSB 1, lo_thresh MSB 0,
+			# comparator on (assert after one conversion)
+			self.bus.batch(addr, [("w", REG_HI_THRESH, [0x80, 0x00]),
+				("w", REG_LO_THRESH, [0x00, 0x00])])
+			self.comp_que = 0
+
+	def start(self, ch):
+		c = config(ch, comp_que=self.comp_que)
+		self.bus.write_i2c_block_data(self.addr, REG_CONFIG, [c >> 8, c & 0xFF])
+
+	def idle(self):
+		(msb, lsb) = self.bus.read_i2c_block_data(self.addr, REG_CONFIG, 2)
+		return msb & 0x80
+
+	def wait(self, ch):
+		t = period(ch.dr)
+		if self.ready is None and not self.poll:
+			time.sleep(t)
+			return
+		done = self.ready or self.idle
+		end = time.time() + 2 * t
+		# nothing to see before the nominal conversion time
+		time.sleep(0.9 / RATE[ch.dr])
+		while not done():
+			if time.time() > end:
+				self.timeouts += 1
+				return
+			time.sleep(POLL)
+
+	def result(self):
+		(msb, lsb) = self.bus.read_i2c_block_data(self.addr, REG_CONVERSION, 2)
+		return signed(msb, lsb)
+
+	def read(self, ch):
+		# one single-shot conversion of channel ch (a Channel or an index)
+		if not isinstance(ch, Channel):
+			ch = self.channels[ch]
+		self.start(ch)
+		self.wait(ch)
+		return self.result()
+
+	def scan(self, out=None):
+		"""
+		Convert every channel once, in order. Returns a tuple of raw
+		values, or fills out (an array or list of len(channels)) and
+		returns it.
+		"""
+		if out is None:
+			return tuple(self.read(ch) for ch in self.channels)
+		for i, ch in enumerate(self.channels):
+			out[i] = self.read(ch)
+		return out
+
+	def continuous(self, ch):
+		# continuous conversions of one channel, read them with result()
+		if not isinstance(ch, Channel):
+			ch = self.channels[ch]
+		c = config(ch, start=False, single=False)
+		self.bus.write_i2c_block_data(self.addr, REG_CONFIG, [c >> 8, c & 0xFF])
+
+	def powerDown(self):
+		# back to single-shot mode, idle between conversions
+		c = config(self.channels[0], start=False)
+		self.bus.write_i2c_block_data(self.addr, REG_CONFIG, [c >> 8, c & 0xFF])
+
+	def scanVolts(self):
+		return tuple(volts(self.read(ch), ch.pga) for ch in self.channels)
+
+	def scanTime(self):
+		# expected duration of one scan, bus time excluded, s
+		return sum(period(ch.dr) for ch in self.channels)
+
+def main():
+	adc = ADS1115(0x49)
+	for i, v in enumerate(adc.scan()):
+		print "Digital Value of Analog Input on Channel-%d: %d" % (i, v)
+
+if __name__ == '__main__':
+	main()
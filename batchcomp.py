@@ -0,0 +1,93 @@
+#----------------------------------------------------------------------
+#  batchcomp.py
+#  Compensation of whole arrays of raw sensor values with NumPy, for
+#  high rate logging and for reprocessing archived raw readings.
+#
+#  The formulas are those of bme280.compensate and bmp180.compensate,
+#  operation by operation and in the same order, so every result is
+#  identical to the scalar one: 64 bit integers where the scalar code
+#  uses (Python 2) integers, with // for its integer divisions, and
+#  float64 where it uses floats.
+#----------------------------------------------------------------------
+import numpy as np
+
+def bme280(cal, temp_raw, pres_raw, hum_raw):
+	"""
+	cal: bme280.Calibration; raw arrays of the same length.
+	Returns (temperature C, pressure hPa, humidity %) float64 arrays.
+	"""
+	(T1, T2, T3, P1, P2, P3, P4, P5, P6, P7, P8, P9,
+	 H1, H2, H3, H4, H5, H6) = cal
+	temp_raw = np.asarray(temp_raw, dtype=np.int64)
+	pres_raw = np.asarray(pres_raw, dtype=np.int64)
+	hum_raw = np.asarray(hum_raw, dtype=np.int64)
+
+	# temperature, integer
+	var1 = (((temp_raw >> 3) - (T1 << 1)) * T2) >> 11
+	d = (temp_raw >> 4) - T1
+	var2 = (((d * d) >> 12) * T3) >> 14
+	t_fine = var1 + var2
+	temperature = (((t_fine * 5) + 128) >> 8).astype(np.float64)
+
+	# pressure, float
+	tf = t_fine.astype(np.float64)
+	var1 = tf / 2.0 - 64000.0
+	var2 = var1 * var1 * P6 / 32768.0
+	var2 = var2 + var1 * P5 * 2.0
+	var2 = var2 / 4.0 + P4 * 65536.0
+	var1 = (P3 * var1 * var1 / 524288.0 + P2 * var1) / 524288.0
+	var1 = (1.0 + var1 / 32768.0) * P1
+	zero = var1 == 0
+	var1 = np.where(zero, 1.0, var1)
+	pressure = 1048576.0 - pres_raw
+	pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
+	var1 = P9 * pressure * pressure / 2147483648.0
+	var2 = pressure * P8 / 32768.0
+	pressure = pressure + (var1 + var2 + P7) / 16.0
+	pressure[zero] = 0.0
+
+	# humidity, float
+	humidity = tf - 76800.0
+	humidity = (hum_raw - (H4 * 64.0 + H5 / 16384.0 * humidity)) * (H2 / 65536.0 * (1.0 + H6 / 67108864.0 * humidity * (1.0 + H3 / 67108864.0 * humidity)))
+	humidity = humidity * (1.0 - H1 * humidity / 524288.0)
+	humidity = np.clip(humidity, 0.0, 100.0)
+
+	return temperature / 100.0, pressure / 100.0, humidity
+
+def bmp180(cal, UT, UP, oversample=3):
+	"""
+	cal: bmp180.Calibration; UT, UP arrays of the same length, UP read
+	with `oversample`. Returns (temperature C, pressure hPa) arrays.
+	"""
+	(AC1, AC2, AC3, AC4, AC5, AC6, B1, B2, MB, MC, MD) = cal
+	UT = np.asarray(UT, dtype=np.int64)
+	UP = np.asarray(UP, dtype=np.int64)
+
+	# temperature
+	X1 = ((UT - AC6) * AC5) >> 15
+	X2 = (MC << 11) // (X1 + MD)
+	B5 = X1 + X2
+	temperature = (B5 + 8) >> 4
+
+	# pressure
+	B6 = B5 - 4000
+	B62 = (B6 * B6) >> 12
+	X1 = (B2 * B62) >> 11
+	X2 = (AC2 * B6) >> 11
+	X3 = X1 + X2
+	B3 = (((AC1 * 4 + X3) << oversample) + 2) >> 2
+
+	X1 = (AC3 * B6) >> 13
+	X2 = (B1 * B62) >> 16
+	X3 = ((X1 + X2) + 2) >> 2
+	B4 = (AC4 * (X3 + 32768)) >> 15
+	B7 = (UP - B3) * (50000 >> oversample)
+
+	P = (B7 * 2) // B4
+
+	X1 = (P >> 8) * (P >> 8)
+	X1 = (X1 * 3038) >> 16
+	X2 = (-7357 * P) >> 16
+	pressure = P + ((X1 + X2 + 3791) >> 4)
+
+	return temperature / 10.0, pressure / 100.0
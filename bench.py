@@ -0,0 +1,178 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench.py
+#  The motion and sensor hot path benchmarks in one run, on the fake
+#  backends, results as JSON for comparing runs over time:
+#
+#     python bench.py > run.json
+#     python bench.py -o run.json motion latency
+#     python bench.py --compare old.json new.json
+#
+#  Suites: motion (step rate achieved against requested, CPU per step),
+#  latency (first step after a command, control socket and .mpp file
+#  through ppm_event.MyHandler), bme280 and bmp180 (cost per sample of
+#  readBME280All/readBmp180 and of the drivers), ads1115 (scan rate),
+#  metrics (cost of the instrumentation) and sim (replay of the old
+#  ppm_event test loop on the virtual clock). A suite that cannot run
+#  here records its error and the others go on.
+#----------------------------------------------------------------------
+import sys
+import time
+import json
+import platform
+import subprocess
+
+STEPS = 2000		# per motion run
+TRIALS = 10		# commands per latency path
+SAMPLES = 20		# sensor samples per case
+SCANS = 10		# ADS1115 scans per case
+
+def per_sample(fn, n):
+	# wall and CPU ms per call of fn
+	t0 = time.time()
+	c0 = time.clock()
+	for i in xrange(n):
+		v = fn()
+	return {"value": v, "ms_per_sample": (time.time() - t0) * 1e3 / n,
+		"cpu_ms_per_sample": (time.clock() - c0) * 1e3 / n}
+
+def motion_suite():
+	import bench_motion
+	res = {"step_cpu_us": bench_motion.step_cpu()}
+	for speed in bench_motion.SPEEDS:
+		r = bench_motion.bench(speed, STEPS)
+		r["rate_ratio"] = r["cruise_rate"] / speed
+		res[str(speed)] = r
+	return res
+
+def latency_suite():
+	import bench_ctl
+	res = {"socket": bench_ctl.bench_socket(TRIALS)}
+	try:
+		res["file"] = bench_ctl.bench_file(TRIALS)
+	except ImportError, e:
+		res["file"] = {"error": str(e)}
+	return res
+
+def bme280_suite():
+	import i2cbus
+	import bme280
+	import bench_bme280
+	from fakesmbus import FakeSMBus, FakeBME280
+	res = bench_bme280.bench(SAMPLES)
+	i2cbus.use(0, FakeSMBus({bme280.DEVICE: FakeBME280()}, hz=100000))
+	res["readBME280All"] = per_sample(bme280.readBME280All, SAMPLES)
+	return res
+
+def bmp180_suite():
+	import i2cbus
+	import bmp180
+	import bench_bmp180
+	from fakesmbus import FakeSMBus, FakeBMP180
+	res = bench_bmp180.bench(SAMPLES)
+	i2cbus.use(0, FakeSMBus({bmp180.DEVICE: FakeBMP180()}, hz=100000))
+	res["readBmp180"] = per_sample(bmp180.readBmp180, SAMPLES)
+	return res
+
+def ads1115_suite():
+	import bench_ads1115
+	return bench_ads1115.bench(SCANS)
+
+def metrics_suite():
+	import bench_metrics
+	return bench_metrics.bench(STEPS * 10)
+
+def sim_suite():
+	import mpp
+	import sim
+	prog = mpp.parse("mov 2000,8192,1\nmov 1500,8192,-1")
+	res = {}
+	for name, cost, overshoot in (("ideal", 0.0, 0.0), ("loaded", 30e-6, 80e-6)):
+		s = sim.Sim(sim.VirtualClock(overshoot=overshoot), cost)
+		s.play(mpp.parse(sim.INIT))
+		t0 = time.time()
+		v = s.play(prog)
+		r = s.stats()[""]
+		r["virtual_s"] = v
+		r["real_s"] = time.time() - t0
+		res[name] = r
+	return res
+
+SUITES = [("motion", motion_suite), ("latency", latency_suite),
+	("bme280", bme280_suite), ("bmp180", bmp180_suite),
+	("ads1115", ads1115_suite), ("metrics", metrics_suite), ("sim", sim_suite)]
+
+def revision():
+	try:
+		p = subprocess.Popen(["git", "rev-parse", "--short", "HEAD"],
+			stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		return p.communicate()[0].strip() or None
+	except OSError:
+		return None
+
+def run(names=None):
+	res = {"time": time.time(), "host": platform.node(),
+		"python": platform.python_version(), "revision": revision()}
+	# what the code under test prints stays out of the JSON
+	stdout = sys.stdout
+	sys.stdout = sys.stderr
+	try:
+		for name, fn in SUITES:
+			if names and name not in names:
+				continue
+			t0 = time.time()
+			try:
+				r = fn()
+			except Exception, e:
+				r = {"error": "%s: %s" % (e.__class__.__name__, e)}
+			r["suite_s"] = time.time() - t0
+			res[name] = r
+			print "%-8s %.1f s" % (name, r["suite_s"])
+	finally:
+		sys.stdout = stdout
+	return res
+
+#----------------------------------------------------------------------
+def flatten(d, prefix=""):
+	# numeric leaves of nested dicts as {"a.b.c": value}
+	out = {}
+	for k, v in d.items():
+		key = prefix + str(k)
+		if isinstance(v, dict):
+			out.update(flatten(v, key + "."))
+		elif isinstance(v, (int, float)) and not isinstance(v, bool):
+			out[key] = v
+	return out
+
+def compare(old, new):
+	a = flatten(old)
+	b = flatten(new)
+	for k in sorted(set(a) & set(b)):
+		if k == "time":
+			continue
+		change = ""
+		if a[k]:
+			change = "%+7.1f%%" % ((b[k] - a[k]) * 100.0 / abs(a[k]))
+		print "%-44s %14.4f %14.4f %s" % (k, a[k], b[k], change)
+
+def main():
+	args = sys.argv[1:]
+	if args[:1] == ["--compare"]:
+		old, new = [json.load(open(p)) for p in args[1:3]]
+		compare(old, new)
+		return
+	out = None
+	if args[:1] == ["-o"]:
+		out = args[1]
+		args = args[2:]
+	res = run(args)
+	text = json.dumps(res, indent=1, sort_keys=True)
+	if out is None:
+		print text
+	else:
+		f = open(out, "w")
+		f.write(text + "\n")
+		f.close()
+
+if __name__ == '__main__':
+	main()
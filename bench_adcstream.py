@@ -0,0 +1,85 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_adcstream.py
+#  Continuous ADS1115 acquisition at 860 SPS from a fake chip on a
+#  400 kHz bus, with a position counter sampled alongside: achieved
+#  rate, missed conversions, CPU per sample, reader overruns, and the
+#  decimator checked against plain means of the same samples. Then the
+#  chip oscillator is made 8% slow: the repeated reads show up.
+#
+#  python bench_adcstream.py [seconds]
+#----------------------------------------------------------------------
+import os
+import sys
+import math
+import time
+import numpy as np
+import motion
+import i2cbus
+import ads1115
+from ads1115 import ADS1115, Channel
+from adcstream import AdcStream, Decimator
+from fakesmbus import FakeSMBus, FakeADS1115
+
+ADDR = 0x48
+
+def signal(t):
+	return 1.0 + 0.5 * math.sin(2 * math.pi * 5 * t)
+
+def bench(seconds, factor=8, drift=0.0):
+	chip = FakeADS1115({ads1115.MUX_AIN0: signal})
+	chip.drift = drift
+	fake = FakeSMBus({ADDR: chip}, hz=400000)
+	bus = i2cbus.use(0, fake)
+	adc = ADS1115(ADDR, bus, [Channel(ads1115.MUX_AIN0, ads1115.PGA_2_048, ads1115.DR_860)])
+	t0 = motion.now()
+	s = AdcStream(adc, 0, size=4096, position=lambda: int((motion.now() - t0) * 1000))
+	dec = Decimator(s.ring, factor)
+	slow = s.ring.reader()
+	cpu0 = os.times()
+	s.start()
+	end = motion.now() + seconds
+	while motion.now() < end:
+		time.sleep(0.05)
+		dec.update()
+	s.stop()
+	dec.update()
+	cpu = os.times()
+	used = (cpu[0] - cpu0[0]) + (cpu[1] - cpu0[1])
+	n = s.ring.n
+	elapsed = motion.now() - t0
+	# a reader that waited the whole run has lost all but the last size
+	views = slow.read()
+	# decimator: means of the samples the ring still holds
+	ring = s.ring
+	first = max(0, n - ring.size)
+	first += (-first) % factor
+	full = (n - first) // factor
+	v = np.concatenate([x[1] for x in ring.views(first, first + full * factor)]).astype(np.float64)
+	expect = v.reshape(full, factor).mean(1)
+	d = dec.ring
+	got = np.concatenate([x[1] for x in d.views(first // factor, first // factor + full)])
+	return {"seconds": elapsed, "samples": n, "rate": n / elapsed,
+		"nominal": ads1115.RATE[ads1115.DR_860], "missed": s.missed, "repeats": s.repeats,
+		"errors": s.errors, "cpu_us_per_sample": used * 1e6 / max(n, 1),
+		"slow_reader_overruns": slow.overruns,
+		"slow_reader_got": sum(len(x[0]) for x in views),
+		"decimated": d.n, "decimator_max_error": float(abs(got - expect).max()),
+		"chip_conversions": chip.conversions}
+
+def main():
+	seconds = 2.0
+	if len(sys.argv) > 1:
+		seconds = float(sys.argv[1])
+	r = bench(seconds)
+	print "%d samples in %.2f s: %.1f/s of %d SPS, %d missed, %d repeats, %d errors, %.0f us CPU per sample" % (
+		r["samples"], r["seconds"], r["rate"], r["nominal"], r["missed"], r["repeats"], r["errors"],
+		r["cpu_us_per_sample"])
+	print "slow reader: %d lost, %d kept; decimator: %d means, max error %g" % (
+		r["slow_reader_overruns"], r["slow_reader_got"], r["decimated"], r["decimator_max_error"])
+	r = bench(seconds, drift=-0.08)
+	print "chip 8%% slow: %d samples, %d conversions, %d repeats" % (
+		r["samples"], r["chip_conversions"], r["repeats"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,63 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_ads1115.py
+#  Four channel ADS1115 scan on a fake 400 kHz bus: the old
+#  adc_channels.py sequence (continuous mode, 0.5 s sleep per channel)
+#  against single-shot scans waiting one conversion period, polling
+#  the OS bit and watching the ALERT/RDY pin, at 128 and 860 SPS.
+#
+#  python bench_ads1115.py [scans]
+#----------------------------------------------------------------------
+import sys
+import time
+import motion
+import i2cbus
+import ads1115
+from ads1115 import ADS1115, Channel
+from fakesmbus import FakeSMBus, FakeADS1115
+
+ADDR = 0x49
+INPUTS = {4: 0.5, 5: 1.0, 6: -0.25, 7: 2.5}
+
+def legacy(bus):
+	out = []
+	for cfg in (0xC483, 0xD483, 0xE483, 0xF483):
+		bus.write_i2c_block_data(ADDR, 0x01, [cfg >> 8, cfg & 0xFF])
+		time.sleep(0.5)
+		out.append(ads1115.signed(*bus.read_i2c_block_data(ADDR, 0x00, 2)))
+	return tuple(out)
+
+def run(fake, scans, scan):
+	fake.reset()
+	t0 = motion.now()
+	for i in xrange(scans):
+		v = scan()
+	t = motion.now() - t0
+	return {"value": v, "scans_per_s": scans / t,
+		"transactions": fake.transactions / float(scans)}
+
+def bench(scans, legacy_scans=1):
+	chip = FakeADS1115(INPUTS)
+	fake = FakeSMBus({ADDR: chip}, hz=400000)
+	bus = i2cbus.use(0, fake)
+	res = {"legacy": run(fake, legacy_scans, lambda: legacy(bus))}
+	for dr in (ads1115.DR_128, ads1115.DR_860):
+		chans = [Channel(m, ads1115.PGA_4_096, dr) for m in sorted(INPUTS)]
+		for name, kw in (("sleep", {}), ("poll", {"poll": True}),
+				("ready", {"ready": chip.ready})):
+			adc = ADS1115(ADDR, bus, chans, **kw)
+			res["%s_%d" % (name, ads1115.RATE[dr])] = run(fake, scans, adc.scan)
+	return res
+
+def main():
+	scans = 20
+	if len(sys.argv) > 1:
+		scans = int(sys.argv[1])
+	r = bench(scans)
+	for k in sorted(r):
+		x = r[k]
+		print "%-10s %7.2f scans/s %5.1f transactions per scan  %s" % (
+			k, x["scans_per_s"], x["transactions"], x["value"])
+
+if __name__ == '__main__':
+	main()
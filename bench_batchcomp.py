@@ -0,0 +1,100 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_batchcomp.py
+#  Vectorized compensation (batchcomp) against the scalar functions of
+#  bme280 and bmp180: every result of the first `check` samples must be
+#  within TOL of the scalar one (identical, the operations are the same),
+#  then both are timed (scalar on the checked part only). Exits 1 on any
+#  mismatch.
+#
+#  python bench_batchcomp.py [samples [check]]
+#----------------------------------------------------------------------
+import sys
+import time
+import numpy as np
+import batchcomp
+import bme280
+import bmp180
+from fakesmbus import FakeBME280, FakeBMP180
+
+TOL = 0.0	# largest difference allowed between vector and scalar results
+
+def differ(a, b):
+	return abs(a - b) > TOL
+
+def bme_cal():
+	c = FakeBME280
+	return bme280.Calibration(*(c.CALIB_T + c.CALIB_P + c.CALIB_H))
+
+def bmp_cal():
+	return bmp180.Calibration(*FakeBMP180.CALIB)
+
+def check_bme(cal, t, p, h, n):
+	vt, vp, vh = batchcomp.bme280(cal, t[:n], p[:n], h[:n])
+	bad = 0
+	t0 = time.time()
+	for i in xrange(n):
+		st, sp, sh = bme280.compensate(cal, int(t[i]), int(p[i]), int(h[i]))
+		if differ(st, vt[i]) or differ(sp, vp[i]) or differ(sh, vh[i]):
+			bad += 1
+	return bad, time.time() - t0
+
+def check_bmp(cal, ut, up, n, oss):
+	vt, vp = batchcomp.bmp180(cal, ut[:n], up[:n], oss)
+	bad = 0
+	t0 = time.time()
+	for i in xrange(n):
+		st, sp = bmp180.compensate(cal, int(ut[i]), int(up[i]), oss)
+		if differ(st, vt[i]) or differ(sp, vp[i]):
+			bad += 1
+	return bad, time.time() - t0
+
+def bench(samples, check):
+	rnd = np.random.RandomState(1)
+	res = {"samples": samples, "checked": check}
+
+	cal = bme_cal()
+	t = rnd.randint(400000, 600000, samples)
+	p = rnd.randint(200000, 600000, samples)
+	h = rnd.randint(0, 65536, samples)
+	bad, scalar = check_bme(cal, t, p, h, check)
+	t0 = time.time()
+	batchcomp.bme280(cal, t, p, h)
+	vec = time.time() - t0
+	res["bme280"] = {"mismatches": bad, "scalar_us": scalar * 1e6 / check,
+		"vector_us": vec * 1e6 / samples}
+
+	cal = bmp_cal()
+	oss = bmp180.OVERSAMPLE
+	# UT near 20280 divides by zero (X1 + MD), outside the -40..85 C range
+	ut = rnd.randint(22000, 40000, samples)
+	up = rnd.randint(20000 << oss, 50000 << oss, samples)
+	bad, scalar = check_bmp(cal, ut, up, check, oss)
+	t0 = time.time()
+	batchcomp.bmp180(cal, ut, up, oss)
+	vec = time.time() - t0
+	res["bmp180"] = {"mismatches": bad, "scalar_us": scalar * 1e6 / check,
+		"vector_us": vec * 1e6 / samples}
+	return res
+
+def main():
+	samples = 1000000
+	check = 100000
+	if len(sys.argv) > 1:
+		samples = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		check = int(sys.argv[2])
+	check = min(check, samples)
+	r = bench(samples, check)
+	bad = 0
+	for k in ("bme280", "bmp180"):
+		x = r[k]
+		bad += x["mismatches"]
+		print "%s: %d/%d mismatches, scalar %.2f us/sample, vector %.3f us/sample (%d samples)" % (
+			k, x["mismatches"], check, x["scalar_us"], x["vector_us"], samples)
+	if bad:
+		print "FAIL: vector results differ from the scalar ones by more than %g" % TOL
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,45 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_bme280.py
+#  I2C traffic per BME280 sample on a fake 100 kHz bus: calibration
+#  read with every sample (as readBME280All used to) against the
+#  calibration cached per chip.
+#
+#  python bench_bme280.py [samples]
+#----------------------------------------------------------------------
+import sys
+import motion
+import i2cbus
+import bme280
+from fakesmbus import FakeSMBus, FakeBME280
+
+def run(fake, samples, cold):
+	dev = bme280.BME280()
+	fake.reset()
+	t0 = motion.now()
+	for i in xrange(samples):
+		if cold:
+			dev.init()
+		v = dev.read()
+	t = motion.now() - t0
+	return {"value": v, "ms_per_sample": t * 1e3 / samples,
+		"transactions": fake.transactions / float(samples),
+		"bytes": (fake.bytes_read + fake.bytes_written) / float(samples)}
+
+def bench(samples):
+	fake = FakeSMBus({bme280.DEVICE: FakeBME280()}, hz=100000)
+	i2cbus.use(0, fake)
+	return {"uncached": run(fake, samples, True), "cached": run(fake, samples, False)}
+
+def main():
+	samples = 50
+	if len(sys.argv) > 1:
+		samples = int(sys.argv[1])
+	r = bench(samples)
+	for k in ("uncached", "cached"):
+		x = r[k]
+		print "%-8s %5.1f bytes %4.1f transactions %6.2f ms per sample" % (
+			k, x["bytes"], x["transactions"], x["ms_per_sample"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,66 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_bmp180.py
+#  BMP180 pressure sample rate on a fake 100 kHz bus: the old
+#  readBmp180 (calibration, 5 ms temperature, 40 ms pressure every
+#  sample) against the BMP180 sampler with waits from the oversampling
+#  setting, with SCO polling, and with temperature reused.
+#
+#  python bench_bmp180.py [samples]
+#----------------------------------------------------------------------
+import sys
+import time
+import motion
+import i2cbus
+import bmp180
+from fakesmbus import FakeSMBus, FakeBMP180
+
+def legacy(bus, addr=bmp180.DEVICE):
+	cal = bmp180.readCalibration(addr, bus)
+	bus.write_byte_data(addr, bmp180.REG_MEAS, bmp180.CRV_TEMP)
+	time.sleep(0.005)
+	(msb, lsb) = bus.read_i2c_block_data(addr, bmp180.REG_MSB, 2)
+	UT = (msb << 8) + lsb
+	oss = bmp180.OVERSAMPLE
+	bus.write_byte_data(addr, bmp180.REG_MEAS, bmp180.CRV_PRES + (oss << 6))
+	time.sleep(0.04)
+	(msb, lsb, xsb) = bus.read_i2c_block_data(addr, bmp180.REG_MSB, 3)
+	UP = ((msb << 16) + (lsb << 8) + xsb) >> (8 - oss)
+	return bmp180.compensate(cal, UT, UP)
+
+def run(fake, samples, read):
+	fake.reset()
+	chip = fake.devices[bmp180.DEVICE]
+	c0 = chip.conversions
+	t0 = motion.now()
+	for i in xrange(samples):
+		v = read()
+	t = motion.now() - t0
+	return {"value": v, "samples_per_s": samples / t,
+		"conversions": (chip.conversions - c0) / float(samples),
+		"bytes": (fake.bytes_read + fake.bytes_written) / float(samples)}
+
+def bench(samples):
+	fake = FakeSMBus({bmp180.DEVICE: FakeBMP180()}, hz=100000)
+	bus = i2cbus.use(0, fake)
+	res = {"legacy": run(fake, samples, lambda: legacy(bus))}
+	for name, kw in (("sampler", {"temp_every": 1}),
+			("poll", {"temp_every": 1, "poll": True}),
+			("reuse", {}),
+			("reuse_poll", {"poll": True})):
+		dev = bmp180.BMP180(bus=bus, **kw)
+		res[name] = run(fake, samples, dev.read)
+	return res
+
+def main():
+	samples = 50
+	if len(sys.argv) > 1:
+		samples = int(sys.argv[1])
+	r = bench(samples)
+	for k in ("legacy", "sampler", "poll", "reuse", "reuse_poll"):
+		x = r[k]
+		print "%-10s %6.1f samples/s %4.2f conversions %5.1f bytes per sample  %s" % (
+			k, x["samples_per_s"], x["conversions"], x["bytes"], x["value"])
+
+if __name__ == '__main__':
+	main()
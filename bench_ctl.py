@@ -0,0 +1,125 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_ctl.py
+#  Command to first step latency: file drop watched by watchdog
+#  (ppm_event.MyHandler) against the control socket.
+#
+#  python bench_ctl.py [trials]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import shutil
+import tempfile
+import motion
+import ctlsock
+from controller import MotionController
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+class TimedOutput(RecordingOutput):
+	# remembers when the first phase after arm() was written
+
+	first = None
+
+	def arm(self):
+		self.first = None
+
+	def _set(self, mask, changed):
+		if self.first is None:
+			self.first = motion.now()
+		RecordingOutput._set(self, mask, changed)
+
+def motor(*pins):
+	m = stepper(*pins, out=TimedOutput(pins), pos_file=None)
+	m.start = 1000
+	return m
+
+def wait_step(out, t0, timeout=5.0):
+	while out.first is None:
+		if motion.now() - t0 > timeout:
+			return None
+		time.sleep(0.0002)
+	return out.first - t0
+
+def wait_idle(c):
+	while not c.idle():
+		time.sleep(0.01)
+
+def stats(lat):
+	lat = sorted(x for x in lat if x is not None)
+	if not lat:
+		return {"n": 0}
+	return {"n": len(lat), "min_ms": lat[0] * 1e3, "median_ms": lat[len(lat) // 2] * 1e3,
+		"max_ms": lat[-1] * 1e3}
+
+def bench_socket(trials):
+	c = MotionController(motor)
+	c.start()
+	path = tempfile.mktemp(suffix=".sock")
+	srv = ctlsock.CommandServer(c, path)
+	srv.start()
+	cl = ctlsock.Client(path)
+	cl.send("init 7,0,2,3")
+	wait_idle(c)
+	lat = []
+	for i in range(trials):
+		c.motor.out.arm()
+		t0 = motion.now()
+		cl.send("mov 2000,20,%d" % (1 - 2 * (i & 1)))
+		lat.append(wait_step(c.motor.out, t0))
+		wait_idle(c)
+	cl.close()
+	srv.close()
+	return stats(lat)
+
+def bench_file(trials):
+	from watchdog.observers import Observer
+	from ppm_event import MyHandler
+	c = MotionController(motor)
+	c.start()
+	d = tempfile.mkdtemp()
+	observer = Observer()
+	observer.schedule(MyHandler(c), path=d)
+	observer.start()
+	path = os.path.join(d, "motor.mpp")
+	lat = []
+	try:
+		f = open(path, "w")
+		f.write("init 7,0,2,3\n")
+		f.close()
+		time.sleep(0.5)
+		wait_idle(c)
+		for i in range(trials):
+			c.motor.out.arm()
+			t0 = motion.now()
+			f = open(path, "w")
+			f.write("mov 2000,20,%d\n" % (1 - 2 * (i & 1)))
+			f.close()
+			lat.append(wait_step(c.motor.out, t0))
+			wait_idle(c)
+	finally:
+		observer.stop()
+		observer.join()
+		shutil.rmtree(d)
+	return stats(lat)
+
+def main():
+	trials = 10
+	if len(sys.argv) > 1:
+		trials = int(sys.argv[1])
+	res = {"socket": bench_socket(trials)}
+	try:
+		res["file"] = bench_file(trials)
+	except ImportError, e:
+		print "file path skipped: %s" % e
+	for k in sorted(res):
+		r = res[k]
+		if r["n"]:
+			print "%-6s %2d moves  latency min %.2f ms median %.2f ms max %.2f ms" % (
+				k, r["n"], r["min_ms"], r["median_ms"], r["max_ms"])
+		else:
+			print "%-6s no step seen" % k
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,42 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_gpio.py
+#  Pin writes per move on the recording backend. A half-step changes
+#  one coil, so a move of n half-steps may write at most n + 1 pins
+#  (the first phase out of the off state can switch two on) and must
+#  write n phases; the old stepper made 4 digitalWrite calls per step.
+#  Exits 1 when a move writes more.
+#
+#  python bench_gpio.py
+#----------------------------------------------------------------------
+import sys
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+MOVES = [(1000, 1), (999, -1), (1, 1), (4096, -1)]	# half-steps, direction
+
+def bench():
+	# (steps, pin writes, phases written) of every move of MOVES
+	m = stepper(7, 0, 2, 3, out=RecordingOutput([7, 0, 2, 3]), pos_file=None)
+	res = []
+	for steps, d in MOVES:
+		m.out.reset()
+		step = m.step_fn(d)
+		for i in xrange(steps):
+			step(i)
+		res.append((steps, m.out.pin_writes, len(m.out.log)))
+		m.stop()
+	return res
+
+def main():
+	bad = 0
+	for steps, pins, phases in bench():
+		fail = pins > steps + 1 or phases != steps
+		bad += fail
+		print "%5d half-steps: %5d pin writes (at most %d, old %d), %5d phases%s" % (
+			steps, pins, steps + 1, 4 * steps, phases, fail and "  FAIL" or "")
+	if bad:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
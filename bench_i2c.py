@@ -0,0 +1,73 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_i2c.py
+#  Sensor drivers on the shared bus manager, against the fake SMBus:
+#  per sample cost and per device transaction statistics, with the
+#  BME280 and BMP180 drivers read from two threads at once.
+#
+#  python bench_i2c.py [samples]
+#----------------------------------------------------------------------
+import sys
+import threading
+import motion
+import i2cbus
+from fakesmbus import FakeSMBus, FakeBME280, FakeBMP180
+
+BME = 0x76	# SDO low, the BMP180 keeps 0x77
+BMP = 0x77
+
+def setup(hz=100000):
+	fake = FakeSMBus({BME: FakeBME280(), BMP: FakeBMP180()}, hz=hz)
+	i2cbus.use(0, fake)
+	return fake
+
+def bench(samples):
+	import bme280
+	import bmp180
+	fake = setup()
+	res = {}
+	for name, read in (("bme280", lambda: bme280.readBME280All(BME)),
+			("bmp180", lambda: bmp180.readBmp180(BMP))):
+		fake.reset()
+		t0 = motion.now()
+		for i in xrange(samples):
+			v = read()
+		t = motion.now() - t0
+		res[name] = {"value": v, "ms_per_sample": t * 1e3 / samples,
+			"transactions": fake.transactions / float(samples),
+			"bytes": (fake.bytes_read + fake.bytes_written) / float(samples)}
+	# both drivers at once on the one bus
+	fake.reset()
+	errors = []
+	def loop(read):
+		try:
+			for i in xrange(samples):
+				read()
+		except Exception, e:
+			errors.append(e)
+	th = [threading.Thread(target=loop, args=(lambda: bme280.readBME280All(BME),)),
+		threading.Thread(target=loop, args=(lambda: bmp180.readBmp180(BMP),))]
+	t0 = motion.now()
+	for t in th:
+		t.start()
+	for t in th:
+		t.join()
+	res["concurrent"] = {"ms": (motion.now() - t0) * 1e3, "errors": len(errors),
+		"transactions": fake.transactions}
+	return res
+
+def main():
+	samples = 20
+	if len(sys.argv) > 1:
+		samples = int(sys.argv[1])
+	r = bench(samples)
+	for k in ("bme280", "bmp180"):
+		x = r[k]
+		print "%s %s: %.2f ms/sample, %.1f transactions, %.1f bytes" % (
+			k, x["value"], x["ms_per_sample"], x["transactions"], x["bytes"])
+	c = r["concurrent"]
+	print "both threads: %.1f ms, %d transactions, %d errors" % (c["ms"], c["transactions"], c["errors"])
+	print i2cbus.report()
+
+if __name__ == '__main__':
+	main()
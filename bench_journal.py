@@ -0,0 +1,107 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_journal.py
+#  Position journal and homing, offline:
+#   - a move with the journal on: records and fsyncs it cost, against
+#     an fsync for every record
+#   - restart: a new stepper on the same journal finds the position,
+#     also with a torn record at the end, and the moves made after
+#     that restart are found by the next one
+#   - home against a simulated limit switch, from both sides of it
+#
+#  python bench_journal.py [steps]
+#----------------------------------------------------------------------
+import os
+import sys
+import shutil
+import tempfile
+import motion
+import journal
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+def motor(path):
+	m = stepper(7, 0, 2, 3, out=RecordingOutput(), pos_file=None, journal_file=path)
+	m.start = 200
+	m.acc = m.dec = 200
+	return m
+
+def per_record_fsync(path, n):
+	fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0644)
+	t0 = motion.now()
+	for i in xrange(n):
+		os.write(fd, journal._pack(i, i, 0))
+		os.fsync(fd)
+	t = motion.now() - t0
+	os.close(fd)
+	return t / n
+
+def bench(steps):
+	d = tempfile.mkdtemp()
+	res = {}
+	try:
+		path = os.path.join(d, "pos.journal")
+		m = motor(path)
+		t0 = motion.now()
+		m.move(2000, steps, 1, settle=0)
+		res["move_s"] = motion.now() - t0
+		res["records"] = m.journal.writes
+		res["fsyncs"] = m.journal.syncs
+		m.update_stop()
+		res["fsync_ms"] = per_record_fsync(os.path.join(d, "fsync"), 200) * 1e3
+		m2 = motor(path)
+		res["restored"] = m2.numstep
+		res["expected"] = steps
+		m2.update_stop()
+		# crash in the middle of a record
+		f = open(path, "ab")
+		f.write(journal._pack(999, 12345, 0)[:11])
+		f.close()
+		m3 = motor(path)
+		res["restored_torn"] = m3.numstep
+		m3.move(2000, 500, -1, settle=0)
+		m3.update_stop()
+		m4 = motor(path)
+		res["restored_after_torn"] = m4.numstep
+		res["expected_after_torn"] = steps - 500
+		m4.update_stop()
+
+		# limit switch at physical position -700, closed below it
+		for start in (300, -900):
+			p = os.path.join(d, "home%d" % start)
+			m = motor(p)
+			last = [None]
+			def switch():
+				# physical position: numstep + start until home resets it
+				last[0] = m.numstep + start
+				return last[0] <= -700
+			t0 = motion.now()
+			ok = m.home(switch, 2000, -1)
+			res["home_from_%d" % start] = {"ok": ok, "seconds": motion.now() - t0,
+				"physical_zero": last[0], "numstep": m.numstep, "homed": m.homed}
+			m.update_stop()
+			back = motor(p)
+			res["home_from_%d" % start]["restored_homed"] = back.homed
+			back.update_stop()
+	finally:
+		shutil.rmtree(d)
+	return res
+
+def main():
+	steps = 4000
+	if len(sys.argv) > 1:
+		steps = int(sys.argv[1])
+	r = bench(steps)
+	print "move %d steps in %.2f s: %d records, %d fsyncs (one fsync %.2f ms)" % (
+		steps, r["move_s"], r["records"], r["fsyncs"], r["fsync_ms"])
+	print "restored %d (expected %d), with a torn record %d" % (
+		r["restored"], r["expected"], r["restored_torn"])
+	print "moved after the torn restart, restored %d (expected %d)" % (
+		r["restored_after_torn"], r["expected_after_torn"])
+	for k in ("home_from_300", "home_from_-900"):
+		x = r[k]
+		print "%s: ok %s, zero at physical %d, %.2f s, homed after restart %s" % (
+			k, x["ok"], x["physical_zero"], x["seconds"], x["restored_homed"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,85 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_metrics.py
+#  Cost of the instrumentation: CPU per step of a move with and
+#  without the lateness histogram and with the step trace (on the
+#  virtual clock of sim.py, so no waiting is counted), then the
+#  time to make the metrics text of a controller with two motors and
+#  the same text read from the HTTP endpoint.
+#
+#  python bench_metrics.py [steps]
+#----------------------------------------------------------------------
+import sys
+import time
+import urllib2
+import motion
+import mpp
+import metrics
+import sim
+from controller import MotionController
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+class Null(object):
+	def write(self, s):
+		pass
+
+def run(steps, late=None, trace=None):
+	m = stepper(7, 0, 2, 3, out=RecordingOutput(), pos_file=None)
+	m.start = 4000
+	m.late = late
+	m.trace = trace
+	clock = sim.VirtualClock()
+	m.clock = clock.now
+	m.sleep = clock.sleep
+	m.spin = 0.0
+	delays = motion.plan(4000, steps, 0, 0, 4000)
+	c0 = time.clock()
+	m.run(delays, 1)
+	return 1e6 * (time.clock() - c0) / steps
+
+def bench(steps):
+	reg = metrics.Registry()
+	late = reg.histogram("punter_step_late_us", "step lateness", motion.LATE_BOUNDS, motor="-")
+	res = {"plain_cpu_us": run(steps),
+		"late_cpu_us": run(steps, late),
+		"trace_cpu_us": run(steps, late, metrics.Tracer(100, Null())),
+		"late_mean_us": late.mean()}
+	c = MotionController(lambda *pins, **kw: stepper(*pins, out=RecordingOutput(pins), pos_file=None))
+	c.start()
+	c.submit_program(mpp.parse("init az 7,0,2,3\ninit el 21,22,23,24"))
+	while not c.idle():
+		time.sleep(0.01)
+	for k, v in sorted(c.commands.items()):
+		reg.add("punter_commands_total", "counter", "commands executed", v, key=k)
+	reg.collect(lambda: [("punter_position_halfsteps", "gauge", "motor position", {"motor": n},
+		lambda m=m: m.numstep) for n, m in sorted(c.motors.items())])
+	metrics.i2c(reg)
+	n = 1000
+	t0 = time.time()
+	for i in xrange(n):
+		text = reg.text()
+	res["text_ms"] = (time.time() - t0) * 1e3 / n
+	res["text_bytes"] = len(text)
+	srv = metrics.MetricsServer(reg, 0)
+	srv.start()
+	url = "http://127.0.0.1:%d/metrics" % srv.server.server_address[1]
+	t0 = time.time()
+	body = urllib2.urlopen(url).read()
+	res["http_ms"] = (time.time() - t0) * 1e3
+	res["http_same"] = body.split("punter_step_late_us_sum")[0] == text.split("punter_step_late_us_sum")[0]
+	srv.close()
+	return res
+
+def main():
+	steps = 20000
+	if len(sys.argv) > 1:
+		steps = int(sys.argv[1])
+	r = bench(steps)
+	print "cpu per step: plain %.2f us, lateness %.2f us, trace 1/100 %.2f us (late mean %.1f us)" % (
+		r["plain_cpu_us"], r["late_cpu_us"], r["trace_cpu_us"], r["late_mean_us"])
+	print "text %d bytes in %.3f ms, http %.2f ms, same %s" % (
+		r["text_bytes"], r["text_ms"], r["http_ms"], r["http_same"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,52 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_modes.py
+#  Drive modes on the fake output: a move of the same half-steps in
+#  half, full, wave and auto mode at a few speeds. Per mode: step
+#  events (calls of the executor), planned and actual time, highest
+#  event rate, and the final position (must be the same).
+#
+#  python bench_modes.py [half-steps]
+#----------------------------------------------------------------------
+import os
+import sys
+import motion
+from gpio_out import RecordingOutput
+from stepmotor import stepper, HALF, FULL, WAVE, AUTO
+
+SPEEDS = [1000, 2000, 4000]
+
+def run(mode, speed, steps):
+	m = stepper(7, 0, 2, 3, out=RecordingOutput(), pos_file=None)
+	m.start = 200
+	m.set_mode(mode)
+	delays, incs = m.prepare(speed, steps, 1)
+	cpu0 = os.times()
+	t0 = motion.now()
+	m.run(delays, 1, None, incs)
+	t = motion.now() - t0
+	cpu = os.times()
+	return {"events": len(delays), "planned_s": motion.duration(delays), "actual_s": t,
+		"max_event_rate": 1e6 / min(delays), "position": m.numstep,
+		"cpu_us_per_halfstep": ((cpu[0] - cpu0[0]) + (cpu[1] - cpu0[1])) * 1e6 / steps}
+
+def bench(steps):
+	res = {}
+	for speed in SPEEDS:
+		for mode in (HALF, FULL, WAVE, AUTO):
+			res["%s_%d" % (mode, speed)] = run(mode, speed, steps)
+	return res
+
+def main():
+	steps = 4096
+	if len(sys.argv) > 1:
+		steps = int(sys.argv[1])
+	r = bench(steps)
+	for speed in SPEEDS:
+		for mode in (HALF, FULL, WAVE, AUTO):
+			x = r["%s_%d" % (mode, speed)]
+			print "%-4s %4d/s: %5d events, planned %.3f s, actual %.3f s, peak %5.0f events/s, pos %d" % (
+				mode, speed, x["events"], x["planned_s"], x["actual_s"], x["max_event_rate"], x["position"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,83 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_motion.py
+#  Achieved step rate, timing jitter and CPU per step of stepper.move
+#  against the fake GPIO backend.
+#
+#  python bench_motion.py [steps]
+#----------------------------------------------------------------------
+import sys
+import time
+from array import array
+import motion
+from fakegpio import FakeWiringPi
+from gpio_out import WiringPiOutput
+from stepmotor import stepper
+
+SPEEDS = [500, 1000, 1800, 2000]
+
+def bench(speed, steps, shape=motion.TRAPEZOID):
+	m = stepper(7, 0, 2, 3, out=WiringPiOutput([7, 0, 2, 3], FakeWiringPi()), pos_file=None)
+	m.shape = shape
+	delays = motion.plan(speed, steps, m.acc, m.dec, m.start, shape)
+	step = m.step_fn(1)
+	times = array("d")
+	clock = motion.now
+	def timed(i):
+		step(i)
+		times.append(clock())
+	c0 = time.clock()
+	motion.run(delays, timed)
+	cpu = time.clock() - c0
+	# error of every step against its planned deadline
+	t0 = times[0]
+	planned = 0.0
+	err = []
+	for i in xrange(len(times)):
+		err.append(times[i] - t0 - planned)
+		planned += delays[i] * 1e-6
+	jit = [abs(err[i] - err[i - 1]) for i in xrange(1, len(err))]
+	# cruise segment only, ramps excluded
+	a = min(m.acc, steps - min(m.dec, steps // 2))
+	b = steps - min(m.dec, steps // 2)
+	rate = 0.0
+	if b - a > 1:
+		rate = (b - a - 1) / (times[b - 1] - times[a])
+	return {
+		"speed": speed,
+		"steps": steps,
+		"shape": shape,
+		"cruise_rate": rate,
+		"planned_s": motion.duration(delays),
+		"actual_s": times[-1] - t0 + delays[-1] * 1e-6,
+		"jitter_mean_us": 1e6 * sum(jit) / max(len(jit), 1),
+		"jitter_max_us": 1e6 * max(jit or [0]),
+		"late_max_us": 1e6 * max(err),
+		"writes": m.out.w.writes,
+		"cpu_us_per_step": 1e6 * cpu / steps,
+	}
+
+def step_cpu(n=100000):
+	# CPU time of one step call alone (phase write to the fake pins)
+	m = stepper(7, 0, 2, 3, out=WiringPiOutput([7, 0, 2, 3], FakeWiringPi()), pos_file=None)
+	step = m.step_fn(1)
+	c0 = time.clock()
+	for i in xrange(n):
+		step(i)
+	return 1e6 * (time.clock() - c0) / n
+
+def main():
+	steps = 3000
+	if len(sys.argv) > 1:
+		steps = int(sys.argv[1])
+	for shape in (motion.TRAPEZOID, motion.SCURVE):
+		for speed in SPEEDS:
+			r = bench(speed, steps, shape)
+			print "%-6s %5d st/s  cruise %7.1f st/s  %.3f/%.3f s  jitter mean %6.1f us max %7.1f us  late %7.1f us  writes %d  cpu %.1f us/step" % (
+				r["shape"], r["speed"], r["cruise_rate"], r["actual_s"], r["planned_s"],
+				r["jitter_mean_us"], r["jitter_max_us"], r["late_max_us"], r["writes"],
+				r["cpu_us_per_step"])
+	print "step call %.2f us cpu" % step_cpu()
+
+if __name__ == '__main__':
+	main()
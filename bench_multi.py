@@ -0,0 +1,69 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_multi.py
+#  Two named motors (az, el) on fake outputs through the controller:
+#  a sync move of different lengths, timed on the outputs. Reports how
+#  far apart the first and last steps of the two motors are, their
+#  step counts and the status line of the control socket.
+#
+#  python bench_multi.py [az steps [el steps]]
+#----------------------------------------------------------------------
+import sys
+import time
+import motion
+import mpp
+import ctlsock
+from controller import MotionController
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+class TimedOutput(RecordingOutput):
+
+	def _set(self, mask, changed):
+		self.times.append(motion.now())
+		RecordingOutput._set(self, mask, changed)
+
+def motor(*pins, **kw):
+	out = TimedOutput(pins)
+	out.times = []
+	m = stepper(*pins, out=out, pos_file=None)
+	m.start = 200
+	m.acc = m.dec = 200
+	return m
+
+def bench(az=3000, el=800, speed=2000):
+	c = MotionController(motor)
+	c.start()
+	c.submit_program(mpp.parse("init az 7,0,2,3\ninit el 21,22,23,24"))
+	while not c.idle():
+		time.sleep(0.01)
+	a = c.motors["az"].out
+	e = c.motors["el"].out
+	del a.times[:]
+	del e.times[:]
+	t0 = motion.now()
+	c.submit_program(mpp.parse("sync\nmov az %d,%d,1\nmov el %d,%d,-1\nend" % (speed, az, speed, el)))
+	time.sleep(0.1)
+	while not c.idle():
+		time.sleep(0.01)
+	return {"az_steps": c.motors["az"].numstep, "el_steps": c.motors["el"].numstep,
+		"start_skew_ms": (a.times[0] - e.times[0]) * 1e3,
+		"end_skew_ms": (a.times[-1] - e.times[-1]) * 1e3,
+		"move_s": a.times[-1] - a.times[0],
+		"planned_s": motion.duration(motion.plan(speed, az, 200, 200, 200)[:-1]),
+		"status": ctlsock._status(c)}
+
+def main():
+	az = 3000
+	el = 800
+	if len(sys.argv) > 1:
+		az = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		el = int(sys.argv[2])
+	r = bench(az, el)
+	print "az %d el %d steps in %.3f s (planned %.3f), start skew %.3f ms, end skew %.3f ms" % (
+		r["az_steps"], r["el_steps"], r["move_s"], r["planned_s"], r["start_skew_ms"], r["end_skew_ms"])
+	print r["status"]
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,102 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_posfile.py
+#  CPU cost of one pos.dat update: shell echo (the old update_pos)
+#  against the in-process atomic write of posfile. Then the writes of
+#  real moves are counted: at most ceil(duration * rate) + 2 during a
+#  move plus the final one at its end, none at rest, and the file left
+#  holding the final position. Exits 1 when they are not met.
+#
+#  python bench_posfile.py [updates]
+#----------------------------------------------------------------------
+import os
+import sys
+import math
+import time
+import shutil
+import tempfile
+import posfile
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+RATE = 10.0		# updates per second for the move check
+MOVES = [(2000, 1500, 1), (1000, 800, -1), (3000, 3000, 1)]	# speed, steps, dir
+
+def cpu():
+	# own and children CPU time, the shell runs as a child
+	t = os.times()
+	return t[0] + t[1] + t[2] + t[3]
+
+def bench(n):
+	d = tempfile.mkdtemp()
+	path = os.path.join(d, "pos.dat")
+	try:
+		t0 = cpu()
+		for i in xrange(n):
+			os.system("echo %d > %s" % (i, path))
+		shell = (cpu() - t0) / n
+
+		pos = [0]
+		pub = posfile.PosPublisher(path, lambda: pos[0])
+		t0 = cpu()
+		for i in xrange(n):
+			pos[0] = i
+			pub.publish()
+		atomic = (cpu() - t0) / n
+
+		# unchanged position: nothing is written
+		t0 = cpu()
+		for i in xrange(n):
+			pub.publish()
+		idle = (cpu() - t0) / n
+	finally:
+		shutil.rmtree(d)
+	return {"updates": n, "shell_us": shell * 1e6, "atomic_us": atomic * 1e6,
+		"unchanged_us": idle * 1e6}
+
+def moves(rate=RATE):
+	# (writes, allowed, writes at rest, file ok) per move of MOVES
+	d = tempfile.mkdtemp()
+	path = os.path.join(d, "pos.dat")
+	m = stepper(7, 0, 2, 3, out=RecordingOutput(), pos_file=path, pos_rate=rate)
+	m.start = 500
+	res = []
+	try:
+		for speed, steps, dir in MOVES:
+			w0 = m.pub.writes
+			t0 = time.time()
+			m.move(speed, steps, dir, settle=0)
+			writes = m.pub.writes - w0
+			allowed = int(math.ceil((time.time() - t0) * rate)) + 2 + 1
+			w0 = m.pub.writes
+			time.sleep(3.0 / rate)
+			f = open(path)
+			ok = int(f.read()) == m.numstep
+			f.close()
+			res.append((writes, allowed, m.pub.writes - w0, ok))
+	finally:
+		m.update_stop()
+		shutil.rmtree(d)
+	return res
+
+def main():
+	n = 500
+	if len(sys.argv) > 1:
+		n = int(sys.argv[1])
+	r = bench(n)
+	print "%d updates, CPU per update:" % n
+	print "  os.system echo   %9.1f us" % r["shell_us"]
+	print "  atomic rename    %9.1f us" % r["atomic_us"]
+	print "  unchanged value  %9.1f us" % r["unchanged_us"]
+	bad = 0
+	for (speed, steps, dir), (writes, allowed, rest, ok) in zip(MOVES, moves()):
+		fail = writes > allowed or rest or not ok
+		bad += fail
+		print "  move %d,%d,%d: %d writes (at most %d), %d at rest, file %s%s" % (
+			speed, steps, dir, writes, allowed, rest, ok and "ok" or "wrong",
+			fail and "  FAIL" or "")
+	if bad:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
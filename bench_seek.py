@@ -0,0 +1,52 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_seek.py
+#  Peak-seek against a simulated antenna: the metric is a gaussian beam
+#  of the motor position plus noise, read in about 1.2 ms like an
+#  ADS1115 single-shot at 860 SPS. Reports where seek parked against
+#  the true peak, the sweep samples and the time taken.
+#
+#  python bench_seek.py [peak offset [span]]
+#----------------------------------------------------------------------
+import sys
+import math
+import time
+import random
+import motion
+import seek
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+def beam(motor, peak, width=300.0, noise=0.01):
+	rnd = random.Random(1)
+	def metric():
+		time.sleep(0.0012)
+		d = (motor.numstep - peak) / width
+		return math.exp(-d * d) + rnd.gauss(0, noise)
+	return metric
+
+def bench(offset=137, span=1500, speed=2000, tol=1):
+	m = stepper(7, 0, 2, 3, out=RecordingOutput(), pos_file=None)
+	m.start = 200
+	m.acc = m.dec = 200
+	t0 = motion.now()
+	r = seek.seek(m, beam(m, offset), speed, span, tol, settle=0.01)
+	return {"true_peak": offset, "peak": r.peak, "error": r.peak - offset,
+		"coarse": r.coarse, "samples": r.samples, "bins": len(r.positions),
+		"evaluations": r.evaluations, "seconds": motion.now() - t0,
+		"position": m.numstep}
+
+def main():
+	offset = 137
+	span = 1500
+	if len(sys.argv) > 1:
+		offset = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		span = int(sys.argv[2])
+	r = bench(offset, span)
+	print "peak %d (true %d, error %d), coarse %d from %d samples in %d bins, %d evaluations, %.1f s" % (
+		r["peak"], r["true_peak"], r["error"], r["coarse"], r["samples"], r["bins"],
+		r["evaluations"], r["seconds"])
+
+if __name__ == '__main__':
+	main()
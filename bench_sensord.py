@@ -0,0 +1,71 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_sensord.py
+#  The sensor scheduler with a BME280, a BMP180 and a four channel
+#  ADS1115 on one fake 100 kHz bus, every task at a short period:
+#  readings per task against the requested rate, lateness and CPU per
+#  run, once with the blocking driver reads and once with the
+#  conversion waits yielded to the scheduler.
+#
+#  python bench_sensord.py [seconds]
+#----------------------------------------------------------------------
+import sys
+import motion
+import i2cbus
+import bme280
+import bmp180
+import ads1115
+import sensord
+from fakesmbus import FakeSMBus, FakeBME280, FakeBMP180, FakeADS1115
+
+BME = 0x76
+BMP = 0x77
+ADC = 0x48
+PERIODS = {"bme280": 0.02, "bmp180": 0.03, "ads1115": 0.05}
+
+def run(seconds, interleave):
+	fake = FakeSMBus({BME: FakeBME280(), BMP: FakeBMP180(),
+		ADC: FakeADS1115({4: 0.1, 5: 0.2, 6: 0.3, 7: 0.4})}, hz=100000)
+	bus = i2cbus.use(0, fake)
+	devs = {"bme280": bme280.BME280(BME, bus), "bmp180": bmp180.BMP180(BMP, bus),
+		"ads1115": ads1115.ADS1115(ADC, bus)}
+	count = dict((k, 0) for k in devs)
+	def sink(name, t, value):
+		count[name] += 1
+	s = sensord.Scheduler(sink)
+	for name in sorted(devs):
+		d = devs[name]
+		if interleave:
+			fn = getattr(sensord, name + "_task")(d)
+		elif name == "ads1115":
+			fn = d.scan
+		else:
+			fn = d.read
+		s.add(name, fn, PERIODS[name])
+	s.run(motion.now() + seconds)
+	res = {}
+	for t in s.tasks:
+		res[t.name] = {"runs": count[t.name], "wanted": int(seconds / t.period),
+			"skipped": t.skipped, "errors": t.errors,
+			"late_mean_us": t.late.mean(), "late_max_us": t.max_late * 1e6,
+			"cpu_us": t.cpu * 1e6 / max(t.runs, 1)}
+	return res
+
+def bench(seconds):
+	return {"blocking": run(seconds, False), "interleaved": run(seconds, True)}
+
+def main():
+	seconds = 3.0
+	if len(sys.argv) > 1:
+		seconds = float(sys.argv[1])
+	r = bench(seconds)
+	for mode in ("blocking", "interleaved"):
+		print mode
+		for name in sorted(r[mode]):
+			x = r[mode][name]
+			print "  %-8s %4d/%4d readings %4d skipped, late mean %6.0f max %6.0f us, cpu %5.0f us/run" % (
+				name, x["runs"], x["wanted"], x["skipped"], x["late_mean_us"],
+				x["late_max_us"], x["cpu_us"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,90 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_status.py
+#  Stress test of the status block: one writer updating as fast as it
+#  can, several reader processes checking every snapshot they get.
+#  The writer keeps speed == 2 * numstep and target == numstep + 1, a
+#  snapshot breaking that is a torn read. Exits 1 on any torn read.
+#
+#  python bench_status.py [readers] [seconds]
+#----------------------------------------------------------------------
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+import status
+
+def reader(path, stop, out):
+	r = status.StatusReader(path)
+	reads = 0
+	torn = 0
+	last = -1
+	backwards = 0
+	stale = 0
+	while not stop.is_set():
+		try:
+			s = r.read()
+		except status.StaleStatus:
+			stale += 1
+			continue
+		reads += 1
+		if s.speed != 2.0 * s.numstep or s.target != s.numstep + 1:
+			torn += 1
+		if s.seq < last:
+			backwards += 1
+		last = s.seq
+	out.put((reads, torn, backwards, r.retries, stale))
+
+def bench(readers, seconds):
+	fd, path = tempfile.mkstemp()
+	os.close(fd)
+	w = status.StatusWriter(path)
+	w.update(target=1)
+	stop = multiprocessing.Event()
+	out = multiprocessing.Queue()
+	procs = [multiprocessing.Process(target=reader, args=(path, stop, out)) for i in range(readers)]
+	for p in procs:
+		p.start()
+	n = 0
+	t0 = time.time()
+	c0 = time.clock()
+	while time.time() - t0 < seconds:
+		for i in xrange(1000):
+			n += 1
+			w.update(numstep=n, speed=2.0 * n, target=n + 1)
+	cpu = time.clock() - c0
+	stop.set()
+	res = [out.get() for p in procs]
+	for p in procs:
+		p.join()
+	w.close()
+	os.unlink(path)
+	return {
+		"readers": readers,
+		"updates": n,
+		"update_us": cpu * 1e6 / n,
+		"reads": sum(r[0] for r in res),
+		"torn": sum(r[1] for r in res),
+		"backwards": sum(r[2] for r in res),
+		"retries": sum(r[3] for r in res),
+		"stale": sum(r[4] for r in res),
+	}
+
+def main():
+	readers = 4
+	seconds = 3.0
+	if len(sys.argv) > 1:
+		readers = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		seconds = float(sys.argv[2])
+	r = bench(readers, seconds)
+	print "%d updates (%.2f us CPU each), %d readers" % (r["updates"], r["update_us"], r["readers"])
+	print "%d reads, %d torn, %d out of order, %d retries, %d stale" % (
+		r["reads"], r["torn"], r["backwards"], r["retries"], r["stale"])
+	if r["torn"]:
+		print "FAIL: torn reads"
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,95 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_tlog.py
+#  Telemetry log: append rate and bytes per record, plain and zlib,
+#  and the time of a one hour range read of one channel out of a week
+#  of 10 s readings of 8 channels, against unpacking every record.
+#  The ranges read back are checked against what was written.
+#
+#  python bench_tlog.py [days]
+#----------------------------------------------------------------------
+import os
+import sys
+import shutil
+import tempfile
+import motion
+import tlog
+
+CHANNELS = ["bme280.0", "bme280.1", "bme280.2", "ads1115.0",
+	"ads1115.1", "ads1115.2", "ads1115.3", "pos"]
+
+def write(base, days, compress):
+	w = tlog.Writer(base, compress, max_bytes=1 << 20, keep=1000)
+	ids = [w.channel(c) for c in CHANNELS]
+	t = 1.5e9
+	n = int(days * 86400 / 10)
+	t0 = motion.now()
+	for i in xrange(n):
+		for j in ids:
+			# smooth, compressible values, like the real ones
+			w.append(t, j, 20.0 + j + (i % 360) * 0.01)
+		t += 10.0
+	w.close()
+	return n * len(ids), motion.now() - t0, w.bytes, w.seq + 1
+
+def scan(base, t0, t1, channel):
+	# baseline: unpack every record of every file
+	out = []
+	for path in tlog._files(base):
+		f = open(path, "rb")
+		data = f.read()
+		f.close()
+		flags = tlog.HEADER.unpack_from(data, 0)[2]
+		off = tlog.HEADER.size
+		if flags & tlog.ZLIB:
+			recs = ""
+			while off < len(data):
+				b0, b1, n, clen = tlog.BLOCK.unpack_from(data, off)
+				off += tlog.BLOCK.size
+				recs += __import__("zlib").decompress(data[off:off + clen])
+				off += clen
+			data, off = recs, 0
+		for o in xrange(off, len(data) - tlog.RECORD.size + 1, tlog.RECORD.size):
+			t, ch, v = tlog.RECORD.unpack_from(data, o)
+			if t0 <= t <= t1 and ch == channel:
+				out.append(v)
+	return out
+
+def bench(days):
+	res = {}
+	d = tempfile.mkdtemp()
+	try:
+		for compress in (False, True):
+			name = compress and "zlib" or "plain"
+			base = os.path.join(d, name)
+			n, wt, size, files = write(base, days, compress)
+			t0 = 1.5e9 + days * 86400 / 2
+			t1 = t0 + 3600
+			c = motion.now()
+			r = tlog.Reader(base)
+			t, v = r.series("ads1115.0", t0, t1)
+			rt = motion.now() - c
+			r.close()
+			c = motion.now()
+			ref = scan(base, t0, t1, CHANNELS.index("ads1115.0"))
+			st = motion.now() - c
+			res[name] = {"records": n, "files": files, "bytes_per_record": size / float(n),
+				"append_us": wt * 1e6 / n, "range_ms": rt * 1e3, "scan_ms": st * 1e3,
+				"range_records": len(v), "match": list(v) == ref}
+	finally:
+		shutil.rmtree(d)
+	return res
+
+def main():
+	days = 7
+	if len(sys.argv) > 1:
+		days = float(sys.argv[1])
+	r = bench(days)
+	for k in ("plain", "zlib"):
+		x = r[k]
+		print "%-5s %d records in %d files, %.2f bytes/record, append %.1f us; 1 h range %.2f ms (%d records, %s) vs full scan %.0f ms" % (
+			k, x["records"], x["files"], x["bytes_per_record"], x["append_us"],
+			x["range_ms"], x["range_records"], x["match"] and "same" or "DIFFERENT", x["scan_ms"])
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,51 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  bench_waveform.py
+#  Streams a planned move through the simulated pulse generator on the
+#  real clock and checks the played timeline against the plan.
+#
+#  python bench_waveform.py [speed steps]     (default: mov 1800,20000)
+#----------------------------------------------------------------------
+import sys
+import motion
+import waveform
+from gpio_out import RecordingOutput
+from stepmotor import stepper
+
+def bench(speed, steps, size=waveform.CHUNK):
+	m = stepper(7, 0, 2, 3, out=RecordingOutput([7, 0, 2, 3]), pos_file=None)
+	sim = waveform.SimPulseGenerator()
+	m.waves = sim
+	delays = motion.plan(speed, steps, m.acc, m.dec, m.start, m.shape)
+	t0 = motion.now()
+	m.move(speed, steps, -1)
+	wall = motion.now() - t0 - 1.0		# move() waits 1 s at the end
+	tl = sim.timeline
+	bad = 0
+	for i in xrange(1, len(tl)):
+		if tl[i][0] - tl[i - 1][0] != delays[i - 1]:
+			bad += 1
+	return {
+		"speed": speed,
+		"steps": steps,
+		"chunk": size,
+		"pulses": len(tl),
+		"numstep": m.numstep,
+		"planned_s": motion.duration(delays),
+		"wall_s": wall,
+		"underruns": sim.underruns,
+		"gap_us": sim.gap_us,
+		"timing_errors": bad,
+	}
+
+def main():
+	speed, steps = 1800, 20000
+	if len(sys.argv) > 2:
+		speed, steps = int(sys.argv[1]), int(sys.argv[2])
+	r = bench(speed, steps)
+	print "mov %d,%d,-1: %d pulses, numstep %d" % (speed, steps, r["pulses"], r["numstep"])
+	print "planned %.3f s, wall %.3f s" % (r["planned_s"], r["wall_s"])
+	print "underruns %d (gap %d us), pulses off plan %d" % (r["underruns"], r["gap_us"], r["timing_errors"])
+
+if __name__ == '__main__':
+	main()
@@ -18,16 +18,17 @@
 # http://www.raspberrypi-spy.co.uk/
 #
 #--------------------------------------
-import smbus
+import i2cbus
 import time
 from ctypes import c_short
 from ctypes import c_byte
 from ctypes import c_ubyte
+from collections import namedtuple
 
 DEVICE = 0x77 # Default device I2C address
 
 
-bus = smbus.SMBus(0) # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
+bus = i2cbus.get_bus(0) # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
                      # Rev 1 Pi uses bus 0
 
 def getShort(data, index):
@@ -56,33 +57,64 @@ def readBME280ID(addr=DEVICE):
   (chip_id, chip_version) = bus.read_i2c_block_data(addr, REG_ID, 2)
   return (chip_id, chip_version)
 
-def readBME280All(addr=DEVICE):
-  # Register Addresses
-  REG_DATA = 0xF7
-  REG_CONTROL = 0xF4
-  REG_CONFIG  = 0xF5
+# Register Addresses
+REG_DATA = 0xF7
+REG_CONTROL = 0xF4
+REG_CONFIG  = 0xF5
+
+REG_CONTROL_HUM = 0xF2
+REG_HUM_MSB = 0xFD
+REG_HUM_LSB = 0xFE
+
+# Oversample setting - page 27
+OVERSAMPLE_TEMP = 2
+OVERSAMPLE_PRES = 2
+MODE = 1
+
+# Oversample setting for humidity register - page 26
+OVERSAMPLE_HUM = 2
+
+REG_STATUS = 0xF3
+STATUS_MEASURING = 0x08
+
+MODE_SLEEP = 0
+MODE_FORCED = 1
+MODE_NORMAL = 3
 
-  REG_CONTROL_HUM = 0xF2
-  REG_HUM_MSB = 0xFD
-  REG_HUM_LSB = 0xFE
+# Oversampling register code -> number of samples - page 27
+OVERSAMPLE_COUNT = [0, 1, 2, 4, 8, 16, 16, 16]
 
-  # Oversample setting - page 27
-  OVERSAMPLE_TEMP = 2
-  OVERSAMPLE_PRES = 2
-  MODE = 1
+# Standby time in normal mode, ms, by t_sb code (REG_CONFIG) - page 30
+STANDBY_MS = [0.5, 62.5, 125.0, 250.0, 500.0, 1000.0, 10.0, 20.0]
 
-  # Oversample setting for humidity register - page 26
-  OVERSAMPLE_HUM = 2
-  bus.write_byte_data(addr, REG_CONTROL_HUM, OVERSAMPLE_HUM)
+# IIR filter coefficient codes (REG_CONFIG) - page 30
+FILTER_OFF = 0
+FILTER_2 = 1
+FILTER_4 = 2
+FILTER_8 = 3
+FILTER_16 = 4
 
-  control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | MODE
-  bus.write_byte_data(addr, REG_CONTROL, control)
+POLL = 0.0005 # status register poll interval, s
 
+def measureTime(osrs_t, osrs_p, osrs_h, maximum=True):
+  # Measurement time in ms (Datasheet Appendix B), typical or maximum
+  t = OVERSAMPLE_COUNT[osrs_t]
+  p = OVERSAMPLE_COUNT[osrs_p]
+  h = OVERSAMPLE_COUNT[osrs_h]
+  if maximum:
+    return 1.25 + 2.3 * t + (p and 2.3 * p + 0.575) + (h and 2.3 * h + 0.575)
+  return 1.0 + 2.0 * t + (p and 2.0 * p + 0.5) + (h and 2.0 * h + 0.5)
+
+Calibration = namedtuple("Calibration",
+  "T1 T2 T3 P1 P2 P3 P4 P5 P6 P7 P8 P9 H1 H2 H3 H4 H5 H6")
+
+# Decoded calibration per chip: (bus, address, chip id) -> Calibration
+_calibration = {}
+
+def readCalibration(addr=DEVICE, bus=bus):
   # Read blocks of calibration data from EEPROM
   # See Page 22 data sheet
-  cal1 = bus.read_i2c_block_data(addr, 0x88, 24)
-  cal2 = bus.read_i2c_block_data(addr, 0xA1, 1)
-  cal3 = bus.read_i2c_block_data(addr, 0xE1, 7)
+  (cal1, cal2, cal3) = bus.batch(addr, [("r", 0x88, 24), ("r", 0xA1, 1), ("r", 0xE1, 7)])
 
   # Convert byte data to word values
   dig_T1 = getUShort(cal1, 0)
@@ -113,18 +145,29 @@ def readBME280All(addr=DEVICE):
 
   dig_H6 = getChar(cal3, 6)
 
-  # Wait in ms (Datasheet Appendix B: Measurement time and current calculation)
-  wait_time = 1.25 + (2.3 * OVERSAMPLE_TEMP) + ((2.3 * OVERSAMPLE_PRES) + 0.575) + ((2.3 * OVERSAMPLE_HUM)+0.575)
-  time.sleep(wait_time/1000)  # Wait the required time  
+  return Calibration(dig_T1, dig_T2, dig_T3,
+    dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+    dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6)
 
-  # Read temperature/pressure/humidity
-  data = bus.read_i2c_block_data(addr, REG_DATA, 8)
-  pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
-  temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
-  hum_raw = (data[6] << 8) | data[7]
+def invalidate(addr=None):
+  # forget the calibration of one address, or of every chip, and the
+  # readBME280All devices holding it (other BME280 objects: init())
+  for key in _calibration.keys():
+    if addr is None or key[1] == addr:
+      del _calibration[key]
+  for a in _devices.keys():
+    if addr is None or a == addr:
+      del _devices[a]
+
+def compensate(cal, temp_raw, pres_raw, hum_raw):
+  # raw ADC values -> (temperature C, pressure hPa, humidity %)
+  (dig_T1, dig_T2, dig_T3,
+   dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+   dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6) = cal
 
   #Refine temperature
-  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
   t_fine = var1+var2
   temperature = float(((t_fine * 5) + 128) >> 8);
 
@@ -155,6 +198,110 @@ def readBME280All(addr=DEVICE):
 
   return temperature/100.0,pressure/100.0,humidity
 
+class BME280(object):
+  # One chip. Calibration is read once per chip and shared by every
+  # BME280 object for it; init() reads it again.
+
+  def __init__(self, addr=DEVICE, bus=bus):
+    self.addr = addr
+    self.bus = bus
+    self.init(reload=False)
+
+  def init(self, reload=True):
+    (self.chip_id, self.chip_version) = self.bus.read_i2c_block_data(self.addr, 0xD0, 2)
+    key = (self.bus.n, self.addr, self.chip_id)
+    if reload:
+      _calibration.pop(key, None)
+    cal = _calibration.get(key)
+    if cal is None:
+      cal = _calibration[key] = readCalibration(self.addr, self.bus)
+    self.cal = cal
+    # humidity oversampling only needs writing once, it takes effect
+    # with the next write of REG_CONTROL
+    self.bus.write_byte_data(self.addr, REG_CONTROL_HUM, OVERSAMPLE_HUM)
+    self.control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | MODE
+    # Wait in ms (Datasheet Appendix B: Measurement time and current calculation)
+    self.wait_time = measureTime(OVERSAMPLE_TEMP, OVERSAMPLE_PRES, OVERSAMPLE_HUM)
+    self.typ_time = measureTime(OVERSAMPLE_TEMP, OVERSAMPLE_PRES, OVERSAMPLE_HUM, False)
+
+  def measuring(self):
+    return self.bus.read_byte_data(self.addr, REG_STATUS) & STATUS_MEASURING
+
+  def waitReady(self, timeout, seen=False):
+    # Poll the measuring bit until a conversion ends, at most timeout s.
+    # With seen=False the end must follow a measuring=1 read.
+    end = time.time() + timeout
+    while time.time() < end:
+      if self.measuring():
+        seen = True
+      elif seen:
+        return True
+      time.sleep(POLL)
+    return False
+
+  def readData(self):
+    # Read temperature/pressure/humidity
+    data = self.bus.read_i2c_block_data(self.addr, REG_DATA, 8)
+    pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
+    temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
+    hum_raw = (data[6] << 8) | data[7]
+    return (temp_raw, pres_raw, hum_raw)
+
+  def readRaw(self):
+    # one forced measurement, (temp_raw, pres_raw, hum_raw)
+    self.bus.write_byte_data(self.addr, REG_CONTROL, self.control)
+    # typical time, then the status register for the rest
+    time.sleep(self.typ_time/1000)
+    self.waitReady((self.wait_time - self.typ_time)/1000 + 0.01, seen=True)
+    return self.readData()
+
+  def stream(self, standby=1, osrs_t=OVERSAMPLE_TEMP, osrs_p=OVERSAMPLE_PRES,
+             osrs_h=OVERSAMPLE_HUM, iir=FILTER_OFF, raw=False):
+    """
+    Normal mode: the chip measures on its own every t_measure + standby.
+    Configured once, then every new measurement is yielded as
+    (temperature, pressure, humidity), or raw values with raw=True.
+    No control writes per sample: the measuring bit tells when a new
+    one is in the data registers.
+    """
+    # config is only taken in sleep mode
+    self.bus.batch(self.addr, [("wb", REG_CONTROL, 0),
+      ("wb", REG_CONTROL_HUM, osrs_h),
+      ("wb", REG_CONFIG, (standby << 5) | (iir << 2)),
+      ("wb", REG_CONTROL, osrs_t<<5 | osrs_p<<2 | MODE_NORMAL)])
+    t_meas = measureTime(osrs_t, osrs_p, osrs_h) / 1000
+    period = t_meas + STANDBY_MS[standby] / 1000
+    # ready: the first measurement starts now
+    wake = time.time() + t_meas / 2
+    try:
+      while True:
+        left = wake - time.time()
+        if left > 0:
+          time.sleep(left)
+        # woken in the middle of a measurement: wait for its end
+        self.waitReady(period + t_meas)
+        ready = time.time()
+        data = self.readData()
+        if raw:
+          yield data
+        else:
+          yield compensate(self.cal, *data)
+        wake = ready + period - t_meas / 2
+    finally:
+      self.bus.write_byte_data(self.addr, REG_CONTROL, MODE_SLEEP)
+
+  def read(self):
+    (temp_raw, pres_raw, hum_raw) = self.readRaw()
+    return compensate(self.cal, temp_raw, pres_raw, hum_raw)
+
+_devices = {}
+
+def readBME280All(addr=DEVICE):
+  dev = _devices.get(addr)
+  if dev is None:
+    dev = _devices[addr] = BME280(addr)
+  return dev.read()
+
 def main():
 
   (chip_id, chip_version) = readBME280ID()
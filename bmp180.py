@@ -15,14 +15,15 @@
 # http://www.raspberrypi-spy.co.uk/
 #
 #--------------------------------------
-import smbus
+import i2cbus
 import time
 from ctypes import c_short
+from collections import namedtuple
  
 DEVICE = 0x77 # Default device I2C address
  
-#bus = smbus.SMBus(0)  # Rev 1 Pi uses 0
-bus = smbus.SMBus(0) # Rev 2 Pi uses 1 
+#bus = i2cbus.get_bus(0)  # Rev 1 Pi uses 0
+bus = i2cbus.get_bus(0) # Rev 2 Pi uses 1 
  
 def convertToString(data):
   # Simple function to convert binary data into
@@ -43,18 +44,20 @@ def readBmp180Id(addr=DEVICE):
   (chip_id, chip_version) = bus.read_i2c_block_data(addr, REG_ID, 2)
   return (chip_id, chip_version)
   
-def readBmp180(addr=DEVICE):
-  # Register Addresses
-  REG_CALIB  = 0xAA
-  REG_MEAS   = 0xF4
-  REG_MSB    = 0xF6
-  REG_LSB    = 0xF7
-  # Control Register Address
-  CRV_TEMP   = 0x2E
-  CRV_PRES   = 0x34 
-  # Oversample setting
-  OVERSAMPLE = 3    # 0 - 3
-  
+# Register Addresses
+REG_CALIB  = 0xAA
+REG_MEAS   = 0xF4
+REG_MSB    = 0xF6
+REG_LSB    = 0xF7
+# Control Register Address
+CRV_TEMP   = 0x2E
+CRV_PRES   = 0x34
+# Oversample setting
+OVERSAMPLE = 3    # 0 - 3
+
+Calibration = namedtuple("Calibration", "AC1 AC2 AC3 AC4 AC5 AC6 B1 B2 MB MC MD")
+
+def readCalibration(addr=DEVICE, bus=bus):
   # Read calibration data
   # Read calibration data from EEPROM
   cal = bus.read_i2c_block_data(addr, REG_CALIB, 22)
@@ -71,18 +74,12 @@ def readBmp180(addr=DEVICE):
   MB  = getShort(cal, 16)
   MC  = getShort(cal, 18)
   MD  = getShort(cal, 20)
+  return Calibration(AC1, AC2, AC3, AC4, AC5, AC6, B1, B2, MB, MC, MD)
 
-  # Read temperature
-  bus.write_byte_data(addr, REG_MEAS, CRV_TEMP)
-  time.sleep(0.005)
-  (msb, lsb) = bus.read_i2c_block_data(addr, REG_MSB, 2)
-  UT = (msb << 8) + lsb
-
-  # Read pressure
-  bus.write_byte_data(addr, REG_MEAS, CRV_PRES + (OVERSAMPLE << 6))
-  time.sleep(0.04)
-  (msb, lsb, xsb) = bus.read_i2c_block_data(addr, REG_MSB, 3)
-  UP = ((msb << 16) + (lsb << 8) + xsb) >> (8 - OVERSAMPLE)
+def compensate(cal, UT, UP, oversample=OVERSAMPLE):
+  # raw values -> (temperature C, pressure hPa)
+  (AC1, AC2, AC3, AC4, AC5, AC6, B1, B2, MB, MC, MD) = cal
+  OVERSAMPLE = oversample
 
   # Refine temperature
   X1 = ((UT - AC6) * AC5) >> 15
@@ -113,19 +110,128 @@ def readBmp180(addr=DEVICE):
 
   return (temperature/10.0,pressure/100.0)
 
+# Conversion time, ms (datasheet table 8): maximum, typical.
+# Temperature, then pressure by oversampling setting.
+T_TEMP_MS = (4.5, 3.0)
+T_PRES_MS = ((4.5, 3.0), (7.5, 5.0), (13.5, 8.0), (25.5, 14.0))
+SCO = 0x20     # REG_MEAS bit 5: conversion running
+POLL = 0.0005  # SCO poll interval, s
+
+# Pressure readings per temperature reading, while temperature is stable
+TEMP_EVERY = 10
+TEMP_STABLE = 0.2 # C between two temperature readings
+
+# Decoded calibration per chip: (bus, address, chip id) -> Calibration
+_calibration = {}
+
+class BMP180(object):
+  # One chip. Calibration is read once per chip; the last temperature
+  # reading (UT) is reused for temp_every pressure readings as long as
+  # two temperature readings in a row agree within TEMP_STABLE.
+
+  def __init__(self, addr=DEVICE, bus=bus, oversample=OVERSAMPLE,
+               temp_every=TEMP_EVERY, poll=False):
+    self.addr = addr
+    self.bus = bus
+    self.oversample = oversample
+    self.temp_every = temp_every
+    # poll=True: typical conversion time, then the SCO bit for the rest
+    self.poll = poll
+    self.UT = None
+    self.temperature = None
+    self.stable = False
+    self.uses = 0
+    self.temp_reads = 0
+    self.init(reload=False)
+
+  def init(self, reload=True):
+    (self.chip_id, self.chip_version) = self.bus.read_i2c_block_data(self.addr, 0xD0, 2)
+    key = (self.bus.n, self.addr, self.chip_id)
+    if reload:
+      _calibration.pop(key, None)
+    cal = _calibration.get(key)
+    if cal is None:
+      cal = _calibration[key] = readCalibration(self.addr, self.bus)
+    self.cal = cal
+    self.UT = None
+
+  def converting(self):
+    return self.bus.read_byte_data(self.addr, REG_MEAS) & SCO
+
+  def startConversion(self, cmd):
+    self.bus.write_byte_data(self.addr, REG_MEAS, cmd)
+
+  def convert(self, cmd, times, n):
+    # start a conversion, wait for its end and read n result bytes
+    self.startConversion(cmd)
+    (t_max, t_typ) = times
+    if not self.poll:
+      time.sleep(t_max/1000)
+    else:
+      time.sleep(t_typ/1000)
+      end = time.time() + (t_max - t_typ)/1000 + 0.01
+      while self.converting() and time.time() < end:
+        time.sleep(POLL)
+    return self.bus.read_i2c_block_data(self.addr, REG_MSB, n)
+
+  def presCommand(self):
+    return CRV_PRES + (self.oversample << 6)
+
+  def toUT(self, data):
+    (msb, lsb) = data
+    self.temp_reads += 1
+    return (msb << 8) + lsb
+
+  def toUP(self, data):
+    (msb, lsb, xsb) = data
+    return ((msb << 16) + (lsb << 8) + xsb) >> (8 - self.oversample)
+
+  def readUT(self):
+    return self.toUT(self.convert(CRV_TEMP, T_TEMP_MS, 2))
+
+  def readUP(self):
+    return self.toUP(self.convert(self.presCommand(), T_PRES_MS[self.oversample], 3))
+
+  def tempDue(self):
+    return self.UT is None or self.uses >= (self.temp_every if self.stable else 1)
+
+  def setUT(self, UT):
+    self.UT = UT
+    self.uses = 0
+    t = compensate(self.cal, UT, 0, self.oversample)[0]
+    self.stable = self.temperature is not None and abs(t - self.temperature) <= TEMP_STABLE
+    self.temperature = t
+
+  def readRaw(self):
+    # (UT, UP), UT fresh only when it is due
+    if self.tempDue():
+      self.setUT(self.readUT())
+    self.uses += 1
+    return (self.UT, self.readUP())
+
+  def read(self):
+    (UT, UP) = self.readRaw()
+    return compensate(self.cal, UT, UP, self.oversample)
+
+_devices = {}
+
+def readBmp180(addr=DEVICE):
+  dev = _devices.get(addr)
+  if dev is None:
+    dev = _devices[addr] = BMP180(addr)
+  return dev.read()
+
 def main():
+  (chip_id, chip_version) = readBmp180Id()
+  print("Chip ID     : {0}".format(chip_id))
+  print("Version     : {0}".format(chip_version))
   while 1 :
-	print "-------------------"   
-	(chip_id, chip_version) = readBmp180Id()
-	print("Chip ID     : {0}".format(chip_id))
-	print("Version     : {0}".format(chip_version))
-	
-  	print
-	(temperature,pressure)=readBmp180()
-  	print("Temperature : {0} C".format(temperature))
-  	print("Pressure    : {0} mbar".format(pressure))
-	print "-------------------"   
-	time.sleep(1)
-  
+    print "-------------------"
+    (temperature,pressure)=readBmp180()
+    print("Temperature : {0} C".format(temperature))
+    print("Pressure    : {0} mbar".format(pressure))
+    print "-------------------"
+    time.sleep(1)
+
 if __name__=="__main__":
    main()
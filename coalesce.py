@@ -0,0 +1,59 @@
+#----------------------------------------------------------------------
+#  coalesce.py
+#  Merges bursts of watchdog events.
+#
+#  A single write to a watched file usually gives two or three events
+#  (created, modified on truncate, modified on write). Events are kept
+#  per path and handed on only when the path has been quiet for
+#  `quiet` seconds, with the last event of the burst.
+#----------------------------------------------------------------------
+import threading
+import motion
+
+QUIET = 0.1	# seconds
+
+class Coalescer(threading.Thread):
+
+	def __init__(self, handle, quiet=QUIET):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.handle = handle
+		self.quiet = quiet
+		self.pending = {}	# path -> (deadline, event)
+		self.cond = threading.Condition()
+		self.events_in = 0
+		self.events_out = 0
+		self.start()
+
+	def push(self, event):
+		with self.cond:
+			self.events_in += 1
+			self.pending[event.src_path] = (motion.now() + self.quiet, event)
+			self.cond.notify()
+
+	def _due(self):
+		# events whose path is quiet, waits until there is one
+		with self.cond:
+			while True:
+				if not self.pending:
+					self.cond.wait()
+					continue
+				now = motion.now()
+				first = min(d for d, e in self.pending.values())
+				if first > now:
+					self.cond.wait(first - now)
+					continue
+				due = [p for p in self.pending if self.pending[p][0] <= now]
+				return [self.pending.pop(p)[1] for p in due]
+
+	def run(self):
+		while True:
+			for event in self._due():
+				self.events_out += 1
+				try:
+					self.handle(event)
+				except Exception, e:
+					print "%s: %s" % (event.src_path, e)
+
+	def __str__(self):
+		return "events in %d out %d" % (self.events_in, self.events_out)
@@ -0,0 +1,550 @@
+#----------------------------------------------------------------------
+#  controller.py
+#  Motion controller thread.
+#
+#  The controller owns the steppers and executes commands from a bounded
+#  queue, so the watchdog thread only has to queue them. A command sent
+#  with preempt=True (and every stop) drops what is still queued for its
+#  motor and interrupts the move of that motor only: a stop then ramps
+#  down, a mov re-plans from the speed the motor has at that moment. A
+#  stop with no motor name preempts them all, a program every motor it
+#  names.
+#
+#  Motors are kept by name ("" for the single unnamed one). Every motor
+#  has a lane: its commands in order, the running one a job (generator
+#  of delay tables and waits). The steps of all the lanes are made from
+#  the one loop of the controller thread, the earliest due first, so
+#  independent moves of different motors run at the same time. home,
+#  seek and sync run on their own, once every motor is at rest; a sync
+#  steps its motors from motion.run_many, their tables stretched to
+#  start and end together.
+#----------------------------------------------------------------------
+import time
+import threading
+import Queue
+import motion
+import seek
+import metrics
+from stepmotor import stepper
+
+QUEUE_SIZE = 16
+SETTLE = 1.0		# s of rest after a move, and for vel/acc/break
+COMMANDS = ("init", "mov", "vel", "acc", "break", "stop", "home", "mode", "sync", "seek")
+ALONE = ("home", "seek", "sync")	# run with every motor at rest
+
+class Latency(object):
+	# command -> motion latency, seconds
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.last = 0.0
+
+	def add(self, t):
+		self.count += 1
+		self.total += t
+		self.last = t
+		if t > self.max:
+			self.max = t
+
+	def mean(self):
+		if self.count == 0:
+			return 0.0
+		return self.total / self.count
+
+	def __str__(self):
+		return "latency last %.2f ms mean %.2f ms max %.2f ms (%d)" % (
+			self.last * 1e3, self.mean() * 1e3, self.max * 1e3, self.count)
+
+#----------------------------------------------------------------------
+class Lane(object):
+	# the commands of one motor: the running job and the table it walks
+
+	def __init__(self, name):
+		self.name = name
+		self.job = None		# generator, None when the motor is free
+		self.gen = 0		# generation of the command running
+		self.m = None
+		self.delays = None	# table being walked, None in a wait
+		self.step = None
+		self.incs = None
+		self.i = 0		# steps done
+		self.due = 0.0		# next step, end of the table or of the wait
+		self.hold = 0.0		# after a preemption, no step before this
+
+#----------------------------------------------------------------------
+class MotionController(threading.Thread):
+
+	def __init__(self, factory=stepper, size=QUEUE_SIZE, metric=None):
+		"""
+		factory(*pins) makes the unnamed motor, factory(*pins, name=name)
+		a named one.
+		"""
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.factory = factory
+		self.motors = {}	# name -> stepper
+		self.metric = metric	# signal for seek, a callable
+		self.clock = motion.now
+		self.sleep = time.sleep
+		self.spin = motion.SPIN
+		self.wake = threading.Event()	# set by every submit
+		self.wait = self.wake.wait	# sleep that a submit cuts short
+		self.last_seek = None
+		self.queue = Queue.Queue(size)
+		self.lock = threading.Lock()
+		self.gen = 0		# bumped by every preemption
+		self.cut = {}		# motor name -> gen of its last preemption
+		self.cut_all = 0	# gen of the last preemption of every motor
+		self.pending = []	# commands taken from the queue, not started
+		self.lanes = {}		# motor name -> Lane
+		self.closed = False
+		self.dropped = 0
+		self.busy = False
+		self.latency = Latency()
+		self.commands = dict((k, metrics.Counter()) for k in COMMANDS)
+		self.errors = metrics.Counter()
+
+	@property
+	def motor(self):
+		# the unnamed motor, None if there is none
+		return self.motors.get("")
+
+	def submit(self, key, args=(), preempt=False, motor=""):
+		"""
+		Queue a command, never blocks: returns False when the queue is
+		full and the command was dropped.
+		"""
+		with self.lock:
+			if preempt or key == "stop":
+				self._cut(_motors(key, args, motor))
+			try:
+				self.queue.put_nowait((key, args, self.clock(), self.gen, motor))
+			except Queue.Full:
+				self.dropped += 1
+				return False
+		self.wake.set()
+		return True
+
+	def submit_program(self, prog):
+		"""
+		Queue a parsed program (mpp commands). It preempts every motor it
+		names: a new program replaces what still runs or waits on them.
+		Returns the number of commands queued.
+		"""
+		names = set()
+		for c in prog:
+			ms = _motors(c.key, c.args, c.motor)
+			if ms is None:
+				names = None
+				break
+			names.update(ms)
+		if prog:
+			with self.lock:
+				self._cut(names)
+		n = 0
+		for c in prog:
+			if self.submit(c.key, c.args, False, c.motor):
+				n += 1
+			else:
+				print "queue full, %s dropped" % c.key
+		return n
+
+	def _cut(self, names):
+		# preempt the motors names, every motor for None; lock held
+		self.gen += 1
+		if names is None:
+			self.cut_all = self.gen
+		else:
+			for n in names:
+				self.cut[n] = self.gen
+		self._flush()
+
+	def _flush(self):
+		# drop the queued commands a preemption made stale
+		keep = []
+		while True:
+			try:
+				item = self.queue.get_nowait()
+			except Queue.Empty:
+				break
+			if not self._stale(item):
+				keep.append(item)
+		for item in keep:
+			self.queue.put_nowait(item)
+
+	def _preempted(self, names, gen):
+		# a command of generation gen for motors names was preempted
+		if gen < self.cut_all:
+			return True
+		for n in names:
+			if gen < self.cut.get(n, 0):
+				return True
+		return False
+
+	def _stale(self, item):
+		key, args, t, gen, name = item
+		return self._preempted(_motors(key, args, name) or (), gen)
+
+	def queued(self):
+		# commands not started yet
+		return self.queue.qsize() + len(self.pending)
+
+	def idle(self):
+		return not self.busy and self.queue.empty()
+
+	def close(self):
+		self.submit(None, preempt=True)
+		self.join()
+
+	def run(self):
+		while self.cycle(True):
+			pass
+
+	def drain(self):
+		# the queued commands to their end on the calling thread (sim)
+		while self.cycle(False):
+			pass
+
+	def cycle(self, block):
+		"""
+		One turn of the loop: take the queued commands, stop the jobs
+		preempted, start what can start, then make the earliest step due
+		or wait for it. False when closed, or with nothing left to do
+		and block False; block True waits for a command instead.
+		"""
+		self.wake.clear()
+		self._take(False)
+		if self.closed:
+			return False
+		for lane in self.lanes.values():
+			if lane.job is not None and self._preempted((lane.name,), lane.gen):
+				self._drop(lane)
+		self._start()
+		active = [l for l in self.lanes.values() if l.job is not None]
+		self.busy = bool(active)
+		if not active:
+			if block:
+				self._take(True)
+			return block and not self.closed
+		lane = min(active, key=lambda l: l.due)
+		left = lane.due - self.clock()
+		if left > self.spin:
+			if left - self.spin > motion.POLL:
+				self.wait(left - self.spin)
+			else:
+				self.sleep(left - self.spin)
+			return True
+		t = self.clock()
+		while t < lane.due:
+			t = self.clock()
+		self._tick(lane, t)
+		return True
+
+	def _take(self, block):
+		# queued commands to pending, waiting for one when block
+		while block or not self.queue.empty():
+			try:
+				item = self.queue.get(block)
+			except Queue.Empty:
+				return
+			block = False
+			self.busy = True
+			if item[0] is None:
+				self.closed = True
+			elif not self._stale(item):
+				self.pending.append(item)
+
+	def _lane(self, name):
+		lane = self.lanes.get(name)
+		if lane is None:
+			lane = self.lanes[name] = Lane(name)
+		return lane
+
+	def _start(self):
+		# start the pending commands of the free motors, in order
+		k = 0
+		while k < len(self.pending):
+			item = self.pending[k]
+			key, args, t, gen, name = item
+			if self._stale(item):
+				del self.pending[k]
+				continue
+			if key in ALONE or (key == "stop" and not name):
+				# after what comes before it, nothing after it starts;
+				# home, seek and sync once the motors are at rest too
+				if k > 0 or [l for l in self.lanes.values() if l.job is not None]:
+					break
+				if key in ALONE and [m for m in self.motors.values() if m.actspeed > 0]:
+					break
+				del self.pending[0]
+				self._alone(item)
+				continue
+			lane = self._lane(name)
+			if lane.job is None:
+				del self.pending[k]
+				self._begin(lane, item)
+				continue
+			k += 1
+		for name, m in self.motors.items():
+			lane = self._lane(name)
+			if lane.job is None and m.actspeed > 0:
+				# preempted by a command that did not move it: slow down
+				lane.gen = max(self.cut.get(lane.name, 0), self.cut_all)
+				lane.m = m
+				lane.job = self._stop(m, (), None)
+				self._advance(lane)
+
+	def _count(self, key):
+		c = self.commands.get(key)
+		if c is not None:
+			c.inc()
+
+	def _begin(self, lane, item):
+		key, args, t, gen, name = item
+		self._count(key)
+		lane.gen = gen
+		try:
+			job = self._job(key, args, t, name)
+		except Exception, e:
+			self.errors.inc()
+			print "%s %s: %s" % (key, args, e)
+			return
+		if job is not None:
+			lane.m = self.motors.get(name)
+			lane.job = job
+			self._advance(lane)
+
+	def _alone(self, item):
+		# a command run on its own, every motor at rest
+		key, args, t, gen, name = item
+		self._count(key)
+		self.busy = True
+		try:
+			if key == "stop":
+				for n in sorted(self.motors):
+					lane = self._lane(n)
+					lane.gen = gen
+					lane.m = self.motors[n]
+					lane.job = self._stop(lane.m, args, t)
+					self._advance(lane)
+			else:
+				self.execute(key, args, t, lambda: self._stale(item), name)
+		except Exception, e:
+			self.errors.inc()
+			print "%s %s: %s" % (key, args, e)
+
+	def _advance(self, lane):
+		# the job of the lane on to its next table or wait
+		while True:
+			try:
+				r = lane.job.next()
+			except StopIteration:
+				lane.job = None
+				return
+			except Exception, e:
+				lane.job = None
+				self.errors.inc()
+				print "%s: %s" % (lane.name or "-", e)
+				return
+			lane.delays = None
+			if not isinstance(r, tuple):
+				lane.due = self.clock() + r
+				return
+			delays, d, incs = r
+			m = lane.m
+			if m.waves is not None:
+				# the pulse generator keeps the time: walked here, whole
+				if m.run(delays, d, lambda: self._preempted((lane.name,), lane.gen), incs) < len(delays):
+					lane.job.close()
+					lane.job = None
+					return
+				continue
+			m.begin()
+			lane.delays = delays
+			lane.incs = incs
+			lane.step = m.step_fn(d, delays, incs)
+			lane.i = 0
+			lane.due = max(self.clock(), lane.hold)
+			return
+
+	def _tick(self, lane, t):
+		# the lane is due at t: next step, or on with its job
+		delays = lane.delays
+		if delays is None:
+			self._advance(lane)
+			return
+		i = lane.i
+		if i == len(delays):
+			lane.m.end(delays, i, lane.incs)
+			self._advance(lane)
+			return
+		if i == 0:
+			# the table is timed from its first step, as in motion.run
+			lane.due = t
+		late = lane.m.late
+		if late is not None:
+			late.add((t - lane.due) * 1e6)
+		lane.step(i)
+		lane.i = i + 1
+		d = delays[i] * 1e-6
+		lane.due += d
+		# more than a period late: from now on, no burst to catch up
+		t = self.clock()
+		if t - lane.due > d:
+			lane.due = t
+
+	def _drop(self, lane):
+		# preempted: the table stops where it is, the speed it had stays
+		if lane.delays is not None:
+			lane.m.end(lane.delays, lane.i, lane.incs)
+			lane.delays = None
+			# the next table takes the step that was due
+			lane.hold = lane.due
+		lane.job.close()
+		lane.job = None
+
+	#------------------------------------------------------------------
+	def _job(self, key, args, t, name):
+		# a command of one motor: done here, or its job
+		if key == "init":
+			self.init(name, args)
+			return None
+		if key in ("vel", "acc", "break"):
+			return self._wait(SETTLE)
+		m = self.motors.get(name)
+		if m is None:
+			print "no motor '%s', %s ignored" % (name, key)
+			return None
+		if key == "mode":
+			m.set_mode(args[0])
+			return None
+		if key == "mov":
+			speed, target, dir = args
+			return self._move(m, speed, target, dir, t)
+		if key == "stop":
+			return self._stop(m, args, t)
+
+	def _wait(self, s):
+		yield s
+
+	def _move(self, m, speed, rel, dir, t):
+		# yields the tables of a mov: re-planned from the speed the motor
+		# has, after a ramp down when it turns
+		d = 1
+		if dir < 0:
+			d = -1
+		m.t_start = self.clock()
+		self.latency.add(m.t_start - t)
+		v0 = None
+		if m.actspeed > 0:
+			if d == m.dir:
+				v0 = m.actspeed
+			else:
+				delays = m.ramp_table()
+				if len(delays):
+					yield (delays, m.dir, None)
+		delays, incs = m.prepare(speed, rel, d, v0)
+		yield (delays, d, incs)
+		m.update_flush()
+		yield SETTLE
+
+	def _stop(self, m, args, t):
+		# stop 0: ramp down, stop 1: de-energize at once
+		if t is not None:
+			self.latency.add(self.clock() - t)
+		if not args or not args[0]:
+			delays = m.ramp_table()
+			if len(delays):
+				yield (delays, m.dir, None)
+		m.stop()
+
+	def init(self, name, pins):
+		m = self.motors.get(name)
+		# same pins: keep the motor, and the position it knows
+		if m is not None and tuple(m.inp) == tuple(pins):
+			return
+		for other in self.motors:
+			if other != name and set(self.motors[other].inp) & set(pins):
+				print "pins of motor '%s' already in use, init ignored" % other
+				return
+		if m is not None:
+			m.stop()
+			m.update_stop()
+		if name:
+			self.motors[name] = self.factory(*pins, name=name)
+		else:
+			self.motors[name] = self.factory(*pins)
+
+	def execute(self, key, args, t, abort, name=""):
+		# home, seek or sync, on the controller thread until done
+		if key == "sync":
+			self.sync(args, t, abort)
+			return
+		m = self.motors.get(name)
+		if m is None:
+			print "no motor '%s', %s ignored" % (name, key)
+			return
+		if key == "home":
+			pin, speed, dir = args
+			self.latency.add(self.clock() - t)
+			if m.home(m.inputs(pin), speed, dir, abort):
+				print "home: zero set"
+			else:
+				print "home: limit switch not found"
+		elif key == "seek":
+			if self.metric is None:
+				print "no metric, seek ignored"
+				return
+			speed, span, tol = args
+			self.latency.add(self.clock() - t)
+			self.last_seek = seek.seek(m, self.metric, speed, span, tol, abort)
+			print self.last_seek
+
+	def sync(self, moves, t, abort):
+		# coordinated mov of several motors, from rest
+		ms = []
+		for mv in moves:
+			m = self.motors.get(mv.motor)
+			if m is None:
+				print "no motor '%s', sync ignored" % mv.motor
+				return
+			ms.append(m)
+		for m in ms:
+			m.ramp_down(abort)
+			if m.actspeed > 0:
+				return
+		tables = []
+		incs = []
+		for m, mv in zip(ms, moves):
+			d = 1
+			if mv.dir < 0:
+				d = -1
+			delays, inc = m.prepare(mv.speed, mv.steps, d)
+			tables.append(delays)
+			incs.append(inc)
+		tables = motion.coordinate(tables)
+		tracks = []
+		for m, delays, inc in zip(ms, tables, incs):
+			m.begin()
+			tracks.append((delays, m.step_fn(m.dir, delays, inc)))
+		t0 = self.clock()
+		for m in ms:
+			m.t_start = t0
+		self.latency.add(t0 - t)
+		m = ms[0]
+		done = motion.run_many(tracks, m.clock, m.sleep, m.spin, abort, m.late)
+		for m, delays, inc, n in zip(ms, tables, incs, done):
+			m.end(delays, n, inc)
+			m.update_flush()
+		if all(n == len(d) for n, d in zip(done, tables)):
+			self.sleep(SETTLE)
+
+def _motors(key, args, name):
+	# names of the motors a command drives, None for every motor
+	if key == "sync":
+		return [mv.motor for mv in args]
+	if key in ("stop", None) and not name:
+		return None
+	return [name]
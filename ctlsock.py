@@ -0,0 +1,157 @@
+#----------------------------------------------------------------------
+#  ctlsock.py
+#  Control socket for the motor daemon.
+#
+#  Line protocol on a Unix domain socket (and optionally localhost TCP).
+#  Every request line is a program in the .mpp grammar, commands
+#  separated by ';', replacing the program still running, exactly as a
+#  new motor.mpp would. Besides the commands:
+#     status          current position ("pos az:120 el:-40" with named motors)
+#     sub [rate]      push "pos ..." lines whenever a position changes
+#                     (rate per second, default 10) until disconnected
+#  Every request gets one answer line, "ok ..." or "err ...".
+#----------------------------------------------------------------------
+import os
+import socket
+import select
+import threading
+import SocketServer
+import mpp
+
+SOCKET = "/tmp/punter.sock"
+PORT = 7077
+SUB_RATE = 10.0
+
+def _positions(controller):
+	return tuple((n, m.numstep) for n, m in sorted(controller.motors.items()))
+
+def _pos(positions):
+	if not positions:
+		return "pos -"
+	if len(positions) == 1 and positions[0][0] == "":
+		return "pos %d" % positions[0][1]
+	# named motors: pos az:120 el:-40
+	return "pos " + " ".join("%s:%d" % (n or "-", p) for n, p in positions)
+
+def _status(controller):
+	return "%s queued %d" % (_pos(_positions(controller)), controller.queued())
+
+class Handler(SocketServer.StreamRequestHandler):
+
+	def handle(self):
+		controller = self.server.controller
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			line = line.strip()
+			if line == "":
+				continue
+			f = line.split()
+			if f[0] == "status":
+				self.reply("ok " + _status(controller))
+			elif f[0] == "sub":
+				rate = SUB_RATE
+				if len(f) > 1:
+					try:
+						rate = float(f[1])
+					except ValueError:
+						rate = None
+					# nan fails the comparison too
+					if rate is None or not 0 < rate < float("inf"):
+						self.reply("err sub: rate must be a number > 0, got '%s'" % f[1])
+						continue
+				self.reply("ok sub %.1f" % rate)
+				self.subscribe(controller, rate)
+				return
+			else:
+				try:
+					prog = mpp.parse(line.replace(";", "\n"), "socket")
+				except mpp.MppError, e:
+					self.reply("err %s" % e)
+					continue
+				n = controller.submit_program(prog)
+				self.reply("ok %d queued; %s" % (n, _status(controller)))
+
+	def reply(self, text):
+		self.wfile.write(text + "\n")
+		self.wfile.flush()
+
+	def subscribe(self, controller, rate):
+		last = None
+		while True:
+			p = _positions(controller)
+			if p and p != last:
+				last = p
+				try:
+					self.reply(_pos(p))
+				except socket.error:
+					return
+			# wait for the next update, noticing a closed connection
+			r, w, x = select.select([self.connection], [], [], 1.0 / rate)
+			if r and not self.connection.recv(256):
+				return
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	daemon_threads = True
+
+class TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+#----------------------------------------------------------------------
+class CommandServer(object):
+
+	def __init__(self, controller, path=SOCKET, port=None):
+		self.servers = []
+		if path is not None:
+			if os.path.exists(path):
+				os.unlink(path)
+			self.servers.append(UnixServer(path, Handler))
+		if port is not None:
+			self.servers.append(TCPServer(("127.0.0.1", port), Handler))
+		for s in self.servers:
+			s.controller = controller
+		self.path = path
+
+	def start(self):
+		for s in self.servers:
+			t = threading.Thread(target=s.serve_forever)
+			t.daemon = True
+			t.start()
+
+	def close(self):
+		for s in self.servers:
+			s.shutdown()
+			s.server_close()
+		if self.path is not None and os.path.exists(self.path):
+			os.unlink(self.path)
+
+#----------------------------------------------------------------------
+class Client(object):
+	# small client, for scripts and the benchmark
+
+	def __init__(self, path=SOCKET, port=None):
+		if port is None:
+			self.s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			self.s.connect(path)
+		else:
+			self.s = socket.create_connection(("127.0.0.1", port))
+		self.f = self.s.makefile("r")
+
+	def send(self, line):
+		self.s.sendall(line + "\n")
+		return self.f.readline().rstrip("\n")
+
+	def readline(self):
+		return self.f.readline().rstrip("\n")
+
+	def close(self):
+		self.f.close()
+		self.s.close()
+
+if __name__ == '__main__':
+	import sys
+	c = Client()
+	print c.send(" ".join(sys.argv[1:]) or "status")
+	c.close()
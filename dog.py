@@ -2,11 +2,16 @@ import sys
 import time  
 from watchdog.observers import Observer  
 from watchdog.events import PatternMatchingEventHandler
+from coalesce import Coalescer
 
 class MyHandler(PatternMatchingEventHandler):
 
     patterns = ["*.trig"]
 
+    def __init__(self):
+        PatternMatchingEventHandler.__init__(self)
+        self.coalescer = Coalescer(self.process)
+
     def process(self, event):
         """
         event.event_type 
@@ -18,12 +23,13 @@ class MyHandler(PatternMatchingEventHandler):
         """
         # the file will be processed there
         print event.src_path, event.event_type  # print now only for degug
+        print self.coalescer
 
     def on_modified(self, event):
-        self.process(event)
+        self.coalescer.push(event)
 
     def on_created(self, event):
-        self.process(event)
+        self.coalescer.push(event)
 
 if __name__ == '__main__':
     args = sys.argv[1:]
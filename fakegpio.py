@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------
+#  fakegpio.py
+#  Stand-in for the wiringpi module, for running the motor code
+#  without a Raspberry Pi. Pin states are kept in memory and every
+#  write is counted.
+#----------------------------------------------------------------------
+
+class FakeWiringPi(object):
+
+	INPUT = 0
+	OUTPUT = 1
+	LOW = 0
+	HIGH = 1
+	PUD_OFF = 0
+	PUD_DOWN = 1
+	PUD_UP = 2
+
+	def __init__(self):
+		self.pins = {}
+		self.modes = {}
+		self.writes = 0
+
+	def wiringPiSetup(self):
+		return 0
+
+	def pinMode(self, pin, mode):
+		self.modes[pin] = mode
+
+	def digitalWrite(self, pin, value):
+		self.pins[pin] = value
+		self.writes += 1
+
+	def digitalWriteByte(self, value):
+		for pin in range(8):
+			self.pins[pin] = value >> pin & 1
+		self.writes += 1
+
+	def pullUpDnControl(self, pin, pud):
+		# an input nothing drives reads as its pull
+		if pud != self.PUD_OFF:
+			self.pins.setdefault(pin, 1 if pud == self.PUD_UP else 0)
+
+	def digitalRead(self, pin):
+		return self.pins.get(pin, 0)
@@ -0,0 +1,305 @@
+#----------------------------------------------------------------------
+#  fakesmbus.py
+#  SMBus stand-in with simulated chips, for running the sensor drivers
+#  without the hardware:
+#
+#     bus = FakeSMBus({0x77: FakeBME280(), 0x49: ...})
+#     i2cbus.use(0, bus)
+#
+#  Every chip is a 256 byte register map; the models below also react
+#  to writes of their control registers. The calibration values are the
+#  examples of the Bosch datasheets.
+#----------------------------------------------------------------------
+import time
+import errno
+import struct
+import motion
+
+class FakeDevice(object):
+
+	def __init__(self):
+		self.regs = bytearray(256)
+
+	def read(self, reg, n):
+		return list(self.regs[reg:reg + n])
+
+	def write(self, reg, data):
+		for i in range(len(data)):
+			self.regs[reg + i] = data[i]
+
+	def put(self, reg, fmt, *values):
+		# store values packed with struct format fmt at reg
+		b = struct.pack(fmt, *values)
+		self.regs[reg:reg + len(b)] = b
+
+#----------------------------------------------------------------------
+class FakeSMBus(object):
+	"""
+	Same calls as smbus.SMBus. With hz set every transfer takes the time
+	it would take on a bus of that clock (9 bits per byte, address and
+	register byte included).
+	"""
+
+	def __init__(self, devices=None, hz=None, sleep=time.sleep):
+		self.devices = devices or {}
+		self.hz = hz
+		self.sleep = sleep
+		self.transactions = 0
+		self.bytes_read = 0
+		self.bytes_written = 0
+
+	def _dev(self, addr, n):
+		d = self.devices.get(addr)
+		if d is None:
+			raise IOError(errno.EREMOTEIO, "Remote I/O error")
+		self.transactions += 1
+		if self.hz:
+			self.sleep((n + 3) * 9.0 / self.hz)
+		return d
+
+	def read_i2c_block_data(self, addr, reg, n):
+		d = self._dev(addr, n)
+		self.bytes_read += n
+		return d.read(reg, n)
+
+	def write_i2c_block_data(self, addr, reg, data):
+		d = self._dev(addr, len(data))
+		self.bytes_written += len(data)
+		d.write(reg, list(data))
+
+	def read_byte_data(self, addr, reg):
+		return self.read_i2c_block_data(addr, reg, 1)[0]
+
+	def write_byte_data(self, addr, reg, value):
+		self.write_i2c_block_data(addr, reg, [value])
+
+	def reset(self):
+		self.transactions = 0
+		self.bytes_read = 0
+		self.bytes_written = 0
+
+#----------------------------------------------------------------------
+class FakeBME280(FakeDevice):
+	"""
+	BME280 with fixed raw readings (temp_raw, pres_raw, hum_raw). Forced
+	and normal mode set the measuring bit of the status register for
+	the typical measurement time; normal mode repeats it every
+	measurement + standby time and counts the measurements in
+	`measurements`.
+	"""
+
+	CALIB_T = (27504, 26435, -1000)
+	CALIB_P = (36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+	CALIB_H = (75, 362, 0, 313, 50, 30)
+	OVERSAMPLE = (0, 1, 2, 4, 8, 16, 16, 16)
+	STANDBY = (0.0005, 0.0625, 0.125, 0.25, 0.5, 1.0, 0.010, 0.020)
+
+	def __init__(self, temp_raw=519888, pres_raw=415148, hum_raw=30000, clock=motion.now):
+		FakeDevice.__init__(self)
+		self.clock = clock
+		self.mode = 0
+		self.t0 = 0.0
+		self.t_meas = 0.0
+		self.period = 0.0
+		self.forced = 0
+		self.regs[0xD0] = 0x60
+		self.put(0x88, "<Hhh", *self.CALIB_T)
+		self.put(0x8E, "<Hhhhhhhhh", *self.CALIB_P)
+		h1, h2, h3, h4, h5, h6 = self.CALIB_H
+		self.regs[0xA1] = h1
+		self.put(0xE1, "<hB", h2, h3)
+		self.regs[0xE4] = (h4 >> 4) & 0xFF
+		self.regs[0xE5] = (h4 & 0x0F) | ((h5 & 0x0F) << 4)
+		self.regs[0xE6] = (h5 >> 4) & 0xFF
+		self.put(0xE7, "<b", h6)
+		self.set_raw(temp_raw, pres_raw, hum_raw)
+
+	def set_raw(self, temp_raw, pres_raw, hum_raw):
+		self.temp_raw = temp_raw
+		self.pres_raw = pres_raw
+		self.hum_raw = hum_raw
+		r = self.regs
+		r[0xF7] = (pres_raw >> 12) & 0xFF
+		r[0xF8] = (pres_raw >> 4) & 0xFF
+		r[0xF9] = (pres_raw << 4) & 0xF0
+		r[0xFA] = (temp_raw >> 12) & 0xFF
+		r[0xFB] = (temp_raw >> 4) & 0xFF
+		r[0xFC] = (temp_raw << 4) & 0xF0
+		r[0xFD] = (hum_raw >> 8) & 0xFF
+		r[0xFE] = hum_raw & 0xFF
+
+	def write(self, reg, data):
+		FakeDevice.write(self, reg, data)
+		if reg > 0xF4 or reg + len(data) <= 0xF4:
+			return
+		ctrl = self.regs[0xF4]
+		os = self.OVERSAMPLE
+		t = os[ctrl >> 5]
+		p = os[(ctrl >> 2) & 7]
+		h = os[self.regs[0xF2] & 7]
+		# typical measurement time, datasheet appendix B
+		self.t_meas = (1.0 + 2.0 * t + (p and 2.0 * p + 0.5) + (h and 2.0 * h + 0.5)) / 1000
+		self.mode = ctrl & 3
+		self.t0 = self.clock()
+		if self.mode in (1, 2):
+			self.forced += 1
+		elif self.mode == 3:
+			self.period = self.t_meas + self.STANDBY[self.regs[0xF5] >> 5]
+
+	@property
+	def measurements(self):
+		if self.mode != 3:
+			return self.forced
+		return self.forced + int((self.clock() - self.t0 + self.period - self.t_meas) / self.period)
+
+	def read(self, reg, n):
+		if reg <= 0xF3 < reg + n:
+			dt = self.clock() - self.t0
+			if self.mode in (1, 2):
+				busy = dt < self.t_meas
+				if not busy:
+					# back to sleep after a forced measurement
+					self.mode = 0
+					self.regs[0xF4] &= 0xFC
+			elif self.mode == 3:
+				busy = dt % self.period < self.t_meas
+			else:
+				busy = False
+			if busy:
+				self.regs[0xF3] |= 0x08
+			else:
+				self.regs[0xF3] &= 0xF7
+		return FakeDevice.read(self, reg, n)
+
+#----------------------------------------------------------------------
+class FakeBMP180(FakeDevice):
+	"""
+	BMP180: a write of the measurement control register starts a
+	conversion, SCO (bit 5 of 0xF4) stays set for the conversion time
+	and the result is in 0xF6-0xF8 when it clears.
+	"""
+
+	CALIB = (408, -72, -14383, 32741, 32757, 23153, 6190, 4, -32768, -8711, 2868)
+	# conversion time, seconds: temperature, pressure by oversampling
+	T_TEMP = 0.0045
+	T_PRES = (0.0045, 0.0075, 0.0135, 0.0255)
+
+	def __init__(self, ut=27898, up=23843, clock=motion.now):
+		FakeDevice.__init__(self)
+		self.regs[0xD0] = 0x55
+		self.put(0xAA, ">hhhHHHhhhhh", *self.CALIB)
+		self.ut = ut
+		self.up = up		# UP as the driver computes it, at any oversampling
+		self.clock = clock
+		self.done = 0.0
+		self.conversions = 0
+
+	def write(self, reg, data):
+		FakeDevice.write(self, reg, data)
+		if reg != 0xF4:
+			return
+		cmd = data[0]
+		self.conversions += 1
+		if cmd == 0x2E:
+			self.put(0xF6, ">H", self.ut)
+			self.done = self.clock() + self.T_TEMP
+		elif cmd & 0x3F == 0x34:
+			oss = cmd >> 6
+			v = self.up << (8 - oss)
+			self.regs[0xF6] = (v >> 16) & 0xFF
+			self.regs[0xF7] = (v >> 8) & 0xFF
+			self.regs[0xF8] = v & 0xFF
+			self.done = self.clock() + self.T_PRES[oss]
+
+	def read(self, reg, n):
+		if reg <= 0xF4 < reg + n:
+			if self.clock() < self.done:
+				self.regs[0xF4] |= 0x20
+			else:
+				self.regs[0xF4] &= ~0x20 & 0xFF
+		return FakeDevice.read(self, reg, n)
+
+#----------------------------------------------------------------------
+class FakeADS1115(FakeDevice):
+	"""
+	ADS1115 with 16 bit pointer registers. inputs maps a mux code to a
+	voltage, or to a function of the time giving one. A single-shot
+	conversion samples its input when it ends, 1/rate after the config
+	write, and clears OS until then; continuous mode converts every
+	1/rate. `ready()` is the ALERT/RDY pin as conversion ready (True when
+	asserted). drift: relative error of the chip oscillator (up to +-10%
+	on the real one), the conversions come at rate * (1 + drift).
+	"""
+
+	RATE = (8, 16, 32, 64, 128, 250, 475, 860)
+	FULL_SCALE = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+
+	def __init__(self, inputs=None, clock=motion.now):
+		FakeDevice.__init__(self)
+		self.inputs = inputs or {}
+		self.clock = clock
+		self.reg16 = [0x0000, 0x8583, 0x8000, 0x7FFF]
+		self.t0 = 0.0
+		self.done = 0.0
+		self.counted = 0
+		self.conversions = 0
+		self.drift = 0.0
+
+	def _code(self, mux, pga, t):
+		v = self.inputs.get(mux, 0.0)
+		if callable(v):
+			v = v(t)
+		c = int(round(v / self.FULL_SCALE[pga] * 32768))
+		return max(-32768, min(32767, c)) & 0xFFFF
+
+	def _update(self):
+		# bring the conversion register up to the present
+		cfg = self.reg16[1]
+		mux = (cfg >> 12) & 7
+		pga = (cfg >> 9) & 7
+		period = 1.0 / (self.RATE[(cfg >> 5) & 7] * (1 + self.drift))
+		now = self.clock()
+		if cfg & 0x0100:
+			if self.done and now >= self.done:
+				self.reg16[0] = self._code(mux, pga, self.done)
+				self.reg16[1] |= 0x8000
+				self.done = 0.0
+		else:
+			n = int((now - self.t0) / period)
+			if n > 0:
+				self.reg16[0] = self._code(mux, pga, self.t0 + n * period)
+				self.conversions += n - self.counted
+				self.counted = n
+
+	def ready(self):
+		self._update()
+		return not self.done
+
+	def read(self, reg, n):
+		self._update()
+		v = self.reg16[reg & 3]
+		return [v >> 8, v & 0xFF][:n]
+
+	def write(self, reg, data):
+		self._update()
+		if len(data) < 2:
+			return
+		v = (data[0] << 8) | data[1]
+		reg &= 3
+		if reg != 1:
+			self.reg16[reg] = v
+			return
+		self.t0 = self.clock()
+		period = 1.0 / (self.RATE[(v >> 5) & 7] * (1 + self.drift))
+		if v & 0x0100:
+			# single-shot: OS=1 starts a conversion, OS reads 0 until done
+			if v & 0x8000:
+				self.conversions += 1
+				self.done = self.t0 + period
+				v &= 0x7FFF
+			else:
+				v |= 0x8000 if not self.done else 0
+		else:
+			self.done = 0.0
+			self.counted = 0
+		self.reg16[1] = v
@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------
+#  gpio_out.py
+#  Output layer for the four coil pins of a stepper.
+#
+#  A phase is written as a bit mask (bit k drives pin k of the motor).
+#  Every backend remembers the mask currently on the pins and only
+#  touches the pins that change, or does a single bulk write when the
+#  hardware allows it.
+#----------------------------------------------------------------------
+
+def masks(table):
+	# phase table (list of 0/1 rows) -> list of bit masks
+	out = []
+	for row in table:
+		m = 0
+		for k in range(len(row)):
+			if row[k]:
+				m |= 1 << k
+		out.append(m)
+	return out
+
+def _bits(n):
+	# for every change mask the list of bit indexes set in it
+	return [[k for k in range(n) if c >> k & 1] for c in range(1 << n)]
+
+#----------------------------------------------------------------------
+class PhaseOutput(object):
+
+	def __init__(self, pins):
+		self.pins = list(pins)
+		self.state = 0
+		self.writes = 0
+
+	def write(self, mask):
+		changed = mask ^ self.state
+		if changed:
+			self._set(mask, changed)
+			self.state = mask
+			self.writes += 1
+
+	def off(self):
+		self.write(0)
+
+	def _set(self, mask, changed):
+		raise NotImplementedError
+
+#----------------------------------------------------------------------
+class WiringPiOutput(PhaseOutput):
+	"""
+	wiringpi backend. With byte=True the whole phase goes out with one
+	digitalWriteByte(), which drives wiringPi pins 0-7 together: only
+	use it when the other pins of that byte are free.
+	"""
+
+	def __init__(self, pins, w=None, byte=False):
+		PhaseOutput.__init__(self, pins)
+		if w is None:
+			import wiringpi as w
+		self.w = w
+		self.w.wiringPiSetup()
+		for p in self.pins:
+			self.w.pinMode(p, self.w.OUTPUT)
+			self.w.digitalWrite(p, 0)
+		self.byte = None
+		if byte:
+			if max(self.pins) > 7:
+				raise ValueError("digitalWriteByte only covers wiringPi pins 0-7")
+			self.byte = []
+			for m in range(1 << len(self.pins)):
+				b = 0
+				for k in range(len(self.pins)):
+					if m >> k & 1:
+						b |= 1 << self.pins[k]
+				self.byte.append(b)
+			self.w.digitalWriteByte(0)
+		self.bits = _bits(len(self.pins))
+
+	def _set(self, mask, changed):
+		if self.byte is not None:
+			self.w.digitalWriteByte(self.byte[mask])
+			return
+		dw = self.w.digitalWrite
+		pins = self.pins
+		for k in self.bits[changed]:
+			dw(pins[k], mask >> k & 1)
+
+class WiringPiInput(object):
+	"""
+	One input pin (limit switch, hall sensor) as a callable, True when
+	active. Default: pull-up on, active low (switch to ground).
+	"""
+
+	def __init__(self, pin, w=None, active_low=True):
+		if w is None:
+			import wiringpi as w
+		self.w = w
+		self.pin = pin
+		self.active = 0 if active_low else 1
+		w.wiringPiSetup()
+		w.pinMode(pin, w.INPUT)
+		w.pullUpDnControl(pin, w.PUD_UP if active_low else w.PUD_DOWN)
+
+	def __call__(self):
+		return self.w.digitalRead(self.pin) == self.active
+
+#----------------------------------------------------------------------
+class GpiochipOutput(PhaseOutput):
+	"""
+	Character device backend (libgpiod python bindings): the four pins
+	are requested as one line bulk and set with a single ioctl. Pins
+	are line offsets on the chip, not wiringPi numbers.
+	"""
+
+	def __init__(self, pins, chip="gpiochip0", consumer="punter"):
+		PhaseOutput.__init__(self, pins)
+		import gpiod
+		self.chip = gpiod.Chip(chip)
+		self.lines = self.chip.get_lines(self.pins)
+		self.lines.request(consumer=consumer, type=gpiod.LINE_REQ_DIR_OUT,
+			default_vals=[0] * len(self.pins))
+		n = len(self.pins)
+		self.values = [[m >> k & 1 for k in range(n)] for m in range(1 << n)]
+
+	def _set(self, mask, changed):
+		self.lines.set_values(self.values[mask])
+
+	def release(self):
+		self.lines.release()
+
+#----------------------------------------------------------------------
+class RecordingOutput(PhaseOutput):
+	"""
+	Fake backend: keeps every mask written and counts the pin
+	transitions, for checking the write pattern of a move.
+	"""
+
+	def __init__(self, pins=(0, 1, 2, 3)):
+		PhaseOutput.__init__(self, pins)
+		self.log = []
+		self.pin_writes = 0
+		self.bits = _bits(len(self.pins))
+
+	def _set(self, mask, changed):
+		self.log.append(mask)
+		self.pin_writes += len(self.bits[changed])
+
+	def reset(self):
+		del self.log[:]
+		self.writes = 0
+		self.pin_writes = 0
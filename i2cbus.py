@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------
+#  i2cbus.py
+#  One shared handle per I2C bus for all the sensor drivers.
+#
+#  get_bus(n) returns the same Bus object to every driver of a process.
+#  Each transfer holds the bus lock, batch() runs several register
+#  reads/writes of one device as a single critical section, and
+#  transaction() holds the lock over any sequence of calls. The SMBus
+#  handle is opened on first use; use() installs another one (a
+#  fakesmbus.FakeSMBus off-device).
+#----------------------------------------------------------------------
+import threading
+import bisect
+from array import array
+import motion
+
+_buses = {}
+_lock = threading.Lock()
+
+# latency histogram bounds, microseconds (last bucket: above)
+BOUNDS = [50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000]
+
+class Histogram(object):
+
+	def __init__(self, bounds=BOUNDS):
+		self.bounds = bounds
+		self.counts = array("L", [0] * (len(bounds) + 1))
+		self.total = 0.0
+		self.n = 0
+
+	def add(self, v):
+		self.counts[bisect.bisect_left(self.bounds, v)] += 1
+		self.total += v
+		self.n += 1
+
+	def mean(self):
+		if self.n == 0:
+			return 0.0
+		return self.total / self.n
+
+class DeviceStats(object):
+
+	def __init__(self):
+		self.transactions = 0
+		self.bytes = 0
+		self.latency = Histogram()
+
+	def __str__(self):
+		return "%d transactions, %d bytes, mean %.0f us" % (
+			self.transactions, self.bytes, self.latency.mean())
+
+#----------------------------------------------------------------------
+class Bus(object):
+
+	def __init__(self, n, dev=None):
+		self.n = n
+		self.dev = dev
+		self.lock = threading.RLock()
+		self.stats = {}		# address -> DeviceStats
+
+	def _open(self):
+		import smbus
+		self.dev = smbus.SMBus(self.n)
+
+	def _record(self, addr, t0, nbytes):
+		s = self.stats.get(addr)
+		if s is None:
+			s = self.stats[addr] = DeviceStats()
+		s.transactions += 1
+		s.bytes += nbytes
+		s.latency.add((motion.now() - t0) * 1e6)
+
+	def transaction(self):
+		# with bus.transaction(): ... keeps other drivers off the bus
+		return self.lock
+
+	def read_i2c_block_data(self, addr, reg, n):
+		with self.lock:
+			if self.dev is None:
+				self._open()
+			t0 = motion.now()
+			data = self.dev.read_i2c_block_data(addr, reg, n)
+			self._record(addr, t0, n)
+		return data
+
+	def write_i2c_block_data(self, addr, reg, data):
+		with self.lock:
+			if self.dev is None:
+				self._open()
+			t0 = motion.now()
+			self.dev.write_i2c_block_data(addr, reg, data)
+			self._record(addr, t0, len(data))
+
+	def read_byte_data(self, addr, reg):
+		with self.lock:
+			if self.dev is None:
+				self._open()
+			t0 = motion.now()
+			v = self.dev.read_byte_data(addr, reg)
+			self._record(addr, t0, 1)
+		return v
+
+	def write_byte_data(self, addr, reg, value):
+		with self.lock:
+			if self.dev is None:
+				self._open()
+			t0 = motion.now()
+			self.dev.write_byte_data(addr, reg, value)
+			self._record(addr, t0, 1)
+
+	def batch(self, addr, ops):
+		"""
+		Run ops on one device without letting other drivers in between.
+		ops: ("r", reg, n) block read, ("w", reg, [bytes]) block write,
+		("wb", reg, byte) byte write. Returns the data of the reads, in
+		order.
+		"""
+		out = []
+		with self.lock:
+			for op in ops:
+				if op[0] == "r":
+					out.append(self.read_i2c_block_data(addr, op[1], op[2]))
+				elif op[0] == "w":
+					self.write_i2c_block_data(addr, op[1], op[2])
+				elif op[0] == "wb":
+					self.write_byte_data(addr, op[1], op[2])
+				else:
+					raise ValueError("unknown bus op %r" % (op[0],))
+		return out
+
+#----------------------------------------------------------------------
+def get_bus(n=0):
+	with _lock:
+		b = _buses.get(n)
+		if b is None:
+			b = _buses[n] = Bus(n)
+		return b
+
+def use(n, dev):
+	# install an SMBus-like handle (real or fake) for bus n
+	b = get_bus(n)
+	with b.lock:
+		b.dev = dev
+	return b
+
+def report():
+	lines = []
+	for n in sorted(_buses):
+		b = _buses[n]
+		for addr in sorted(b.stats):
+			lines.append("bus %d 0x%02x: %s" % (n, addr, b.stats[addr]))
+	return "\n".join(lines)
@@ -0,0 +1,164 @@
+#----------------------------------------------------------------------
+#  journal.py
+#  Durable motor position, for getting it back after a restart.
+#
+#  Append-only file of 20 byte records, little endian:
+#     uint32 seq, int64 numstep, uint8 flags, 3 pad, uint32 crc32
+#  The last record with a good crc is the position; a record torn by a
+#  crash is skipped by load() and cut off when the journal is opened
+#  for writing again. Records are written while the motor moves
+#  (on change, `rate` per second) but fsync-ed at most every `sync`
+#  seconds, and always at flush() (end of a move, stop). Past
+#  max_records the file is compacted to its last record, through a
+#  renamed temporary file.
+#----------------------------------------------------------------------
+import os
+import zlib
+import struct
+import threading
+from collections import namedtuple
+import motion
+
+RATE = 5.0		# records per second while the position changes
+SYNC = 2.0		# s between fsyncs during a move
+MAX_RECORDS = 4096
+
+# flags
+HOMED = 1		# zero set by the limit switch
+MOVING = 2		# written during a move: steps after it may be lost
+
+_REC = struct.Struct("<IqB3x")
+_CRC = struct.Struct("<I")
+SIZE = _REC.size + _CRC.size
+
+Position = namedtuple("Position", "numstep flags seq")
+
+def _pack(seq, numstep, flags):
+	r = _REC.pack(seq, numstep, flags)
+	return r + _CRC.pack(zlib.crc32(r) & 0xffffffff)
+
+def _scan(path):
+	# (last good Position or None, end of its record)
+	try:
+		f = open(path, "rb")
+	except IOError:
+		return None, 0
+	data = f.read()
+	f.close()
+	off = (len(data) // SIZE) * SIZE
+	while off > 0:
+		off -= SIZE
+		r = data[off:off + _REC.size]
+		(crc,) = _CRC.unpack_from(data, off + _REC.size)
+		if zlib.crc32(r) & 0xffffffff == crc:
+			seq, numstep, flags = _REC.unpack(r)
+			return Position(numstep, flags, seq), off + SIZE
+	return None, 0
+
+def load(path):
+	# last good Position of a journal, None if there is none
+	return _scan(path)[0]
+
+def _fsync_dir(path):
+	fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+class PosJournal(threading.Thread):
+	"""
+	get() -> (numstep, flags), polled by the thread. flush() writes the
+	current state and makes it durable before returning.
+	"""
+
+	def __init__(self, path, get, rate=RATE, sync=SYNC, max_records=MAX_RECORDS):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.path = path
+		self.get = get
+		self.rate = rate
+		self.sync = sync
+		self.max_records = max_records
+		self.lock = threading.Lock()
+		self.done = threading.Event()
+		last, end = _scan(path)
+		self.seq = 0
+		self.last = None
+		if last is not None:
+			self.seq = last.seq
+			self.last = (last.numstep, last.flags)
+		self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0644)
+		if os.fstat(self.fd).st_size > end:
+			# cut what a crash left after the last good record, or the
+			# records appended now would be out of step with SIZE
+			os.ftruncate(self.fd, end)
+			os.fsync(self.fd)
+		self.records = end // SIZE
+		self.dirty = False
+		self.t_sync = motion.now()
+		self.writes = 0
+		self.syncs = 0
+
+	def _write(self, state):
+		self.seq += 1
+		os.write(self.fd, _pack(self.seq, state[0], state[1]))
+		self.last = state
+		self.records += 1
+		self.writes += 1
+		self.dirty = True
+
+	def _fsync(self):
+		if self.dirty:
+			os.fsync(self.fd)
+			self.syncs += 1
+			self.dirty = False
+		self.t_sync = motion.now()
+
+	def _compact(self):
+		tmp = self.path + ".tmp"
+		fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+		os.write(fd, _pack(self.seq, self.last[0], self.last[1]))
+		os.fsync(fd)
+		os.close(fd)
+		os.rename(tmp, self.path)
+		_fsync_dir(self.path)
+		os.close(self.fd)
+		self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+		self.records = 1
+		self.dirty = False
+
+	def record(self):
+		# write the state if it changed, fsync if the last one is old
+		with self.lock:
+			state = self.get()
+			if state != self.last:
+				self._write(state)
+			if self.dirty and motion.now() - self.t_sync >= self.sync:
+				self._fsync()
+			if self.records >= self.max_records:
+				self._compact()
+
+	def flush(self):
+		with self.lock:
+			state = self.get()
+			if state != self.last:
+				self._write(state)
+			self._fsync()
+
+	def run(self):
+		while not self.done.is_set():
+			try:
+				self.record()
+			except (IOError, OSError), e:
+				print "journal: %s" % e
+			self.done.wait(1.0 / self.rate)
+
+	def close(self):
+		self.done.set()
+		if self.is_alive():
+			self.join()
+		self.flush()
+		with self.lock:
+			os.close(self.fd)
+			self.fd = None
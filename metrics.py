@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------
+#  metrics.py
+#  Counters and histograms of the daemons in the Prometheus text
+#  format, from a local HTTP endpoint or a file for the textfile
+#  collector of node_exporter:
+#
+#     reg = metrics.Registry()
+#     late = reg.histogram("punter_step_late_us", "...", motion.LATE_BOUNDS, motor="az")
+#     metrics.MetricsServer(reg).start()         # GET http://127.0.0.1:9477/metrics
+#     metrics.Exporter(reg, "/var/lib/node_exporter/punter.prom").start()
+#
+#  Everything is made once, at start: the hot paths only bump a counter
+#  or a bucket of an i2cbus.Histogram (an array of counts). Counts kept
+#  elsewhere (controller, coalescer, i2cbus) are read when the text is
+#  made, through callables. Tracer is the per-step debug trace, every
+#  n-th step only.
+#----------------------------------------------------------------------
+import sys
+import threading
+import BaseHTTPServer
+import motion
+import i2cbus
+import posfile
+
+PORT = 9477
+PERIOD = 15.0		# s between file exports
+
+class Counter(object):
+	__slots__ = ("value",)
+
+	def __init__(self):
+		self.value = 0
+
+	def inc(self, n=1):
+		self.value += n
+
+def _labels(labels, extra=None):
+	items = sorted(labels.items())
+	if extra is not None:
+		items.append(extra)
+	if not items:
+		return ""
+	return "{" + ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in items) + "}"
+
+def _number(v):
+	if isinstance(v, float):
+		return repr(v)
+	return str(v)
+
+#----------------------------------------------------------------------
+class Registry(object):
+	"""
+	Metric families by name, each with one object per label set:
+	Counter or callable for counters, callable for gauges,
+	i2cbus.Histogram for histograms. collect(fn) adds families made at
+	export time: fn() returns (name, kind, help, labels, obj) tuples.
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.families = {}	# name -> (kind, help, {label key: (labels, obj)})
+		self.order = []
+		self.collectors = []
+
+	def add(self, name, kind, help, obj, **labels):
+		# obj for name and labels, the one already there if any
+		key = tuple(sorted(labels.items()))
+		with self.lock:
+			f = self.families.get(name)
+			if f is None:
+				f = self.families[name] = (kind, help, {})
+				self.order.append(name)
+			elif f[0] != kind:
+				raise ValueError("metric %s is a %s" % (name, f[0]))
+			return f[2].setdefault(key, (labels, obj))[1]
+
+	def counter(self, name, help, **labels):
+		return self.add(name, "counter", help, Counter(), **labels)
+
+	def gauge(self, name, help, fn, **labels):
+		return self.add(name, "gauge", help, fn, **labels)
+
+	def histogram(self, name, help, bounds, **labels):
+		return self.add(name, "histogram", help, i2cbus.Histogram(bounds), **labels)
+
+	def collect(self, fn):
+		self.collectors.append(fn)
+
+	def text(self):
+		with self.lock:
+			fams = []
+			for n in self.order:
+				kind, help, series = self.families[n]
+				fams.append((n, kind, help, [series[k] for k in sorted(series)]))
+		extra = {}
+		for fn in self.collectors:
+			for name, kind, help, labels, obj in fn():
+				f = extra.get(name)
+				if f is None:
+					f = extra[name] = (name, kind, help, [])
+					fams.append(f)
+				f[3].append((labels, obj))
+		lines = []
+		for name, kind, help, series in fams:
+			lines.append("# HELP %s %s" % (name, help))
+			lines.append("# TYPE %s %s" % (name, kind))
+			for labels, obj in series:
+				if kind == "histogram":
+					n = 0
+					for b, c in zip(obj.bounds, obj.counts):
+						n += c
+						lines.append("%s_bucket%s %d" % (name, _labels(labels, ("le", b)), n))
+					lines.append("%s_bucket%s %d" % (name, _labels(labels, ("le", "+Inf")), obj.n))
+					lines.append("%s_sum%s %s" % (name, _labels(labels), _number(obj.total)))
+					lines.append("%s_count%s %d" % (name, _labels(labels), obj.n))
+					continue
+				if isinstance(obj, Counter):
+					v = obj.value
+				else:
+					v = obj()
+				lines.append("%s%s %s" % (name, _labels(labels), _number(v)))
+		return "\n".join(lines) + "\n"
+
+def i2c(registry):
+	# transactions, bytes and latency of every device seen on the buses
+	def fn():
+		out = []
+		for n, b in sorted(i2cbus._buses.items()):
+			for addr, s in sorted(b.stats.items()):
+				labels = {"bus": n, "addr": "0x%02x" % addr}
+				out.append(("punter_i2c_transactions_total", "counter", "I2C transactions",
+					labels, lambda s=s: s.transactions))
+				out.append(("punter_i2c_bytes_total", "counter", "I2C bytes moved",
+					labels, lambda s=s: s.bytes))
+				out.append(("punter_i2c_latency_us", "histogram", "I2C transaction time, us",
+					labels, s.latency))
+		return out
+	registry.collect(fn)
+
+#----------------------------------------------------------------------
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		if self.path.split("?")[0] not in ("/", "/metrics"):
+			self.send_error(404)
+			return
+		body = self.server.registry.text()
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain; version=0.0.4")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, fmt, *args):
+		pass
+
+class MetricsServer(threading.Thread):
+	# GET /metrics on localhost
+
+	def __init__(self, registry, port=PORT, host="127.0.0.1"):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.server = BaseHTTPServer.HTTPServer((host, port), Handler)
+		self.server.registry = registry
+
+	def run(self):
+		self.server.serve_forever()
+
+	def close(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+class Exporter(threading.Thread):
+	# the text rewritten every period seconds, atomically
+
+	def __init__(self, registry, path, period=PERIOD):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.registry = registry
+		self.path = path
+		self.period = period
+		self.done = threading.Event()
+
+	def write(self):
+		posfile.write_atomic(self.path, self.registry.text())
+
+	def run(self):
+		while not self.done.wait(self.period):
+			self.write()
+		self.write()
+
+	def close(self):
+		self.done.set()
+		self.join()
+
+#----------------------------------------------------------------------
+class Tracer(object):
+	"""
+	Debug trace of the steps, one in `every`: "t motor step numstep
+	period_us" lines to out.
+	"""
+
+	def __init__(self, every=100, out=sys.stderr, name="", clock=motion.now):
+		self.every = every
+		self.out = out
+		self.name = name or "-"
+		self.clock = clock
+
+	def __call__(self, i, numstep, delay):
+		if i % self.every == 0:
+			self.out.write("%.6f %s %d %d %d\n" % (self.clock(), self.name, i, numstep, delay))
@@ -0,0 +1,252 @@
+#----------------------------------------------------------------------
+#  motion.py
+#  Step timing profiles for the stepper.
+#
+#  A move is planned once, before the first step, as an array of
+#  delays in microseconds (one per step). The executor only walks that
+#  table against a monotonic deadline, so nothing is computed or printed
+#  between two steps.
+#----------------------------------------------------------------------
+import time
+import heapq
+from array import array
+
+TRAPEZOID = "trap"
+SCURVE = "scurve"
+
+# monotonic clock when available (python3), wall clock otherwise
+now = getattr(time, "monotonic", time.time)
+
+# below this margin the executor spins instead of sleeping
+SPIN = 0.0002
+# longest single sleep when the move can be aborted
+POLL = 0.01
+# step lateness histogram bounds, microseconds
+LATE_BOUNDS = [10, 20, 50, 100, 200, 500, 1000, 5000]
+
+_cache = {}
+_CACHE_MAX = 32
+
+#----------------------------------------------------------------------
+def _scurve(delays, v0, v1, n):
+	# n steps from v0 to v1, the speed a smoothstep of the time: no
+	# acceleration at either end. It lasts 2n / (v0 + v1), as long as a
+	# speed linear in time. Step k comes when the distance
+	# x(t) = v0 t + (v1 - v0) T (u^3 - u^4 / 2), u = t / T, reaches k.
+	T = 2.0 * n / (v0 + v1)
+	dv = v1 - v0
+	last = 0.0
+	for k in xrange(1, n + 1):
+		# Newton, kept inside [lo, hi] by halving
+		lo = t = last
+		hi = T
+		for j in xrange(50):
+			u = t / T
+			e = v0 * t + dv * T * u * u * u * (1.0 - 0.5 * u) - k
+			if -1e-6 < e < 1e-6:
+				break
+			if e < 0:
+				lo = t
+			else:
+				hi = t
+			t -= e / (v0 + dv * u * u * (3.0 - 2.0 * u))
+			if not lo < t < hi:
+				t = (lo + hi) / 2
+		delays.append(int(1000000.0 * (t - last)))
+		last = t
+
+def _ramp(delays, v0, v1, n, shape, off):
+	# n steps from v0 towards v1; off=0 starts at v0, off=1 ends at v1
+	if shape == SCURVE:
+		_scurve(delays, v0, v1, n)
+		return
+	for s in xrange(n):
+		v = v0 + (v1 - v0) * float(s + off) / n
+		delays.append(int(1000000.0 / v))
+
+def ramp(v0, v1, steps, shape=TRAPEZOID):
+	# delay table of a single ramp ending at v1 (e.g. stopping from v0)
+	delays = array("I")
+	if steps > 0 and v0 > 0 and v1 > 0:
+		_ramp(delays, v0, v1, int(steps), shape, 1)
+	return delays
+
+def plan(speed, steps, acc=500, dec=500, start=1.0, shape=TRAPEZOID, v0=None):
+	"""
+	Delay table (microseconds, array 'I') for a move of `steps` steps
+	at `speed` steps/s. `acc` and `dec` are the ramp lengths in steps,
+	`start` is the speed the ramps begin and end at. v0 is the speed
+	the motor already has when a move is re-planned on the fly.
+	"""
+	key = (speed, steps, acc, dec, start, shape, v0)
+	delays = _cache.get(key)
+	if delays is not None:
+		return delays
+	delays = array("I")
+	steps = int(steps)
+	if steps <= 0 or speed <= 0:
+		return delays
+	start = float(min(start, speed))
+	if v0 is None or v0 < start:
+		v0 = start
+	if steps <= dec * 2:
+		dec = steps // 2
+	acc = max(int(acc), 1)
+	# the ramp from v0 is as long as its share of the full ramp
+	full = acc
+	if speed > start:
+		full = int(round(acc * abs(speed - v0) / (speed - start)))
+	# on short moves the ramp up is cut where the ramp down begins
+	up = min(full, steps - dec)
+	peak = float(speed)
+	if up < full:
+		peak = v0 + (speed - v0) * float(up) / full
+	_ramp(delays, v0, peak, up, shape, 0)
+	cruise = int(1000000.0 / peak)
+	for s in xrange(steps - dec - up):
+		delays.append(cruise)
+	_ramp(delays, peak, start, dec, shape, 1)
+	if len(_cache) >= _CACHE_MAX:
+		_cache.clear()
+	_cache[key] = delays
+	return delays
+
+def duration(delays):
+	# planned length of a move in seconds
+	return sum(delays) * 1e-6
+
+def full_cruise(delays, skip=0):
+	"""
+	Half-step table -> (delays, incs) with its constant speed part made
+	of full steps: one entry for two half-steps, at twice the delay.
+	incs is the half-steps of every entry (array 'b'), None when there
+	is no cruise long enough. skip (0/1) is the parity the number of
+	half-steps before the first full step must have, so that the full
+	steps land on the two-coil phases.
+	"""
+	if len(delays) < 4:
+		return delays, None
+	c = min(delays)
+	a = 0
+	while delays[a] != c:
+		a += 1
+	b = a
+	while b < len(delays) and delays[b] == c:
+		b += 1
+	if a % 2 != skip:
+		a += 1
+	pairs = (b - a) // 2
+	if pairs < 2:
+		return delays, None
+	out = array("I", delays[:a])
+	incs = array("b", [1] * a)
+	out.extend(array("I", [2 * c]) * pairs)
+	incs.extend(array("b", [2]) * pairs)
+	rest = delays[a + 2 * pairs:]
+	out.extend(rest)
+	incs.extend(array("b", [1]) * len(rest))
+	return out, incs
+
+def coordinate(tables):
+	"""
+	Stretch delay tables that start together so that their last steps
+	come at the same time, the time of the slowest one: every delay of
+	a faster table is scaled by the same factor, keeping its profile.
+	"""
+	span = [sum(d[:-1]) for d in tables]
+	longest = max(span or [0])
+	out = []
+	for d, t in zip(tables, span):
+		if t == 0 or t == longest:
+			out.append(d)
+			continue
+		f = float(longest) / t
+		out.append(array("I", [int(round(x * f)) for x in d]))
+	return out
+
+#----------------------------------------------------------------------
+def run(delays, step, clock=now, sleep=time.sleep, spin=SPIN, abort=None, late=None):
+	"""
+	Call step(i) for every entry of the table, keeping each call on its
+	absolute deadline. When a step comes more than one period late the
+	deadline is moved to now instead of bursting to catch up.
+	abort() is asked before every step and at least every POLL seconds
+	while waiting; the number of steps done is returned. late: an
+	i2cbus.Histogram getting how late every step is, us.
+	"""
+	deadline = clock()
+	i = 0
+	for d in delays:
+		if abort is not None and abort():
+			break
+		step(i)
+		i += 1
+		deadline += d * 1e-6
+		left = deadline - clock()
+		if left < -d * 1e-6:
+			if late is not None:
+				late.add(-left * 1e6)
+			deadline -= left
+			continue
+		if abort is None:
+			if left > spin:
+				sleep(left - spin)
+		else:
+			while left > spin:
+				sleep(min(left - spin, POLL))
+				if abort():
+					return i
+				left = deadline - clock()
+		t = clock()
+		while t < deadline:
+			t = clock()
+		if late is not None:
+			late.add((t - deadline) * 1e6)
+	return i
+
+def run_many(tracks, clock=now, sleep=time.sleep, spin=SPIN, abort=None, late=None):
+	"""
+	Several delay tables from one timing loop, all starting now:
+	tracks is a list of (delays, step). The planned time of the next
+	step of every track is kept in a heap and the earliest step is
+	always the one made. A step late by more than its period shifts the
+	schedule of all the tracks, so they stay in step with each other.
+	abort() is polled as in run(), late as in run(). Returns the steps
+	done per track.
+	"""
+	shift = clock()
+	done = [0] * len(tracks)
+	heap = [(0.0, k) for k in xrange(len(tracks)) if len(tracks[k][0])]
+	heapq.heapify(heap)
+	while heap:
+		planned, k = heap[0]
+		deadline = planned + shift
+		left = deadline - clock()
+		if left > spin:
+			if abort is None:
+				sleep(left - spin)
+			else:
+				sleep(min(left - spin, POLL))
+				if abort():
+					break
+			continue
+		t = clock()
+		while t < deadline:
+			t = clock()
+		if late is not None:
+			late.add((t - deadline) * 1e6)
+		if abort is not None and abort():
+			break
+		delays, step = tracks[k]
+		i = done[k]
+		step(i)
+		done[k] = i + 1
+		if i + 1 == len(delays):
+			heapq.heappop(heap)
+			continue
+		d = delays[i] * 1e-6
+		behind = clock() - deadline
+		if behind > d:
+			shift += behind
+		heapq.heapreplace(heap, (planned + d, k))
+	return done
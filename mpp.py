@@ -0,0 +1,228 @@
+#----------------------------------------------------------------------
+#  mpp.py
+#  The .mpp motor command language.
+#
+#  One command per line, "<key> [motor] <p1>,<p2>,..." :
+#     init i1,i2,i3,i4     wiringPi pins of the four coils
+#     mov speed,steps,dir  speed in steps/s, dir >= 0 forward, < 0 back
+#     vel v / acc a / break b
+#     stop [0|1]           0 ramp down, 1 de-energize at once
+#     seek speed,span[,tol]  sweep +-span half-steps, park on the signal
+#                          peak, refined to tol half-steps (default 1)
+#     home pin,speed,dir   zero on the limit switch at wiringPi pin
+#     mode half|full|wave|auto  drive mode (auto: full steps in the cruise)
+#     sync ... end         the mov lines in between (one per motor) start
+#                          together and end together
+#  The motor is a name (az, el, ...) given at its init; without one the
+#  command is for the single unnamed motor, and a stop for all motors.
+#  Blank lines and lines starting with # are skipped.
+#----------------------------------------------------------------------
+import os
+import hashlib
+from collections import namedtuple
+
+class MppError(Exception):
+
+	def __init__(self, line, msg, name="<mpp>"):
+		Exception.__init__(self, "%s:%d: %s" % (name, line, msg))
+		self.line = line
+		self.msg = msg
+		self.name = name
+
+#----------------------------------------------------------------------
+# commands, all with the line number they come from as last field
+
+class Init(namedtuple("Init", "pins motor line")):
+	key = "init"
+	@property
+	def args(self):
+		return self.pins
+
+class Mov(namedtuple("Mov", "speed steps dir motor line")):
+	key = "mov"
+	@property
+	def args(self):
+		return (self.speed, self.steps, self.dir)
+
+class _Value(object):
+	@property
+	def args(self):
+		return (self.value,)
+
+class Vel(_Value, namedtuple("Vel", "value motor line")):
+	key = "vel"
+
+class Acc(_Value, namedtuple("Acc", "value motor line")):
+	key = "acc"
+
+class Break(_Value, namedtuple("Break", "value motor line")):
+	key = "break"
+
+class Stop(_Value, namedtuple("Stop", "value motor line")):
+	key = "stop"
+
+class Home(namedtuple("Home", "pin speed dir motor line")):
+	key = "home"
+	@property
+	def args(self):
+		return (self.pin, self.speed, self.dir)
+
+class Mode(namedtuple("Mode", "mode motor line")):
+	key = "mode"
+	@property
+	def args(self):
+		return (self.mode,)
+
+MODES = ("half", "full", "wave", "auto")
+
+class Sync(namedtuple("Sync", "moves motor line")):
+	# coordinated mov commands of several motors
+	key = "sync"
+	@property
+	def args(self):
+		return self.moves
+
+class Seek(namedtuple("Seek", "speed span tol motor line")):
+	key = "seek"
+	@property
+	def args(self):
+		return (self.speed, self.span, self.tol)
+
+#----------------------------------------------------------------------
+def _ints(par, n, lineno, key, name, optional=False):
+	if par == "":
+		if optional:
+			return [0] * n
+		raise MppError(lineno, "%s needs %d parameter(s)" % (key, n), name)
+	p = par.split(",")
+	if len(p) != n:
+		raise MppError(lineno, "%s needs %d parameter(s), got %d" % (key, n, len(p)), name)
+	try:
+		return [int(x) for x in p]
+	except ValueError:
+		raise MppError(lineno, "%s: bad number in '%s'" % (key, par), name)
+
+def parse_line(text, lineno=1, name="<mpp>"):
+	# one command, or None for blank and comment lines
+	text = text.strip()
+	if text == "" or text.startswith("#"):
+		return None
+	f = text.split()
+	key = f[0]
+	motor = ""
+	if key == "mode":
+		# the mode is a word too: mode [motor] <mode>
+		if len(f) not in (2, 3) or f[-1] not in MODES:
+			raise MppError(lineno, "mode: one of %s needed" % ", ".join(MODES), name)
+		if len(f) == 3:
+			motor = f[1]
+		return Mode(f[-1], motor, lineno)
+	if len(f) > 1 and (f[1][0].isalpha() or f[1][0] == "_"):
+		motor = f[1]
+		del f[1]
+	par = "".join(f[1:])
+	if key == "init":
+		pins = _ints(par, 4, lineno, key, name)
+		if len(set(pins)) != 4 or min(pins) < 0:
+			raise MppError(lineno, "init: four different pins needed", name)
+		return Init(tuple(pins), motor, lineno)
+	if key == "mov":
+		speed, steps, dir = _ints(par, 3, lineno, key, name)
+		if speed <= 0:
+			raise MppError(lineno, "mov: speed must be > 0", name)
+		if steps < 0:
+			raise MppError(lineno, "mov: steps must be >= 0", name)
+		return Mov(speed, steps, dir, motor, lineno)
+	if key == "stop":
+		(v,) = _ints(par, 1, lineno, key, name, optional=True)
+		return Stop(v, motor, lineno)
+	if key == "home":
+		pin, speed, dir = _ints(par, 3, lineno, key, name)
+		if pin < 0 or speed <= 0:
+			raise MppError(lineno, "home: bad pin or speed", name)
+		return Home(pin, speed, dir, motor, lineno)
+	if key == "seek":
+		if par.count(",") == 1:
+			par += ",1"
+		speed, span, tol = _ints(par, 3, lineno, key, name)
+		if speed <= 0 or span <= 0 or tol <= 0:
+			raise MppError(lineno, "seek: speed, span and tol must be > 0", name)
+		return Seek(speed, span, tol, motor, lineno)
+	for cls in (Vel, Acc, Break):
+		if key == cls.key:
+			(v,) = _ints(par, 1, lineno, key, name, optional=True)
+			return cls(v, motor, lineno)
+	raise MppError(lineno, "unknown command '%s'" % key, name)
+
+def parse(text, name="<mpp>"):
+	"""
+	Whole program as a list of commands. The first bad line raises
+	MppError, nothing of a bad program is run.
+	"""
+	prog = []
+	group = None
+	lineno = 0
+	for l in text.split("\n"):
+		lineno += 1
+		f = l.split()
+		if f == ["sync"]:
+			if group is not None:
+				raise MppError(lineno, "sync inside sync", name)
+			group = (lineno, [])
+			continue
+		if f == ["end"]:
+			if group is None:
+				raise MppError(lineno, "end without sync", name)
+			moves = group[1]
+			if len(set(m.motor for m in moves)) != len(moves):
+				raise MppError(lineno, "sync: one mov per motor", name)
+			prog.append(Sync(tuple(moves), "", group[0]))
+			group = None
+			continue
+		c = parse_line(l, lineno, name)
+		if c is None:
+			continue
+		if group is not None:
+			if c.key != "mov":
+				raise MppError(lineno, "only mov inside sync", name)
+			group[1].append(c)
+		else:
+			prog.append(c)
+	if group is not None:
+		raise MppError(group[0], "sync without end", name)
+	return prog
+
+#----------------------------------------------------------------------
+class ProgramCache(object):
+	"""
+	Loads .mpp files for the watchdog handler. load() returns None when
+	the file is still the version already seen (several events for one
+	write), the parsed program otherwise. Programs are kept by content
+	hash, so rewriting the same text is not parsed again.
+	"""
+
+	def __init__(self, size=32):
+		self.size = size
+		self.seen = {}		# path -> (size, mtime, hash)
+		self.programs = {}	# hash -> program
+
+	def load(self, path):
+		st = os.stat(path)
+		last = self.seen.get(path)
+		if last is not None and last[:2] == (st.st_size, st.st_mtime):
+			return None
+		f = open(path, "r")
+		text = f.read()
+		f.close()
+		h = hashlib.sha1(text).hexdigest()
+		self.seen[path] = (st.st_size, st.st_mtime, h)
+		prog = self.programs.get(h)
+		if prog is None:
+			prog = parse(text, os.path.basename(path))
+			if len(self.programs) >= self.size:
+				self.programs.clear()
+			self.programs[h] = prog
+		return prog
+
+	def forget(self, path):
+		self.seen.pop(path, None)
@@ -0,0 +1,58 @@
+#----------------------------------------------------------------------
+#  posfile.py
+#  Publishes the step count for the web page (pos.dat).
+#
+#  The file is rewritten in-process, through a temporary file renamed
+#  over it, so a reader always sees a complete number, and only when
+#  the value has changed since the last write.
+#----------------------------------------------------------------------
+import os
+import threading
+
+RATE = 2.0	# updates per second
+
+def write_atomic(path, text):
+	tmp = path + ".tmp"
+	f = open(tmp, "w")
+	f.write(text)
+	f.close()
+	os.rename(tmp, path)
+
+class PosPublisher(threading.Thread):
+
+	def __init__(self, path, get, rate=RATE):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.path = path
+		self.get = get
+		self.rate = rate
+		self.last = None
+		self.writes = 0
+		self.lock = threading.Lock()
+		self.done = threading.Event()
+
+	def publish(self):
+		# write the current value if it changed, returns True if written
+		with self.lock:
+			v = self.get()
+			if v == self.last:
+				return False
+			write_atomic(self.path, "%d\n" % v)
+			self.last = v
+			self.writes += 1
+			return True
+
+	def flush(self):
+		# final update at the end of a move
+		return self.publish()
+
+	def run(self):
+		while not self.done.is_set():
+			try:
+				self.publish()
+			except (IOError, OSError), e:
+				print "pos publisher: %s" % e
+			self.done.wait(1.0 / self.rate)
+
+	def close(self):
+		self.done.set()
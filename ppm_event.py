@@ -1,12 +1,18 @@
 #! /usr/bin/python
 import os
-import wiringpi as w
 import time
 import sys
 import time
-import threading
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
+from controller import MotionController
+from stepmotor import stepper, motor_files, NODE_DIR
+import mpp
+import coalesce
+import ctlsock
+import seek
+import motion
+import metrics
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
@@ -16,6 +22,15 @@ class MyHandler(PatternMatchingEventHandler):
 
     patterns = ["*.mpp"]
 
+    def __init__(self, controller, quiet=coalesce.QUIET):
+        PatternMatchingEventHandler.__init__(self)
+        self.controller = controller
+        self.programs = mpp.ProgramCache()
+        self.coalescer = coalesce.Coalescer(self.process, quiet)
+        self.events = {"modified": metrics.Counter(), "created": metrics.Counter()}
+        self.loaded = metrics.Counter()     # programs submitted
+        self.errors = metrics.Counter()     # files not readable or not valid
+
     def process(self, event):
         """
         event.event_type
@@ -26,151 +41,97 @@ class MyHandler(PatternMatchingEventHandler):
             path/to/observed/file
         """
         # the file will be processed there
-        print event.src_path, event.event_type  # print now only for degug
-	f=open(event.src_path,"r")
-	lines=f.read().split("\n")
-	f.close()
-	for l in lines:
-		if len(l)> 1 :
-			key,par =l.split(" ")
-			if key == "init" :
-				if locals().has_key("self.motor") == False :
-					print "init"
-					l1,l2,l3,l4=par.split(",")
-					self.motor=stepper(int(l1),int(l2),int(l3),int(l4))
-			elif key == "mov" :
-				print "move"
-				speed,target,dir=par.split(",")
-				self.motor.move(int(speed),int(target),int(dir))
-			elif key == "vel" :
-				print "vel"
-				time.sleep(1)
-			elif key == "acc" :
-				print "acc"
-				time.sleep(1)
-			elif key == "break" :
-				print "break"
-				time.sleep(1)
-			elif key == "stop"  :
-				print "stop"
-				self.motor.stop()
-				time.sleep(1)
-	
+	try:
+		prog=self.programs.load(event.src_path)
+	except mpp.MppError, e:
+		self.errors.inc()
+		print e
+		return
+	except (IOError, OSError), e:
+		self.errors.inc()
+		print e
+		return
+	if prog is None :
+		return	# same version of the file, already run
+	self.loaded.inc()
+	self.controller.submit_program(prog)
 
     def on_modified(self, event):
-        self.process(event)
+        self.events["modified"].inc()
+        self.coalescer.push(event)
 
     def on_created(self, event):
-        self.process(event)
+        self.events["created"].inc()
+        self.coalescer.push(event)
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
-class stepper():
-	def __init__(self,i1,i2,i3,i4):
-		w.wiringPiSetup()
-		self.inp=[i1,i2,i3,i4]
-		w.pinMode(i1,w.OUTPUT)
-		w.pinMode(i2,w.OUTPUT)
-		w.pinMode(i3,w.OUTPUT)
-		w.pinMode(i4,w.OUTPUT)
-		w.digitalWrite(i1,0)
-		w.digitalWrite(i2,0)
-		w.digitalWrite(i3,0)
-		w.digitalWrite(i4,0)
-		self.numstep=0
-		self.half=[]
-		self.half.append([1,0,0,1]) # setp 0
-		self.half.append([1,0,0,0]) # step 1
-		self.half.append([1,1,0,0]) # step 2
-		self.half.append([0,1,0,0]) # step 3
-		self.half.append([0,1,1,0]) # step 4
-		self.half.append([0,0,1,0]) # step 5
-		self.half.append([0,0,1,1]) # step 6
-		self.half.append([0,0,0,1]) # step 7
-		self.acc= 500  # passi
-		self.dec= 500  # passi 
-		self.actspeed=0
-		self.t=threading.Thread(target=self.update_pos)
-		self.t.start()
-		time.sleep(1)
-		self.update=False
-
-	def get_numstep(self):
-		return self.numstep
-
-	def stop(self):
-		w.digitalWrite(self.inp[0],0)
-		w.digitalWrite(self.inp[1],0)
-		w.digitalWrite(self.inp[2],0)
-		w.digitalWrite(self.inp[3],0)
-		self.update=False
-		
-
-	def update_stop (self):
-		self.update_run=False
-
-	def update_pos (self):
-	 	self.update= True
-		self.update_run=True
-		while self.update_run:
-			if self.update :
-				os.system("echo %d > /var/www/html/node/pos.dat" % (self.get_numstep()))
-#				print "1"
-			time.sleep(0.5)
-#			print "2"
+REGISTRY = metrics.Registry()
+METRICS_PORT = metrics.PORT
+METRICS_FILE = os.environ.get("PUNTER_METRICS")        # textfile collector output
+TRACE = int(os.environ.get("PUNTER_TRACE", "0"))        # trace one step in TRACE
 
-	def move (self,speed,rel=1,dir=1): #speed = passi al secondo Hz 
-		self.update=True
-		if dir >=0 :
-			d=1
-		else:
-			d=-1
-		refspeed=speed
-		self.actspeed=1
-		if rel <= (self.dec*2) :
-			dec=rel/2	
-		else:
-			dec = self.dec
-		for s in range(0,rel):
-			self.numstep=self.numstep+d
-			if s == (rel - dec) :
-				refspeed = 0
-			t=1.0/self.actspeed
-			actacc=float(speed)/self.acc
-			print self.numstep,1.0/self.actspeed,self.actspeed,actacc,speed
-			fase=self.numstep  % 8
-			for k in range(0,4):
-#				print k, self.inp[k],self.half[fase][k]
-				w.digitalWrite(self.inp[k],self.half[fase][k])
-			if self.actspeed < refspeed :
-				print "Acc"
-				self.actspeed=self.actspeed+ actacc
-				if self.actspeed > speed :
-					self.actspeed = speed
+def make_motor(i1, i2, i3, i4, name=""):
+    # every motor with its own pos file, journal and status block
+    pos_file, journal_file, status_file = motor_files(name)
+    m = stepper(i1, i2, i3, i4, pos_file=pos_file, status_file=status_file,
+        journal_file=journal_file)
+    m.late = REGISTRY.histogram("punter_step_late_us", "step lateness against its deadline, us",
+        motion.LATE_BOUNDS, motor=name or "-")
+    if TRACE:
+        m.trace = metrics.Tracer(TRACE, name=name)
+    return m
 
-			elif self.actspeed > refspeed :
-				print "Dec"
-				self.actspeed=self.actspeed - actacc
-				if self.actspeed <= 0 :
-					self.actspeed = 0.001
-					return
-			time.sleep(t)
-		time.sleep(1)
-		self.update=False
+def instrument(reg, controller, handler):
+    # the counts of controller and file handler, read at export time
+    for k, c in sorted(controller.commands.items()):
+        reg.add("punter_commands_total", "counter", "commands executed", c, key=k)
+    reg.add("punter_command_errors_total", "counter", "commands failed", controller.errors)
+    reg.add("punter_commands_dropped_total", "counter", "commands dropped, queue full",
+        lambda: controller.dropped)
+    reg.gauge("punter_queue_length", "commands queued", controller.queued)
+    reg.gauge("punter_command_latency_max_seconds", "command to first step, max",
+        lambda: controller.latency.max)
+    reg.gauge("punter_command_latency_mean_seconds", "command to first step, mean",
+        controller.latency.mean)
+    for k, c in sorted(handler.events.items()):
+        reg.add("punter_watchdog_events_total", "counter", "watchdog events", c, type=k)
+    reg.add("punter_watchdog_events_coalesced_total", "counter", "watchdog events handled after coalescing",
+        lambda: handler.coalescer.events_out)
+    reg.add("punter_programs_total", "counter", "programs submitted from files", handler.loaded)
+    reg.add("punter_program_errors_total", "counter", "program files not read", handler.errors)
+    def positions():
+        return [("punter_position_halfsteps", "gauge", "motor position", {"motor": n or "-"},
+            lambda m=m: m.numstep) for n, m in sorted(controller.motors.items())]
+    reg.collect(positions)
+    metrics.i2c(reg)
 #--------------------------------------------------------------------------------
 #----------------------------------------------------------------------
 if __name__ == '__main__':
     args = sys.argv[1:]
+    # optional signal for seek: file:<path> or adc:<addr>:<channel>
+    metric = None
+    if args:
+        metric = seek.metric(args[0])
+    controller = MotionController(make_motor, metric=metric)
+    controller.start()
+    server = ctlsock.CommandServer(controller)
+    server.start()
     observer = Observer()
-#    observer.schedule(MyHandler(), path="./")
-    observer.schedule(MyHandler(), path="/var/www/html/node/")
+    handler = MyHandler(controller)
+#    observer.schedule(handler, path="./")
+    observer.schedule(handler, path=NODE_DIR)
     observer.start()
+    instrument(REGISTRY, controller, handler)
+    metrics.MetricsServer(REGISTRY, METRICS_PORT).start()
+    if METRICS_FILE:
+        metrics.Exporter(REGISTRY, METRICS_FILE).start()
     time.sleep(1)
     try:
-	os.system("cp /var/www/html/node/motor.init /var/www/html/node/motor.mpp")
+	os.system("cp %s/motor.init %s/motor.mpp" % (NODE_DIR, NODE_DIR))
 	time.sleep(1)
-	os.system("echo 'stop 0' > /var/www/html/node/motor.mpp")
+	os.system("echo 'stop 0' > %s/motor.mpp" % NODE_DIR)
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------
+#  seek.py
+#  Scan and peak-seek: points the antenna at the strongest signal.
+#
+#  seek(motor, metric, speed, span) sweeps span half-steps each side of
+#  the current position while a sampler thread reads the metric and the
+#  step count around every reading, so one sweep gives a position ->
+#  signal profile. The best bin of the profile is then refined with a
+#  golden-section search, metric read at rest, and the motor is parked
+#  on the peak.
+#
+#  A metric is any callable returning a number, larger is better:
+#     FileMetric("/tmp/rssi")          first number in a file (link RSSI)
+#     AdcMetric(ads1115.ADS1115(), 0)  an ADS1115 channel, volts
+#  metric(spec) builds one from "file:<path>" or "adc:<addr>:<channel>".
+#----------------------------------------------------------------------
+import time
+import threading
+import numpy as np
+import motion
+from adcstream import Ring
+
+RATE = 200.0		# metric readings per second while sweeping
+BINS = 64		# profile bins over the sweep
+SETTLE = 0.1		# s at rest before reading the metric in the refinement
+READS = 4		# metric readings averaged per refinement point
+GOLDEN = 0.6180339887498949
+
+class FileMetric(object):
+
+	def __init__(self, path):
+		self.path = path
+
+	def __call__(self):
+		f = open(self.path, "r")
+		v = float(f.read().split()[0])
+		f.close()
+		return v
+
+class AdcMetric(object):
+
+	def __init__(self, adc, channel=0):
+		self.adc = adc
+		self.channel = adc.channels[channel]
+
+	def __call__(self):
+		import ads1115
+		return ads1115.volts(self.adc.read(self.channel), self.channel.pga)
+
+def metric(spec):
+	kind, arg = spec.split(":", 1)
+	if kind == "file":
+		return FileMetric(arg)
+	if kind == "adc":
+		import ads1115
+		addr, ch = arg.split(":")
+		return AdcMetric(ads1115.ADS1115(int(addr, 0)), int(ch))
+	raise ValueError("unknown metric '%s'" % spec)
+
+#----------------------------------------------------------------------
+class Sampler(threading.Thread):
+	"""
+	Reads metric() at up to `rate` per second into a Ring, with the step
+	count at the middle of each reading as its position.
+	"""
+
+	def __init__(self, metric, position, rate=RATE, size=8192):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.metric = metric
+		self.position = position
+		self.rate = rate
+		self.ring = Ring(size, np.float64)
+		self.errors = 0
+		self.done = threading.Event()
+
+	def run(self):
+		dt = 1.0 / self.rate
+		while not self.done.is_set():
+			t0 = motion.now()
+			p0 = self.position()
+			try:
+				v = self.metric()
+			except (IOError, OSError, ValueError):
+				self.errors += 1
+			else:
+				self.ring.put(t0, v, (p0 + self.position()) // 2)
+			left = dt - (motion.now() - t0)
+			if left > 0:
+				self.done.wait(left)
+
+	def close(self):
+		self.done.set()
+		self.join()
+
+def profile(pos, values, lo, hi, bins=BINS):
+	# mean metric per position bin over lo..hi: (centres, means), empty bins left out
+	width = max((hi - lo) / float(bins), 1.0)
+	n = int((hi - lo) / width) + 1
+	idx = np.clip(((pos - lo) / width).astype(int), 0, n - 1)
+	count = np.bincount(idx, minlength=n)
+	total = np.bincount(idx, weights=values, minlength=n)
+	full = count > 0
+	centres = lo + (np.arange(n) + 0.5) * width
+	return centres[full], total[full] / count[full]
+
+class SeekResult(object):
+
+	def __init__(self):
+		self.positions = None	# sweep profile
+		self.values = None
+		self.samples = 0
+		self.coarse = None	# best bin centre of the sweep
+		self.peak = None	# parked position
+		self.value = None	# metric there
+		self.evaluations = 0
+		self.aborted = False
+
+	def __str__(self):
+		if self.aborted:
+			return "seek aborted"
+		return "seek peak %d value %g (sweep %d samples, coarse %d, %d evaluations)" % (
+			self.peak, self.value, self.samples, self.coarse, self.evaluations)
+
+#----------------------------------------------------------------------
+def goto(motor, target, speed, abort=None, settle=0):
+	# move to an absolute position, False if interrupted
+	rel = target - motor.numstep
+	if rel == 0:
+		return True
+	motor.move(speed, abs(rel), rel, abort, settle)
+	return motor.numstep == target
+
+def at_rest(metric, settle=SETTLE, reads=READS, sleep=time.sleep):
+	if settle:
+		sleep(settle)
+	return sum(metric() for i in xrange(reads)) / float(reads)
+
+def seek(motor, metric, speed, span, tol=1, abort=None, rate=RATE,
+		bins=BINS, settle=SETTLE, reads=READS):
+	"""
+	Sweep motor.numstep - span .. + span at speed, refine the best bin
+	down to tol half-steps, park on the peak. Returns a SeekResult.
+	"""
+	r = SeekResult()
+	home = motor.numstep
+	lo = home - span
+	hi = home + span
+	# coarse sweep, sampled on the move
+	if not goto(motor, lo, speed, abort):
+		r.aborted = True
+		return r
+	s = Sampler(metric, motor.get_numstep, rate)
+	s.start()
+	try:
+		ok = goto(motor, hi, speed, abort)
+	finally:
+		s.close()
+	if not ok:
+		r.aborted = True
+		return r
+	views = s.ring.views(0, s.ring.n)
+	if not views:
+		r.aborted = True
+		return r
+	pos = np.concatenate([v[2] for v in views])
+	val = np.concatenate([v[1] for v in views])
+	r.samples = len(pos)
+	r.positions, r.values = profile(pos, val, lo, hi, bins)
+	r.coarse = int(round(r.positions[np.argmax(r.values)]))
+
+	# golden-section search at rest, over the bins around the best one
+	width = max(int(2 * (hi - lo) / bins), 2 * tol)
+	a = max(lo, r.coarse - width)
+	b = min(hi, r.coarse + width)
+	seen = {}
+	def f(p):
+		if p not in seen:
+			if not goto(motor, p, speed, abort):
+				raise _Aborted()
+			seen[p] = at_rest(metric, settle, reads)
+		return seen[p]
+	try:
+		c = int(round(b - GOLDEN * (b - a)))
+		d = int(round(a + GOLDEN * (b - a)))
+		# closest point first: the motor is at hi, or near it
+		fd = f(d)
+		fc = f(c)
+		while b - a > tol and c < d:
+			if fc >= fd:
+				b, d, fd = d, c, fc
+				c = int(round(b - GOLDEN * (b - a)))
+				fc = f(c)
+			else:
+				a, c, fc = c, d, fd
+				d = int(round(a + GOLDEN * (b - a)))
+				fd = f(d)
+		best = max(seen, key=seen.get)
+		goto(motor, best, speed, abort)
+		if motor.numstep != best:
+			raise _Aborted()
+	except _Aborted:
+		r.aborted = True
+		return r
+	r.evaluations = len(seen)
+	r.peak = best
+	r.value = seen[best]
+	return r
+
+class _Aborted(Exception):
+	pass
@@ -0,0 +1,263 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  sensord.py
+#  One process for all the sensors of a node.
+#
+#     python sensord.py bme280@0x76:10 bmp180:1 ads1115@0x49:0.5 pos:1
+#     python sensord.py --log /var/lib/punter/tlm bme280:10 ...
+#     python sensord.py --metrics /var/lib/node_exporter/sensord.prom ...
+#
+#  Every driver is a task with its own period, run from one loop that
+#  keeps the next deadlines in a heap, all on the shared i2cbus handle.
+#  A task is a function returning a reading, or a generator yielding
+#  the seconds it has to wait for a conversion (other tasks run
+#  meanwhile) and then Value(reading); None is no reading. Readings go
+#  to sink(name, time, value), stdout or a tlog.Writer; per task
+#  lateness and CPU time are in report().
+#----------------------------------------------------------------------
+import sys
+import time
+import heapq
+import threading
+import types
+from collections import namedtuple
+import motion
+import i2cbus
+
+Value = namedtuple("Value", "value")
+
+# lateness histogram bounds, microseconds
+LATE_BOUNDS = [100, 500, 1000, 5000, 10000, 50000, 100000, 1000000]
+
+class Task(object):
+
+	def __init__(self, name, fn, period, offset=0.0):
+		self.name = name
+		self.fn = fn
+		self.period = period
+		self.offset = offset
+		self.gen = None		# running generator
+		self.due = 0.0		# deadline of the current run
+		self.runs = 0
+		self.skipped = 0	# periods missed altogether
+		self.errors = 0
+		self.cpu = 0.0
+		self.late = i2cbus.Histogram(LATE_BOUNDS)
+		self.max_late = 0.0
+
+	def __str__(self):
+		return "%-12s %6d runs %4d skipped %3d errors late mean %7.0f max %7.0f us cpu %6.0f us/run" % (
+			self.name, self.runs, self.skipped, self.errors, self.late.mean(),
+			self.max_late * 1e6, self.cpu * 1e6 / max(self.runs, 1))
+
+def printer(name, t, value):
+	print "%.3f %s %s" % (t, name, value)
+
+#----------------------------------------------------------------------
+class Scheduler(object):
+
+	def __init__(self, sink=printer, clock=motion.now, cpu=time.clock, wall=time.time):
+		self.sink = sink
+		self.clock = clock
+		self.wall = wall		# time stamp of the readings
+		self.cpu = cpu
+		self.tasks = []
+		self.heap = []		# (time, seq, task)
+		self.seq = 0
+		self.done = threading.Event()
+		self.wake = self.done.wait
+
+	def add(self, name, fn, period, offset=0.0):
+		t = Task(name, fn, period, offset)
+		self.tasks.append(t)
+		t.due = self.clock() + offset
+		self._push(t.due, t)
+		return t
+
+	def _push(self, when, task):
+		self.seq += 1
+		heapq.heappush(self.heap, (when, self.seq, task))
+
+	def _finish(self, task, value):
+		task.runs += 1
+		if value is not None:
+			self.sink(task.name, self.wall(), value)
+
+	def _next(self, task):
+		# next deadline on the period grid, skipping periods already gone
+		task.due += task.period
+		now = self.clock()
+		if task.due < now:
+			n = int((now - task.due) / task.period) + 1
+			task.skipped += n
+			task.due += n * task.period
+		self._push(task.due, task)
+
+	def step(self):
+		# run the first task in the heap, sleeping until it is due
+		when, seq, task = self.heap[0]
+		left = when - self.clock()
+		if left > 0:
+			self.wake(left)
+			return
+		heapq.heappop(self.heap)
+		if task.gen is None:
+			late = self.clock() - task.due
+			task.late.add(late * 1e6)
+			if late > task.max_late:
+				task.max_late = late
+		c0 = self.cpu()
+		try:
+			if task.gen is None:
+				r = task.fn()
+				if isinstance(r, types.GeneratorType):
+					task.gen = r
+				else:
+					self._finish(task, r)
+			if task.gen is not None:
+				r = task.gen.next()
+				if isinstance(r, Value):
+					task.gen.close()
+					task.gen = None
+					self._finish(task, r.value)
+				else:
+					self._push(self.clock() + r, task)
+					return
+		except StopIteration:
+			task.gen = None
+		except Exception, e:
+			task.gen = None
+			task.errors += 1
+			print "%s: %s" % (task.name, e)
+		finally:
+			task.cpu += self.cpu() - c0
+		self._next(task)
+
+	def run(self, until=None):
+		while not self.done.is_set() and self.heap:
+			if until is not None and self.clock() >= until:
+				return
+			self.step()
+
+	def stop(self):
+		self.done.set()
+
+	def report(self):
+		return "\n".join(str(t) for t in self.tasks)
+
+#----------------------------------------------------------------------
+# driver tasks, conversions yielded to the scheduler
+
+def bme280_task(dev):
+	import bme280
+	def sample():
+		dev.bus.write_byte_data(dev.addr, bme280.REG_CONTROL, dev.control)
+		yield dev.wait_time / 1000
+		yield Value(bme280.compensate(dev.cal, *dev.readData()))
+	return sample
+
+def bmp180_task(dev):
+	import bmp180
+	def sample():
+		if dev.tempDue():
+			dev.startConversion(bmp180.CRV_TEMP)
+			yield bmp180.T_TEMP_MS[0] / 1000
+			dev.setUT(dev.toUT(dev.bus.read_i2c_block_data(dev.addr, bmp180.REG_MSB, 2)))
+		dev.uses += 1
+		dev.startConversion(dev.presCommand())
+		yield bmp180.T_PRES_MS[dev.oversample][0] / 1000
+		UP = dev.toUP(dev.bus.read_i2c_block_data(dev.addr, bmp180.REG_MSB, 3))
+		yield Value(bmp180.compensate(dev.cal, dev.UT, UP, dev.oversample))
+	return sample
+
+def ads1115_task(dev):
+	import ads1115
+	def sample():
+		out = []
+		for ch in dev.channels:
+			dev.start(ch)
+			yield ads1115.period(ch.dr)
+			out.append(dev.result())
+		yield Value(tuple(out))
+	return sample
+
+def driver(kind, addr=None):
+	# task function for a sensor by name
+	if kind == "bme280":
+		import bme280
+		return bme280_task(bme280.BME280(addr or bme280.DEVICE))
+	if kind == "bmp180":
+		import bmp180
+		return bmp180_task(bmp180.BMP180(addr or bmp180.DEVICE))
+	if kind == "ads1115":
+		import ads1115
+		return ads1115_task(ads1115.ADS1115(addr or ads1115.DEVICE))
+	if kind == "pos":
+		# motor position, from the status block of the motor daemon
+		import status
+		r = status.StatusReader()
+		return lambda: r.read().numstep
+	raise ValueError("unknown sensor '%s'" % kind)
+
+def parse(spec):
+	# "kind[@addr]:period" -> (name, kind, addr, period)
+	name, period = spec.rsplit(":", 1)
+	addr = None
+	kind = name
+	if "@" in name:
+		kind, a = name.split("@")
+		addr = int(a, 0)
+	return (name, kind, addr, float(period))
+
+REPORT = 60.0	# s between reports
+
+def instrument(reg, s):
+	# task counts and lateness, bus traffic, read at export time
+	import metrics
+	for t in s.tasks:
+		reg.add("sensord_runs_total", "counter", "task runs", lambda t=t: t.runs, task=t.name)
+		reg.add("sensord_skipped_total", "counter", "periods skipped", lambda t=t: t.skipped, task=t.name)
+		reg.add("sensord_errors_total", "counter", "task errors", lambda t=t: t.errors, task=t.name)
+		reg.add("sensord_late_us", "histogram", "task start lateness, us", t.late, task=t.name)
+	metrics.i2c(reg)
+
+def main():
+	specs = sys.argv[1:]
+	log = None
+	prom = None
+	while specs[:1] in (["--log"], ["--metrics"]):
+		if specs[0] == "--log":
+			import tlog
+			log = tlog.Writer(specs[1], compress=True)
+		else:
+			import metrics
+			reg = metrics.Registry()
+			prom = metrics.Exporter(reg, specs[1], REPORT)
+		specs = specs[2:]
+	specs = specs or ["bme280:10"]
+	s = Scheduler()
+	if log is not None:
+		s.sink = log.sink
+	for i, spec in enumerate(specs):
+		name, kind, addr, period = parse(spec)
+		# spread the first runs a little
+		s.add(name, driver(kind, addr), period, 0.01 * i)
+	if prom is not None:
+		instrument(reg, s)
+		prom.start()
+	def report():
+		print s.report()
+		if log is not None:
+			log.flush()
+	s.add("report", report, REPORT, REPORT)
+	try:
+		s.run()
+	except KeyboardInterrupt:
+		print s.report()
+	if log is not None:
+		log.close()
+	if prom is not None:
+		prom.close()
+
+if __name__ == '__main__':
+	main()
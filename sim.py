@@ -0,0 +1,338 @@
+#! /usr/bin/python
+#----------------------------------------------------------------------
+#  sim.py
+#  Off-line replay of motor programs and sensor schedules on a virtual
+#  clock: no wiringpi, no smbus and no waiting.
+#
+#     python sim.py motor.init motor.mpp sched.mpp temp
+#     python sim.py --cost 30 --overshoot 80 --csv steps.csv motor.mpp
+#     python sim.py --sensors 3600 bme280:10 bmp180@0x76:1 ads1115:0.5
+#
+#  The motors are steppers on SimOutput, a recording output that stamps
+#  every phase with the virtual time and follows the rotor from the
+#  phases. Programs are queued to a MotionController whose loop runs
+#  on the calling thread (drain), one file after the other, each to its
+#  end; the moves of different motors in a file overlap as live. A
+#  replay takes a fraction of the real time and always gives the same
+#  result: the step timeline of every motor, its max speed and
+#  acceleration measured on the phases, and the steps that came late.
+#  Steps are only late when the clock is given a cost: time per phase
+#  write (--cost, us) and sleep overshoot (--overshoot, --jitter, us).
+#  Sensors run the sensord tasks on fakesmbus chips, the bus transfers
+#  timed at the bus clock. Seek has no signal here and is skipped.
+#----------------------------------------------------------------------
+import sys
+import time
+import math
+import random
+from array import array
+import numpy as np
+import mpp
+import gpio_out
+import i2cbus
+import fakesmbus
+import sensord
+from controller import MotionController
+from stepmotor import stepper
+
+INIT = "init 7,0,2,3"	# motor.init of the node
+MISS = 0.0001		# s, a step later than this missed its deadline
+LATE_BOUNDS = [10, 50, 100, 500, 1000, 5000, 10000]	# us
+BUS_HZ = 100000
+
+class VirtualClock(object):
+	"""
+	Time that only moves when asked. Every now() costs `tick` seconds,
+	so busy waits end; sleep(dt) moves by dt plus `overshoot` plus an
+	exponential `jitter` (seeded, the same on every run).
+	"""
+
+	def __init__(self, t0=0.0, tick=1e-7, overshoot=0.0, jitter=0.0, seed=1):
+		self.t = t0
+		self.tick = tick
+		self.overshoot = overshoot
+		self.jitter = jitter
+		self.random = random.Random(seed)
+		self.sleeps = 0
+
+	def now(self):
+		self.t += self.tick
+		return self.t
+
+	def sleep(self, dt):
+		self.sleeps += 1
+		if dt > 0:
+			self.t += dt
+		self.t += self.overshoot
+		if self.jitter:
+			self.t += self.random.expovariate(1.0 / self.jitter)
+
+	def advance(self, dt):
+		self.t += dt
+
+#----------------------------------------------------------------------
+class SimOutput(gpio_out.RecordingOutput):
+	"""
+	Phases with their virtual time. pos follows the rotor: a phase one
+	or two half-steps away moves it, a bigger jump is a lost step (the
+	rotor stays). times/positions hold one entry per phase written.
+	"""
+
+	def __init__(self, pins, clock, cost=0.0):
+		gpio_out.RecordingOutput.__init__(self, pins)
+		self.clock = clock
+		self.cost = cost	# s per write
+		self.index = {}
+		self.k = None
+		self.pos = 0
+		self.pos0 = 0		# pos at the start of the timeline
+		self.lost = 0
+		self.times = array("d")
+		self.positions = array("l")
+
+	def follow(self, phase, numstep=0):
+		# phase table of the motor, rotor resting on phase numstep
+		self.index = dict((m, i) for i, m in enumerate(phase))
+		self.k = numstep % len(phase)
+		self.pos = self.pos0 = numstep
+
+	def _set(self, mask, changed):
+		t = self.clock.now()
+		if self.cost:
+			self.clock.advance(self.cost)
+		gpio_out.RecordingOutput._set(self, mask, changed)
+		k = self.index.get(mask)
+		if k is None:
+			return
+		if self.k is not None:
+			dk = (k - self.k + 4) % 8 - 4
+			if abs(dk) > 2:
+				self.lost += 1
+			else:
+				self.pos += dk
+		self.k = k
+		self.times.append(t)
+		self.positions.append(self.pos)
+
+	def reset(self):
+		gpio_out.RecordingOutput.reset(self)
+		del self.times[:]
+		del self.positions[:]
+		self.pos0 = self.pos
+		self.lost = 0
+
+#----------------------------------------------------------------------
+class SimStepper(stepper):
+	"""
+	stepper timing its own steps against the deadlines the executor
+	gives them: previous deadline + period, moved to the end of the
+	previous step when that is more than a period past it already.
+	Lateness goes to `lateness`; stepper.late (metrics) is left alone.
+	"""
+
+	def __init__(self, *pins, **kw):
+		stepper.__init__(self, *pins, **kw)
+		self.lateness = i2cbus.Histogram(LATE_BOUNDS)
+		self.missed = 0
+		self.max_late = 0.0
+
+	def step_fn(self, d, delays=None, incs=None):
+		step = stepper.step_fn(self, d, delays, incs)
+		if delays is None:
+			return step
+		clock = self.clock
+		due = [0.0, 0.0]	# deadline, end of the previous step
+		def timed(i):
+			t = clock()
+			if i == 0:
+				due[0] = t
+			else:
+				p = delays[i - 1] * 1e-6
+				due[0] += p
+				if due[1] - due[0] > p:
+					due[0] = due[1]
+				late = t - due[0]
+				self.lateness.add(late * 1e6)
+				if late > MISS:
+					self.missed += 1
+				if late > self.max_late:
+					self.max_late = late
+			step(i)
+			due[1] = clock()
+		return timed
+
+#----------------------------------------------------------------------
+class Sim(object):
+	"""
+	Controller and motors on one VirtualClock. limit: position (half-
+	steps, rotor) at and below which the limit switch of every motor is
+	closed, for home; None, no switch.
+	"""
+
+	def __init__(self, clock=None, cost=0.0, limit=None):
+		self.clock = clock or VirtualClock()
+		self.cost = cost
+		self.limit = limit
+		self.c = MotionController(self.motor, 0)	# no limit, files are queued whole
+		self.c.clock = self.clock.now
+		self.c.sleep = self.clock.sleep
+		self.c.wait = self.clock.sleep
+		self.c.spin = 0.0
+
+	def motor(self, *pins, **kw):
+		out = SimOutput(pins, self.clock, self.cost)
+		m = SimStepper(*pins, out=out, pos_file=None)
+		m.clock = self.clock.now
+		m.sleep = self.clock.sleep
+		m.spin = 0.0
+		m.inputs = lambda pin: self.switch(out)
+		out.follow(m.phase, m.numstep)
+		return m
+
+	def switch(self, out):
+		limit = self.limit
+		return lambda: limit is not None and out.pos <= limit
+
+	def play(self, prog):
+		# run a parsed program to its end, returns the virtual seconds
+		t0 = self.clock.t
+		self.c.submit_program(prog)
+		self.c.drain()
+		return self.clock.t - t0
+
+	def stats(self):
+		# name -> motion stats of the steps recorded so far
+		return dict((n, stats(m)) for n, m in self.c.motors.items())
+
+	def reset(self):
+		for m in self.c.motors.values():
+			m.out.reset()
+			m.lateness = i2cbus.Histogram(LATE_BOUNDS)
+			m.missed = 0
+			m.max_late = 0.0
+
+def stats(m):
+	"""
+	Timeline numbers of a SimStepper: steps, net travel, max speed
+	(half-steps/s) and acceleration (half-steps/s^2) between phases,
+	steps late, lost.
+	"""
+	out = m.out
+	t = np.frombuffer(out.times, dtype=np.float64)
+	p = np.array(out.positions, dtype=np.float64)
+	s = {"steps": len(t), "travel": out.pos - out.pos0, "max_speed": 0.0, "max_acc": 0.0,
+		"late_mean_us": m.lateness.mean(), "late_max_us": m.max_late * 1e6,
+		"missed": m.missed, "lost": out.lost, "numstep": m.numstep, "pos": out.pos}
+	if len(t) < 2:
+		return s
+	dt = np.diff(t)
+	v = np.diff(p) / dt
+	s["max_speed"] = float(np.abs(v).max())
+	if len(v) > 1:
+		a = np.diff(v) / ((dt[1:] + dt[:-1]) / 2)
+		s["max_acc"] = float(np.abs(a).max())
+	return s
+
+def timeline(sim):
+	# (t, name, pos) of every phase recorded, in time order
+	rows = []
+	for n, m in sim.c.motors.items():
+		rows.extend((t, n or "-", p) for t, p in zip(m.out.times, m.out.positions))
+	rows.sort()
+	return rows
+
+#----------------------------------------------------------------------
+def chips(specs, clock):
+	# fake chip for every sensor of the specs, by address
+	devices = {}
+	for name, kind, addr, period in specs:
+		if kind == "bme280":
+			import bme280
+			dev = fakesmbus.FakeBME280(clock=clock.now)
+			addr = addr or bme280.DEVICE
+		elif kind == "bmp180":
+			import bmp180
+			dev = fakesmbus.FakeBMP180(clock=clock.now)
+			addr = addr or bmp180.DEVICE
+		elif kind == "ads1115":
+			import ads1115
+			# AIN0-3: slow sines around 1, 1.2, 1.4, 1.6 V
+			inputs = dict((ads1115.MUX_AIN0 + k, lambda t, k=k: 1.0 + 0.2 * k + 0.1 * math.sin(t))
+				for k in range(4))
+			dev = fakesmbus.FakeADS1115(inputs, clock.now)
+			addr = addr or ads1115.DEVICE
+		else:
+			raise ValueError("no simulated '%s'" % kind)
+		if addr in devices:
+			raise ValueError("two sensors at 0x%02x" % addr)
+		devices[addr] = dev
+	return devices
+
+def sensors(specs, seconds, clock=None, hz=BUS_HZ):
+	"""
+	sensord schedule of specs ("kind[@addr]:period") for `seconds` of
+	virtual time. Returns (scheduler, readings per task).
+	"""
+	clock = clock or VirtualClock()
+	specs = [sensord.parse(s) for s in specs]
+	i2cbus.use(0, fakesmbus.FakeSMBus(chips(specs, clock), hz, clock.sleep))
+	readings = {}
+	def sink(name, t, value):
+		readings[name] = readings.get(name, 0) + 1
+	s = sensord.Scheduler(sink, clock.now, wall=clock.now)
+	s.wake = clock.sleep
+	for i, (name, kind, addr, period) in enumerate(specs):
+		s.add(name, sensord.driver(kind, addr), period, 0.01 * i)
+	s.run(clock.t + seconds)
+	return s, readings
+
+#----------------------------------------------------------------------
+def main():
+	args = sys.argv[1:]
+	opts = {"--cost": 0.0, "--overshoot": 0.0, "--jitter": 0.0, "--limit": None,
+		"--csv": None, "--sensors": None}
+	while args[:1] and args[0] in opts:
+		opts[args[0]] = args[1]
+		args = args[2:]
+	us = lambda k: float(opts[k]) * 1e-6
+	clock = VirtualClock(overshoot=us("--overshoot"), jitter=us("--jitter"))
+	r0 = time.time()
+	if opts["--sensors"] is not None:
+		s, readings = sensors(args or ["bme280:10"], float(opts["--sensors"]), clock)
+		print s.report()
+		print "%d readings in %.0f s virtual, %.2f s real" % (
+			sum(readings.values()), clock.t, time.time() - r0)
+		return
+	limit = opts["--limit"]
+	if limit is not None:
+		limit = int(limit)
+	sim = Sim(clock, us("--cost"), limit)
+	progs = []
+	for path in args:
+		f = open(path)
+		progs.append((path, mpp.parse(f.read(), path)))
+		f.close()
+	first = progs and progs[0][1][:1]
+	if not (first and first[0].key == "init"):
+		sim.play(mpp.parse(INIT, "init"))
+	rows = []
+	for path, prog in progs:
+		rows.extend(timeline(sim))
+		sim.reset()
+		r = time.time()
+		t = sim.play(prog)
+		print "%s: %.3f s virtual, %.3f s real" % (path, t, time.time() - r)
+		for n, s in sorted(sim.stats().items()):
+			print "  %-4s %6d steps travel %6d speed max %7.1f acc max %9.1f late mean %5.1f max %7.1f us missed %d lost %d" % (
+				n or "-", s["steps"], s["travel"], s["max_speed"], s["max_acc"],
+				s["late_mean_us"], s["late_max_us"], s["missed"], s["lost"])
+	if opts["--csv"] is not None:
+		rows.extend(timeline(sim))
+		f = open(opts["--csv"], "w")
+		for r in rows:
+			f.write("%.6f,%s,%d\n" % r)
+		f.close()
+	print "total %.3f s virtual, %.3f s real" % (clock.t, time.time() - r0)
+
+if __name__ == '__main__':
+	main()
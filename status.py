@@ -0,0 +1,149 @@
+#----------------------------------------------------------------------
+#  status.py
+#  Motor status block shared with the web page through a mmap-ed file.
+#
+#  Fixed little endian layout, 64 bytes:
+#     0  uint32  magic  "PUNT"
+#     4  uint32  seq    sequence counter, odd while an update is written
+#     8  int64   numstep
+#    16  double  speed  steps/s
+#    24  int64  target
+#    32  uint32  flags
+#
+#  Seqlock: the writer makes seq odd, writes the fields and makes it
+#  even again; a reader retries until it sees the same even seq before
+#  and after copying the fields. Updates are stores into the mapping, no
+#  system call. A writer dying with seq odd would hold the readers
+#  forever: after SPINS quick retries they sleep between retries and
+#  give up with StaleStatus after MAX_RETRIES. (CPython gives no memory
+#  barriers, so on weakly ordered CPUs a reader may in rare cases need
+#  one more retry.)
+#----------------------------------------------------------------------
+import os
+import time
+import mmap
+import struct
+from collections import namedtuple
+
+STATUS_FILE = "/dev/shm/punter.status"
+SIZE = 64
+MAGIC = 0x544e5550
+
+# flags
+MOVING = 1
+ENERGIZED = 2
+PREEMPTED = 4
+
+# reader retries: quick ones, then RETRY_SLEEP s apart up to MAX_RETRIES
+SPINS = 100
+MAX_RETRIES = 200
+RETRY_SLEEP = 0.001
+
+class StaleStatus(Exception):
+	pass
+
+_HEAD = struct.Struct("<II")
+# seq is copied in with one slice assignment: pack_into clears its
+# bytes before packing, and a reader could catch the zero in between
+_SEQ = struct.Struct("<I")
+_POS = struct.Struct("<qd")
+_ALL = struct.Struct("<qdqI")
+_OFF_SEQ = 4
+_END_SEQ = 8
+_OFF_DATA = 8
+
+Status = namedtuple("Status", "numstep speed target flags seq")
+
+def _map(path, write):
+	if write:
+		fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+		if os.fstat(fd).st_size < SIZE:
+			os.ftruncate(fd, SIZE)
+		prot = mmap.PROT_READ | mmap.PROT_WRITE
+	else:
+		fd = os.open(path, os.O_RDONLY)
+		prot = mmap.PROT_READ
+	try:
+		return mmap.mmap(fd, SIZE, mmap.MAP_SHARED, prot)
+	finally:
+		os.close(fd)
+
+#----------------------------------------------------------------------
+class StatusWriter(object):
+
+	def __init__(self, path=STATUS_FILE):
+		self.path = path
+		self.m = _map(path, True)
+		self.seq = 0
+		self.numstep = 0
+		self.speed = 0.0
+		self.target = 0
+		self.flags = 0
+		_HEAD.pack_into(self.m, 0, MAGIC, 0)
+		self.update()
+
+	def update(self, **kw):
+		# change any of numstep, speed, target, flags
+		for k, v in kw.items():
+			setattr(self, k, v)
+		m = self.m
+		self.seq += 1
+		m[_OFF_SEQ:_END_SEQ] = _SEQ.pack(self.seq & 0xffffffff)
+		_ALL.pack_into(m, _OFF_DATA, self.numstep, self.speed, self.target, self.flags)
+		self.seq += 1
+		m[_OFF_SEQ:_END_SEQ] = _SEQ.pack(self.seq & 0xffffffff)
+
+	def position(self, numstep, speed):
+		# per step update, only the fields that move
+		m = self.m
+		self.numstep = numstep
+		self.speed = speed
+		self.seq += 1
+		m[_OFF_SEQ:_END_SEQ] = _SEQ.pack(self.seq & 0xffffffff)
+		_POS.pack_into(m, _OFF_DATA, numstep, speed)
+		self.seq += 1
+		m[_OFF_SEQ:_END_SEQ] = _SEQ.pack(self.seq & 0xffffffff)
+
+	def set_flag(self, flag, on=True):
+		if on:
+			self.update(flags=self.flags | flag)
+		else:
+			self.update(flags=self.flags & ~flag)
+
+	def close(self):
+		self.m.close()
+
+#----------------------------------------------------------------------
+class StatusReader(object):
+
+	def __init__(self, path=STATUS_FILE):
+		self.m = _map(path, False)
+		magic, seq = _HEAD.unpack_from(self.m, 0)
+		if magic != MAGIC:
+			raise ValueError("%s is not a motor status block" % path)
+		self.retries = 0
+
+	def read(self):
+		# consistent snapshot (Status tuple)
+		m = self.m
+		for n in xrange(MAX_RETRIES):
+			if n >= SPINS:
+				time.sleep(RETRY_SLEEP)
+			s1 = _SEQ.unpack_from(m, _OFF_SEQ)[0]
+			if s1 & 1:
+				self.retries += 1
+				continue
+			data = _ALL.unpack_from(m, _OFF_DATA)
+			if _SEQ.unpack_from(m, _OFF_SEQ)[0] == s1:
+				return Status(data[0], data[1], data[2], data[3], s1)
+			self.retries += 1
+		raise StaleStatus("status block stuck at seq %d, writer gone?" % s1)
+
+	def close(self):
+		self.m.close()
+
+if __name__ == '__main__':
+	import sys
+	r = StatusReader(sys.argv[1] if len(sys.argv) > 1 else STATUS_FILE)
+	s = r.read()
+	print "numstep %d speed %.1f target %d flags 0x%x seq %d" % s
@@ -1,23 +1,54 @@
-import wiringpi as w
+import os
 import time
-import threading
+from array import array
+import motion
+import gpio_out
+import waveform
+import posfile
+import status
+import journal
+
+NODE_DIR = os.environ.get("PUNTER_DIR", "/var/www/html/node")
+POS_FILE = os.path.join(NODE_DIR, "pos.dat")
+JOURNAL_FILE = os.path.join(NODE_DIR, "pos.journal")
+HOME_TRAVEL = 20000	# passi, massimo per trovare il finecorsa
+HOME_BACKOFF = 50	# passi oltre il rilascio del finecorsa
+
+# drive modes. numstep always counts half-steps: full (two coils on) is
+# the even rows of the half-step table, wave (one coil) the odd rows,
+# both walked two half-steps at a time. auto: half-step ramps and final
+# positioning, full steps in the cruise.
+HALF = "half"
+FULL = "full"
+WAVE = "wave"
+AUTO = "auto"
+# ramp length of every mode, relative to acc/dec (half-step ramps):
+# full steps have more torque, wave drive less
+RAMP = {HALF: 1.0, FULL: 0.7, WAVE: 1.5, AUTO: 1.0}
+
+def motor_files(name=""):
+	# (pos file, journal, status block) of a motor; "" is the single motor
+	if not name :
+		return (POS_FILE,JOURNAL_FILE,status.STATUS_FILE)
+	return (os.path.join(NODE_DIR,"pos.%s.dat" % name),
+		os.path.join(NODE_DIR,"pos.%s.journal" % name),
+		"/dev/shm/punter.%s.status" % name)
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
 class stepper():
-
-	def __init__(self,i1,i2,i3,i4):
-		w.wiringPiSetup()
+	def __init__(self,i1,i2,i3,i4,out=None,pos_file=POS_FILE,pos_rate=posfile.RATE,status_file=None,journal_file=None):
 		self.inp=[i1,i2,i3,i4]
-		w.pinMode(i1,w.OUTPUT)
-		w.pinMode(i2,w.OUTPUT)
-		w.pinMode(i3,w.OUTPUT)
-		w.pinMode(i4,w.OUTPUT)
-		w.digitalWrite(i1,0)
-		w.digitalWrite(i2,0)
-		w.digitalWrite(i3,0)
-		w.digitalWrite(i4,0)
+		if out is None :
+			out=gpio_out.WiringPiOutput(self.inp)
+		self.out=out
+		self.waves=None	# waveform.PulseGenerator, None = software timing
+		self.clock=motion.now	# timing of the executor (sim.VirtualClock off-line)
+		self.sleep=time.sleep
+		self.spin=motion.SPIN
+		self.late=None	# i2cbus.Histogram of the step lateness (metrics)
+		self.trace=None	# metrics.Tracer, debug
 		self.numstep=0
 		self.half=[]
 		self.half.append([1,0,0,1]) # setp 0
@@ -28,58 +59,293 @@ class stepper():
 		self.half.append([0,0,1,0]) # step 5
 		self.half.append([0,0,1,1]) # step 6
 		self.half.append([0,0,0,1]) # step 7
-		self.acc= 1000  # passi
-		self.dec= self.acc  # passi 
+		self.phase=gpio_out.masks(self.half)
+		self.full=self.half[0::2]	# due fasi
+		self.wave=self.half[1::2]	# una fase
+		self.mode=HALF
+		self.acc= 500  # passi
+		self.dec= 500  # passi
+		self.start= 1  # passi al secondo
+		self.shape=motion.TRAPEZOID
+		self.actspeed=0
+		self.speed=0
+		self.dir=1
+		self.t_start=0
+		self.pos_file=pos_file
+		self.pub=None
+		if pos_file is not None :
+			self.pub=posfile.PosPublisher(pos_file,self.get_numstep,pos_rate)
+			self.pub.start()
+		self.moving=False
+		self.homed=False
+		self.inputs=gpio_out.WiringPiInput	# pin -> limit switch reader
+		self.journal=None
+		if journal_file is not None :
+			last=journal.load(journal_file)
+			if last is not None :
+				self.numstep=last.numstep
+				self.homed=bool(last.flags & journal.HOMED)
+				if last.flags & journal.MOVING :
+					print "position %d restored from a move in progress, steps may be lost" % last.numstep
+			self.journal=journal.PosJournal(journal_file,self.journal_state)
+			self.journal.start()
+		self.status=None
+		if status_file is not None :
+			self.status=status.StatusWriter(status_file)
+			self.status.update(numstep=self.numstep)
+
+	def get_numstep(self):
+		return self.numstep
+
+	def journal_state(self):
+		flags=0
+		if self.homed :
+			flags|=journal.HOMED
+		if self.moving :
+			flags|=journal.MOVING
+		return (self.numstep,flags)
+
+	def stop(self):
+		if self.waves is not None :
+			self.waves.stop()
+		self.out.off()
 		self.actspeed=0
+		if self.status is not None :
+			self.status.update(speed=0.0,flags=0)
+		self.update_flush()
+
+	def update_flush (self):
+		if self.pub is not None :
+			self.pub.flush()
+		if self.journal is not None :
+			self.journal.flush()
+
+	def update_stop (self):
+		if self.pub is not None :
+			self.pub.close()
+		if self.journal is not None :
+			self.journal.close()
+			self.journal=None
+
+	def step_fn (self,d,delays=None,incs=None):
+		# one step of d (+1/-1) half-steps, bound for the executor;
+		# incs[i] half-steps for step i when given
+		phase=self.phase
+		write=self.out.write
+		if incs is not None :
+			position=None
+			if self.status is not None and delays is not None :
+				position=self.status.position
+			def step(i):
+				self.numstep=self.numstep+d*incs[i]
+				write(phase[self.numstep % 8])
+				if position is not None :
+					position(self.numstep,incs[i]*1000000.0/delays[i])
+		elif self.status is None or delays is None :
+			def step(i):
+				self.numstep=self.numstep+d
+				write(phase[self.numstep % 8])
+		else :
+			position=self.status.position
+			def step(i):
+				self.numstep=self.numstep+d
+				write(phase[self.numstep % 8])
+				position(self.numstep,1000000.0/delays[i])
+		if self.trace is not None and delays is not None :
+			trace=self.trace
+			inner=step
+			def step(i):
+				inner(i)
+				trace(i,self.numstep,delays[i])
+		return step
+
+	def sent_fn (self,d,incs=None):
+		# position update for every chunk queued to the pulse generator
+		done=[0]
+		def sent(n):
+			if incs is None :
+				self.numstep=self.numstep+d*n
+			else :
+				self.numstep=self.numstep+d*sum(incs[done[0]:done[0]+n])
+				done[0]+=n
+			if self.status is not None :
+				self.status.position(self.numstep,self.speed)
+		return sent
+
+	def begin (self):
+		# a table is about to be walked
+		st=self.status
+		self.moving=True
+		if st is not None :
+			st.update(flags=(st.flags | status.MOVING | status.ENERGIZED) & ~status.PREEMPTED)
+
+	def run (self,delays,d,abort=None,incs=None):
+		# walk a delay table in direction d, returns the steps done
+		self.begin()
+		if self.waves is not None :
+			pulses=waveform.compile_move(self.phase,self.numstep,d,delays,incs)
+			n=waveform.stream(self.waves,pulses,sent=self.sent_fn(d,incs),abort=abort)
+			self.out.state=self.phase[self.numstep % 8]
+		else :
+			n=motion.run(delays,self.step_fn(d,delays,incs),self.clock,self.sleep,self.spin,abort,self.late)
+		self.end(delays,n,incs)
+		return n
 
-	def stop (self):
-		w.digitalWrite(self.inp[0],0)
-		w.digitalWrite(self.inp[2],0)
-		w.digitalWrite(self.inp[3],0)
-		w.digitalWrite(self.inp[1],0)
-		
-	def move (self,speed,rel=1,dir=1): #speed = passi al secondo Hz 
+	def end (self,delays,n,incs=None):
+		# n steps of the table done: speed left, status
+		st=self.status
+		if n == len(delays) :
+			self.actspeed=0
+		elif n > 0 :
+			self.actspeed=1000000.0/delays[n-1]	# interrotto, ancora in moto
+			if incs is not None :
+				self.actspeed=self.actspeed*incs[n-1]
+		self.moving=self.actspeed > 0
+		if st is not None :
+			if self.actspeed > 0 :
+				st.update(speed=self.actspeed,flags=st.flags | status.PREEMPTED)
+			else :
+				st.update(speed=0.0,flags=st.flags & ~status.MOVING)
+
+	def ramp_table (self):
+		# delays down to start from the speed left by an interrupted move;
+		# empty, and the motor at rest, when it is that slow already
+		if self.actspeed > self.start :
+			n=int(self.dec*(self.actspeed-self.start)/max(self.speed-self.start,1))
+			if n > 0 :
+				return motion.ramp(self.actspeed,self.start,n,self.shape)
+		self.actspeed=0
+		return array("I")
+
+	def ramp_down (self,abort=None):
+		# decelerate from the speed left by an interrupted move
+		delays=self.ramp_table()
+		if len(delays) :
+			self.run(delays,self.dir,abort)
+		else :
+			self.actspeed=0
+
+	def set_mode (self,mode):
+		if mode not in RAMP :
+			raise ValueError("unknown drive mode '%s'" % mode)
+		self.mode=mode
+
+	def prepare (self,speed,rel,d,v0=None):
+		# (delays, incs) of a move of rel half-steps in direction d at
+		# speed half-steps/s, in the drive mode; incs None: all half-steps
+		self.speed=speed
+		self.dir=d
+		if self.status is not None :
+			self.status.update(target=self.numstep+d*rel)
+		mode=self.mode
+		acc=int(self.acc*RAMP[mode])
+		dec=int(self.dec*RAMP[mode])
+		if mode == HALF :
+			return motion.plan(speed,rel,acc,dec,self.start,self.shape,v0),None
+		if mode == AUTO :
+			delays=motion.plan(speed,rel,acc,dec,self.start,self.shape,v0)
+			# the cruise has to start on an even (two coil) phase
+			return motion.full_cruise(delays,self.numstep & 1)
+		# full / wave: one half-step to get on the phases of the mode,
+		# pairs of half-steps, one more half-step if rel is odd
+		lead=(self.numstep+(mode == WAVE)) & 1
+		if rel < 2+lead :
+			return motion.plan(speed,rel,acc,dec,self.start,self.shape,v0),None
+		pairs=(rel-lead)//2
+		tail=rel-lead-2*pairs
+		first=array("I",[int(1000000.0/max(v0 or self.start,1))])
+		last=array("I",[int(1000000.0/max(self.start,1))])
+		if v0 is not None :
+			v0=v0/2.0
+		core=motion.plan(speed/2.0,pairs,acc//2,dec//2,self.start/2.0,self.shape,v0)
+		delays=first*lead+core+last*tail
+		incs=array("b",[1])*lead+array("b",[2])*pairs+array("b",[1])*tail
+		return delays,incs
+
+	def move (self,speed,rel=1,dir=1,abort=None,settle=1): #speed = passi al secondo Hz
 		if dir >=0 :
 			d=1
 		else:
 			d=-1
-		refspeed=speed
-		self.actspeed=1
-		dec=self.dec
-		if rel <= self.dec :
-			dec = rel/2
-		for s in range(0,rel):
-			self.numstep=self.numstep+d
-			if s == rel-dec :
-				refspeed = 0
-			t=1.0/self.actspeed
-			actacc=speed/self.acc
-			print self.numstep,1.0/self.actspeed
-			fase=self.numstep  % 8
-			for k in range(0,4):
-#				print k, self.inp[k],self.half[fase][k]
-				w.digitalWrite(self.inp[k],self.half[fase][k])
-			if self.actspeed < refspeed :
-				print "+ 100"
-				self.actspeed=self.actspeed+ actacc
-				if self.actspeed > speed :
-					self.actspeed = speed
-
-			elif self.actspeed > refspeed :
-				print "- 100"
-				self.actspeed=self.actspeed - actacc
-				if self.actspeed < 0 :
-					self.actspeed = 0
-					return
-			time.sleep(t)
+		self.t_start=self.clock()
+		v0=None
+		if self.actspeed > 0 :
+			if d == self.dir :
+				v0=self.actspeed
+			else :
+				self.ramp_down(abort)
+				if self.actspeed > 0 :
+					return 0
+		delays,incs=self.prepare(speed,rel,d,v0)
+		n=self.run(delays,d,abort,incs)
+		if n < len(delays) :
+			return n
+		self.update_flush()
+		if settle :
+			self.sleep(settle)
+		return n
+
+	def home (self,switch,speed,dir=-1,abort=None,creep=None):
+		# azzera sul finecorsa: avvicinamento veloce, rilascio, ritorno lento
+		# switch() True con il finecorsa premuto; False se non trovato
+		if dir >=0 :
+			d=1
+		else:
+			d=-1
+		if creep is None :
+			creep=max(speed/20,self.start)
+		def stopped():
+			return abort is not None and abort()
+		self.homed=False
+		self.speed=speed
+		self.dir=d
+		if not switch() :
+			delays=motion.plan(speed,HOME_TRAVEL,self.acc,self.dec,self.start,self.shape)
+			n=self.run(delays,d,lambda: switch() or stopped())
+			if stopped() or (n == len(delays) and not switch()) :
+				self.stop()
+				return False
+			self.ramp_down(abort)
+			# a short sensor can be passed in the ramp down: come back to it
+			if not switch() :
+				self.speed=creep
+				self.run(motion.plan(creep,HOME_TRAVEL,0,0,creep),-d,lambda: switch() or stopped())
+			if not switch() or stopped() :
+				self.stop()
+				return False
+		# back off slowly until released, then a bit more
+		self.speed=creep
+		self.dir=-d
+		n=self.run(motion.plan(creep,HOME_TRAVEL,0,0,creep),-d,lambda: not switch() or stopped())
+		if switch() or stopped() :
+			self.stop()
+			return False
+		self.run(motion.plan(creep,HOME_BACKOFF,0,0,creep),-d,abort)
+		# creep back onto the switch: zero is where it closes
+		self.dir=d
+		self.run(motion.plan(creep,HOME_BACKOFF+n+1,0,0,creep),d,lambda: switch() or stopped())
+		self.actspeed=0
+		self.moving=False
+		if not switch() :
+			self.stop()
+			return False
+		self.numstep=0
+		self.homed=True
+		if self.status is not None :
+			self.status.update(numstep=0,speed=0.0,target=0,flags=self.status.flags & ~status.MOVING)
+		self.update_flush()
+		return True
 #--------------------------------------------------------------------------------
 #----------------------------------------------------------------------
 #----------------------------------------------------------------------
-motor1=stepper(7,0,2,3)
-while 1:
-	motor1.move(2000,4096/2,1)
-	motor1.stop()
-	time.sleep(2)
-	motor1.move(2000,4096/2,-1)
-	motor1.stop()
-	time.sleep(2)
+if __name__ == '__main__':
+	motor1=stepper(7,0,2,3,pos_file=None)
+	motor1.acc=1000
+	motor1.dec=motor1.acc
+	while 1:
+		motor1.move(2000,4096/2,1)
+		motor1.stop()
+		time.sleep(2)
+		motor1.move(2000,4096/2,-1)
+		motor1.stop()
+		time.sleep(2)
@@ -0,0 +1,317 @@
+#----------------------------------------------------------------------
+#  tlog.py
+#  Append-only binary telemetry log.
+#
+#  Records are (time, channel, value) packed little endian in 18 bytes,
+#  time in seconds since the epoch, channel a number from the channel
+#  table. Files are <base>.<n>.tlg, a new one is started when the
+#  current one passes max_bytes and only the last `keep` are kept:
+#
+#     16 byte header: "PTLG", version, flags, record size
+#     plain:  records, one after the other
+#     zlib:   blocks of (t first, t last, records, length) + compressed
+#             records
+#
+#  The channel table is the text file <base>.channels, "id name" lines.
+#  Reader.range(t0, t1) maps the files and binary-searches the times
+#  (plain) or the block index (zlib), so only the part asked for is
+#  looked at, and returns NumPy arrays. A Writer appending to a file
+#  first cuts the torn record or block a crashed writer left at its end.
+#----------------------------------------------------------------------
+import os
+import glob
+import mmap
+import bisect
+import zlib
+import struct
+import numpy as np
+
+MAGIC = "PTLG"
+VERSION = 1
+ZLIB = 1
+HEADER = struct.Struct("<4sHHI8x")
+RECORD = struct.Struct("<dHd")
+BLOCK = struct.Struct("<ddII")
+DTYPE = np.dtype([("t", "<f8"), ("ch", "<u2"), ("v", "<f8")])
+
+MAX_BYTES = 4 << 20
+KEEP = 16
+BLOCK_RECORDS = 1024
+FLUSH = 300.0	# s of data kept in the buffer at most (lost on a crash)
+
+def _files(base):
+	# log files of base, oldest first
+	fs = glob.glob(base + ".*.tlg")
+	return sorted(fs, key=lambda f: int(f[len(base) + 1:-4]))
+
+def _channels(base):
+	ch = {}
+	try:
+		f = open(base + ".channels", "r")
+	except IOError:
+		return ch
+	for l in f:
+		f2 = l.split(None, 1)
+		if len(f2) == 2:
+			ch[f2[1].strip()] = int(f2[0])
+	f.close()
+	return ch
+
+def _good_end(path, flags):
+	# end of the last complete record (plain) or block (zlib) of a file
+	size = os.path.getsize(path)
+	if size < HEADER.size:
+		return 0
+	if not flags & ZLIB:
+		return HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+	f = open(path, "rb")
+	off = HEADER.size
+	while off + BLOCK.size <= size:
+		f.seek(off)
+		clen = BLOCK.unpack(f.read(BLOCK.size))[3]
+		if off + BLOCK.size + clen > size:
+			break
+		off += BLOCK.size + clen
+	f.close()
+	return off
+
+class Writer(object):
+
+	def __init__(self, base, compress=False, max_bytes=MAX_BYTES, keep=KEEP,
+			block=BLOCK_RECORDS, flush=FLUSH):
+		self.base = base
+		self.compress = compress
+		self.max_bytes = max_bytes
+		self.keep = keep
+		self.block = block
+		self.flush_after = flush
+		self.channels = _channels(base)
+		self.buf = bytearray(block * RECORD.size)
+		self.n = 0		# records in buf
+		self.first = 0.0
+		self.f = None
+		self.records = 0
+		self.bytes = 0
+		files = _files(base)
+		self.seq = 0
+		if files:
+			self.seq = int(files[-1][len(base) + 1:-4])
+		self._open()
+
+	def _open(self):
+		if self.f is not None:
+			self.f.close()
+		path = "%s.%d.tlg" % (self.base, self.seq)
+		if os.path.exists(path) and self._flags(path) != (ZLIB if self.compress else 0):
+			# written with the other format: start a new file
+			self.seq += 1
+			path = "%s.%d.tlg" % (self.base, self.seq)
+		if os.path.exists(path):
+			# a writer that crashed leaves a torn record or block: cut it
+			end = _good_end(path, self._flags(path))
+			if end < os.path.getsize(path):
+				f = open(path, "r+b")
+				f.truncate(end)
+				f.close()
+		self.f = open(path, "ab")
+		self.size = self.f.tell()
+		if self.size == 0:
+			self.f.write(HEADER.pack(MAGIC, VERSION, ZLIB if self.compress else 0, RECORD.size))
+			self.size = HEADER.size
+		self.path = path
+
+	def _flags(self, path):
+		f = open(path, "rb")
+		h = f.read(HEADER.size)
+		f.close()
+		if len(h) < HEADER.size:
+			return None
+		return HEADER.unpack(h)[2]
+
+	def _rotate(self):
+		self.seq += 1
+		self._open()
+		for old in _files(self.base)[:-self.keep]:
+			os.unlink(old)
+
+	def channel(self, name):
+		# id of a channel, added to the table when new
+		c = self.channels.get(name)
+		if c is None:
+			c = len(self.channels)
+			f = open(self.base + ".channels", "a")
+			f.write("%d %s\n" % (c, name))
+			f.close()
+			self.channels[name] = c
+		return c
+
+	def append(self, t, ch, value):
+		if self.n == 0:
+			self.first = t
+		RECORD.pack_into(self.buf, self.n * RECORD.size, t, ch, value)
+		self.n += 1
+		if self.n == self.block or t - self.first >= self.flush_after:
+			self.flush()
+
+	def put(self, t, name, value):
+		self.append(t, self.channel(name), value)
+
+	def sink(self, name, t, value):
+		# sensord sink: tuples go to channels name.0, name.1, ...
+		if isinstance(value, (tuple, list)):
+			for i, v in enumerate(value):
+				self.put(t, "%s.%d" % (name, i), v)
+		else:
+			self.put(t, name, value)
+
+	def flush(self):
+		if self.n == 0:
+			return
+		data = buffer(self.buf, 0, self.n * RECORD.size)
+		if self.compress:
+			z = zlib.compress(str(data))
+			last = RECORD.unpack_from(self.buf, (self.n - 1) * RECORD.size)[0]
+			data = BLOCK.pack(self.first, last, self.n, len(z)) + z
+		self.f.write(data)
+		self.f.flush()
+		self.size += len(data)
+		self.bytes += len(data)
+		self.records += self.n
+		self.n = 0
+		if self.size >= self.max_bytes:
+			self._rotate()
+
+	def close(self):
+		self.flush()
+		self.f.close()
+
+#----------------------------------------------------------------------
+class _Plain(object):
+
+	def __init__(self, f, size):
+		n = (size - HEADER.size) // RECORD.size
+		self.m = None
+		self.rec = np.zeros(0, DTYPE)
+		if n > 0:
+			self.m = mmap.mmap(f.fileno(), HEADER.size + n * RECORD.size, access=mmap.ACCESS_READ)
+			self.rec = np.frombuffer(self.m, DTYPE, n, HEADER.size)
+
+	def span(self):
+		if len(self.rec) == 0:
+			return None
+		return (self.rec["t"][0], self.rec["t"][-1])
+
+	def range(self, t0, t1):
+		t = self.rec["t"]
+		a = np.searchsorted(t, t0, "left")
+		b = np.searchsorted(t, t1, "right")
+		return self.rec[a:b]
+
+	def close(self):
+		self.rec = None
+		if self.m is not None:
+			self.m.close()
+
+class _Zlib(object):
+
+	def __init__(self, f, size):
+		# block index only, records are decompressed when asked for
+		self.m = None
+		self.index = []		# (t first, t last, offset, length)
+		if size > HEADER.size:
+			self.m = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+		off = HEADER.size
+		while off + BLOCK.size <= size:
+			t0, t1, n, clen = BLOCK.unpack_from(self.m, off)
+			if off + BLOCK.size + clen > size:
+				break		# block still being written
+			self.index.append((t0, t1, off + BLOCK.size, clen))
+			off += BLOCK.size + clen
+		self.starts = [b[0] for b in self.index]
+
+	def span(self):
+		if not self.index:
+			return None
+		return (self.index[0][0], self.index[-1][1])
+
+	def range(self, t0, t1):
+		i = max(bisect.bisect_right(self.starts, t0) - 1, 0)
+		out = []
+		while i < len(self.index) and self.index[i][0] <= t1:
+			b0, b1, off, clen = self.index[i]
+			if b1 >= t0:
+				rec = np.frombuffer(zlib.decompress(self.m[off:off + clen]), DTYPE)
+				t = rec["t"]
+				out.append(rec[np.searchsorted(t, t0, "left"):np.searchsorted(t, t1, "right")])
+			i += 1
+		if not out:
+			return np.zeros(0, DTYPE)
+		return np.concatenate(out)
+
+	def close(self):
+		if self.m is not None:
+			self.m.close()
+
+class Reader(object):
+	"""
+	All the files of a log, read only. Times must not go backwards
+	within the log (the writer appends in arrival order).
+	"""
+
+	def __init__(self, base):
+		self.base = base
+		self.channels = _channels(base)
+		self.names = dict((v, k) for k, v in self.channels.items())
+		self.files = []
+		for path in _files(base):
+			f = open(path, "rb")
+			h = f.read(HEADER.size)
+			if len(h) < HEADER.size:
+				f.close()
+				continue
+			magic, version, flags, rsize = HEADER.unpack(h)
+			if magic != MAGIC or rsize != RECORD.size:
+				f.close()
+				raise ValueError("%s: not a telemetry log" % path)
+			size = os.fstat(f.fileno()).st_size
+			if flags & ZLIB:
+				self.files.append((f, _Zlib(f, size)))
+			else:
+				self.files.append((f, _Plain(f, size)))
+
+	def span(self):
+		s = [p.span() for f, p in self.files if p.span() is not None]
+		if not s:
+			return None
+		return (s[0][0], s[-1][1])
+
+	def range(self, t0, t1, channel=None):
+		"""
+		Records with t0 <= t <= t1, optionally of one channel (name or
+		id): a structured array with fields t, ch, v.
+		"""
+		if isinstance(channel, str):
+			channel = self.channels[channel]
+		out = []
+		for f, p in self.files:
+			s = p.span()
+			if s is None or s[1] < t0 or s[0] > t1:
+				continue
+			r = p.range(t0, t1)
+			if channel is not None:
+				r = r[r["ch"] == channel]
+			out.append(r)
+		if not out:
+			return np.zeros(0, DTYPE)
+		return np.concatenate(out)
+
+	def series(self, channel, t0=float("-inf"), t1=float("inf")):
+		# (times, values) of one channel
+		r = self.range(t0, t1, channel)
+		return r["t"], r["v"]
+
+	def close(self):
+		for f, p in self.files:
+			p.close()
+			f.close()
+		self.files = []
@@ -0,0 +1,188 @@
+#----------------------------------------------------------------------
+#  waveform.py
+#  Hardware timed step generation.
+#
+#  A planned move is compiled into pulses (phase mask, delay in us):
+#  "put the coils in this phase, then hold it for delay". Pulses are
+#  handed in chunks to a pulse generator that plays them without the
+#  CPU (pigpio DMA waves on the Pi). At most `depth` chunks are queued,
+#  so the next one is always ready when the current one ends.
+#----------------------------------------------------------------------
+import time
+import motion
+
+CHUNK = 500	# pulses per chunk
+DEPTH = 2	# double buffering
+
+def compile_move(phase, pos, d, delays, incs=None):
+	# pulses for a move of len(delays) steps of d from position pos,
+	# incs[i] positions for step i when given (full steps)
+	n = len(phase)
+	if incs is None:
+		for t in delays:
+			pos += d
+			yield (phase[pos % n], t)
+		return
+	for i in xrange(len(delays)):
+		pos += d * incs[i]
+		yield (phase[pos % n], delays[i])
+
+def chunks(pulses, size=CHUNK):
+	buf = []
+	for p in pulses:
+		buf.append(p)
+		if len(buf) >= size:
+			yield buf
+			buf = []
+	if buf:
+		yield buf
+
+def stream(gen, pulses, size=CHUNK, depth=DEPTH, sent=None, abort=None):
+	"""
+	Feed the pulses to the generator chunk by chunk, keeping `depth`
+	chunks queued. sent(n) is called with the number of pulses of every
+	chunk submitted. Returns the number of pulses played, once the last
+	one is out. abort() is asked before every chunk: the chunks already
+	queued are still played.
+	"""
+	n = 0
+	for c in chunks(pulses, size):
+		while gen.pending() >= depth:
+			gen.idle()
+		if abort is not None and abort():
+			break
+		gen.submit(c)
+		n += len(c)
+		if sent is not None:
+			sent(len(c))
+	while gen.pending():
+		gen.idle()
+	return n
+
+#----------------------------------------------------------------------
+class PulseGenerator(object):
+	"""
+	submit(pulses) queues a chunk behind the ones already queued,
+	pending() is the number of chunks not completely played yet,
+	idle() waits one poll interval before pending() is asked again.
+	"""
+
+	poll = 0.002
+
+	def submit(self, pulses):
+		raise NotImplementedError
+
+	def pending(self):
+		raise NotImplementedError
+
+	def idle(self):
+		time.sleep(self.poll)
+
+	def stop(self):
+		pass
+
+#----------------------------------------------------------------------
+class PigpioGenerator(PulseGenerator):
+	"""
+	pigpio waves, one wave per chunk, chained with ONE_SHOT_SYNC so a
+	wave starts exactly when the previous ends. Pins are BCM numbers.
+	"""
+
+	def __init__(self, pins, pi=None):
+		import pigpio
+		self.pigpio = pigpio
+		if pi is None:
+			pi = pigpio.pi()
+		self.pi = pi
+		self.pins = list(pins)
+		for p in self.pins:
+			self.pi.set_mode(p, pigpio.OUTPUT)
+			self.pi.write(p, 0)
+		self.pi.wave_clear()
+		# pin masks for every phase mask: (bits to set, bits to clear)
+		n = len(self.pins)
+		allbits = 0
+		for p in self.pins:
+			allbits |= 1 << p
+		self.gpio = []
+		for m in range(1 << n):
+			on = 0
+			for k in range(n):
+				if m >> k & 1:
+					on |= 1 << self.pins[k]
+			self.gpio.append((on, allbits & ~on))
+		self.waves = []
+
+	def submit(self, pulses):
+		pulse = self.pigpio.pulse
+		gpio = self.gpio
+		self.pi.wave_add_generic([pulse(gpio[m][0], gpio[m][1], t) for m, t in pulses])
+		wid = self.pi.wave_create()
+		self.pi.wave_send_using_mode(wid, self.pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+		self.waves.append(wid)
+
+	def pending(self):
+		if not self.pi.wave_tx_busy():
+			for wid in self.waves:
+				self.pi.wave_delete(wid)
+			self.waves = []
+			return 0
+		current = self.pi.wave_tx_at()
+		# waves before the one on air are finished
+		while self.waves and self.waves[0] != current:
+			self.pi.wave_delete(self.waves.pop(0))
+		return len(self.waves)
+
+	def stop(self):
+		self.pi.wave_tx_stop()
+		for wid in self.waves:
+			self.pi.wave_delete(wid)
+		self.waves = []
+		for p in self.pins:
+			self.pi.write(p, 0)
+
+#----------------------------------------------------------------------
+class SimPulseGenerator(PulseGenerator):
+	"""
+	Software model of a pulse generator. Chunks are "played" on the
+	clock: a chunk starts when the previous one ends, or when it is
+	submitted if the queue had already run dry (an underrun, the gap is
+	recorded). timeline holds (start time in us, phase mask) of every
+	pulse.
+	"""
+
+	def __init__(self, clock=motion.now, sleep=time.sleep):
+		self.clock = clock
+		self.sleep = sleep
+		self.ends = []
+		self.end = None		# us since the first pulse
+		self.timeline = []
+		self.underruns = 0
+		self.gap_us = 0
+		self.t0 = None
+
+	def submit(self, pulses):
+		now = self.clock()
+		if self.t0 is None:
+			self.t0 = now
+		t = int((now - self.t0) * 1e6)
+		if self.end is not None:
+			if t > self.end:
+				self.underruns += 1
+				self.gap_us += t - self.end
+			else:
+				t = self.end
+		for m, d in pulses:
+			self.timeline.append((t, m))
+			t += d
+		self.end = t
+		self.ends.append(self.t0 + t * 1e-6)
+
+	def pending(self):
+		now = self.clock()
+		while self.ends and self.ends[0] <= now:
+			self.ends.pop(0)
+		return len(self.ends)
+
+	def idle(self):
+		self.sleep(self.poll)